@@ -23,6 +23,12 @@ from analyze_mab import plotMAB
 from analyze_seeds import plotSeeds
 from analyze_mutationtree import plotMutationTree
 from analyze_crashes import plotCrashes
+from corpusdb import compareCorpora
+from analyze_coverage import CoverageParser
+from analyze_work import WorkParser
+from analyze_mab import MABParser
+from analyze_programs import ProgramParser
+from logparser import preparseResults, encodeResult, followResults
 from plot import plot
 
 if __name__ == "__main__":
@@ -48,6 +54,20 @@ if __name__ == "__main__":
                   help="Analyze Seed", default=False)
     parser.add_option("-C", "--crash", dest="analyze_crashes", action="store_true",
                   help="Analyze Crashes", default=False)
+    parser.add_option("-D", "--corpus-diff", dest="analyze_corpusdb", action="store_true",
+                  help="Compare the corpus.db of the tests", default=False)
+    parser.add_option("-j", "--jobs", dest="jobs", type="int",
+                  help="Number of result files to parse in parallel", default=1)
+    parser.add_option("-x", "--mem-limit", dest="mem_limit", type="float",
+                  help="Memory limit of each parsing job (GB)", default=0)
+    parser.add_option("-r", "--snapshot", dest="snapshot", type="float",
+                  help="Snapshot long parses every N minutes and resume from the last snapshot, 0 disables", default=10)
+    parser.add_option("-f", "--follow", dest="follow", type="float",
+                  help="Follow result files that are still being written and replot coverage, work and MAB every N minutes", default=0)
+    parser.add_option("-b", "--binary", dest="binary", action="store_true",
+                  help="Convert result files without a binary log before parsing", default=False)
+    parser.add_option("-P", "--preparse", dest="preparse", action="store_true",
+                  help="Only parse result files into the caches, then exit", default=False)
 
     (options, args) = parser.parse_args()
     blacklist = options.blacklist.split(',') if len(options.blacklist) > 0 else []
@@ -60,6 +80,53 @@ if __name__ == "__main__":
                 break;
         if not skip:
             tests.append(fn.strip("log_"))
+    # Tests given as arguments only
+    if len(args) > 0:
+        tests = [test for test in tests if test in args]
+    if options.binary:
+        for test in tests:
+            if os.path.isfile("result_" + test) and not os.path.isfile("result_%s.bin" % test):
+                print("Converting result_%s, %d bytes written" % (test, encodeResult(test)))
+    if options.follow > 0:
+        parsers = []
+        if options.analyze_coverage or options.analyze_all:
+            parsers.append(('coverage_%s.cache', CoverageParser))
+        if options.analyze_work or options.analyze_all:
+            parsers.append(('work_%s.cache', WorkParser))
+        if options.analyze_mab or options.analyze_all:
+            parsers.append(('mab_%s.cache', MABParser))
+        def replot():
+            try:
+                if options.analyze_coverage or options.analyze_all:
+                    plotCoverage(tests)
+                if options.analyze_work or options.analyze_all:
+                    plotWork(tests)
+                if options.analyze_mab or options.analyze_all:
+                    plotMAB(tests)
+            except:
+                traceback.print_exc()
+        try:
+            followResults(tests, parsers, replot, interval=options.follow * 60)
+        except KeyboardInterrupt:
+            pass
+        exit(0)
+    # Parse every result file once for all enabled analyzers
+    parsers = []
+    if options.analyze_coverage or options.analyze_all:
+        parsers.append(('coverage_%s.cache', CoverageParser))
+    if options.analyze_work or options.analyze_all:
+        parsers.append(('work_%s.cache', WorkParser))
+    if options.analyze_mab or options.analyze_all:
+        parsers.append(('mab_%s.cache', MABParser))
+    if options.analyze_program or options.analyze_seed or options.analyze_mutationtree or options.analyze_all:
+        parsers.append(('program_%s.cache', ProgramParser))
+    try:
+        preparseResults(tests, parsers, jobs=options.jobs, mem_limit=int(options.mem_limit * 2 ** 30) if options.mem_limit > 0 else None,
+                        snapshot=options.snapshot * 60 if options.snapshot > 0 else None)
+    except:
+        traceback.print_exc()
+    if options.preparse:
+        exit(0)
     try:
         if options.analyze_coverage or options.analyze_all:
             plotCoverage(tests)
@@ -77,6 +144,8 @@ if __name__ == "__main__":
             plotCrashes(tests)
         if options.analyze_mutationtree or options.analyze_all:
             plotMutationTree(tests)
+        if options.analyze_corpusdb or options.analyze_all:
+            compareCorpora(tests)
         #plotSignal(tests)
         #plotCorpus(tests)
         #plotWork(tests)
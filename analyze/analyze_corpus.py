@@ -51,7 +51,7 @@ def plotCorpus(tests=["KCOV", "RAMINDEX"]):
     for test in tests:
         data = {};
         #__data, t, c = __processTest(test);
-        __data, t, c = loadDataCached("corpus_%s.cache", test, __processTest)
+        __data, t, c = loadDataCached("corpus_%s.cache", test, __processTest, source="debug_" + test)
         tmax = max(tmax, t)
         cmax = max(cmax, c)
         if len(__data) < 1:
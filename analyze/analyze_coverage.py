@@ -8,7 +8,8 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 import numpy as np
 
-from utils import loadDataCached, getTestParams, averageData, cliffsDelta
+from utils import loadDataCached, getTestParams, averageData, cliffsDelta, Columns
+from logparser import LogParser, parseResult, EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_CORPUS_COVERAGE, EV_COMMENT
 from plot import plot
 
 def __hash(a):
@@ -19,85 +20,60 @@ def __hash(a):
     a = a ^ (a >> 15);
     return a;
 
+class CoverageParser(LogParser):
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_CORPUS_COVERAGE, EV_COMMENT)
+    version = 2
+    def __init__(self):
+        self.syscallCount = 0
+        self.coverage = set()
+        self.coverageCorpus = set()
+        self.ts_cur = 0;
+        self.ts_bgn = 0;
+        self.cur_status = {
+            "Time_Elapsed": 0.0,
+            "Syscall_Count": 0,
+            "Program_Count": 0,
+            "Seed_Count": 0,
+            "Corpus_Coverage": 0,
+            "Total_Coverage": 0
+        }
+        self.ret = Columns(self.cur_status)
+    def onExecute(self, line):
+        tmp = line.split();
+        try:
+            n_calls = int(tmp[-1])
+        except:
+            n_calls = 1
+        cur_status = self.cur_status
+        cur_status["Time_Elapsed"] = (self.ts_cur - self.ts_bgn) / 1000000000.0
+        cur_status["Total_Coverage"] = len(self.coverage);
+        cur_status["Corpus_Coverage"] = len(self.coverageCorpus);
+        cur_status["Program_Count"] += 1;
+        cur_status["Syscall_Count"] += n_calls;
+        self.syscallCount += n_calls
+    def onTimestamp(self, ts):
+        self.ts_cur = ts
+        if self.ts_bgn == 0:
+            self.ts_bgn = ts
+        if ((self.ts_cur - self.ts_bgn) / 1000000000.0) % 600.0 < 5:
+            print((self.ts_cur - self.ts_bgn) / 1000000000.0)
+        self.ret.append(self.cur_status)
+    def onCoverage(self, pc):
+        self.coverage.add(pc);
+    def onCorpusCoverage(self, pc):
+        self.coverageCorpus.add(pc);
+    def onComment(self, line):
+        if "# addInputToCorpus" in line:
+            self.cur_status["Seed_Count"] += 1;
+    def result(self):
+        return self.ret
+
 def __processTestAltAlt(test):
     ret = []
     fn = 'result_' + test
     if not os.path.isfile(fn):
         return ret;
-    f = open(fn);
-    executeCount = 0; 
-    syscallCount = 0
-    coverage = set()
-    coverageCorpus = set()
-    idx = 0;
-    ts_cur = 0;
-    ts_bgn = 0;
-
-    cur_status = {
-        "Time_Elapsed": 0,
-        "Syscall_Count": 0,
-        "Program_Count": 0,
-        "Seed_Count": 0,
-        "Corpus_Coverage": 0,
-        "Total_Coverage": 0
-    }
-    
-    for line in f:
-        line = line.strip('\n').strip();
-        if len(line) == 0:
-            continue;
-        if line[:2] == '- ' and "executeRaw" in line:
-            tmp = line.split();
-            try:
-                n_calls = int(tmp[-1])
-            except:
-                n_calls = 1
-            # ret.append((executeCount, syscallCount, (ts_cur - ts_bgn) / 1000000000.0 / 60.0, len(coverage), len(coverageHashed), corpusSig))
-            cur_status["Time_Elapsed"] = (ts_cur - ts_bgn) / 1000000000.0
-            cur_status["Total_Coverage"] = len(coverage);
-            cur_status["Corpus_Coverage"] = len(coverageCorpus); 
-            cur_status["Program_Count"] += 1;
-            cur_status["Syscall_Count"] += n_calls;
-            syscallCount += n_calls
-        if line[:3] == '<<<' and line[-3:] == '>>>':
-            line = line.strip('<<<').strip('>>>')
-            ts_cur = int(line)
-            if ts_bgn == 0:
-                ts_bgn = ts_cur
-            if ((ts_cur - ts_bgn) / 1000000000.0) % 600.0 < 5:
-                print((ts_cur - ts_bgn) / 1000000000.0)
-            ret.append(copy.deepcopy(cur_status))
-        elif line[0] == '=':
-            tmp = line.split();
-            try:
-                pc = int(tmp[1], 16)
-            except:
-                continue
-            coverage.add(pc);
-            '''
-            if (pc & 0xffff000000000000) == 0xffff000000000000:
-                coverage.add(pc);
-                pc = pc & 0xffffffff;
-                sig = pc ^ prev_pc;
-                coverageHashed.add(sig);
-                prev_pc = __hash(pc);
-            elif (pc & 0xffffffff00000000) == 0:
-                coverage.add(pc);
-                coverageHashed.add(pc);
-            '''
-        elif line[0] == '+':
-            tmp = line.split();
-            try:
-                pc = int(tmp[1], 16)
-            except:
-                continue
-            coverageCorpus.add(pc);
-        elif "# addInputToCorpus" in line:
-            cur_status["Seed_Count"] += 1;
-        #    tmp = line.split(":")[1].split(".")[0].split(",")[1]
-        #    corpusSig = int(tmp)
-    f.close();
-    return ret;
+    return parseResult(test, [CoverageParser()])[0]
 
 def plotCoverage(tests=["RAMINDEX", "KCOV"]):
     modules = {}
@@ -115,7 +91,7 @@ def plotCoverage(tests=["RAMINDEX", "KCOV"]):
         data = {}
         for test in modules[module]:
           try:
-            __data = loadDataCached('coverage_%s.cache', test, __processTestAltAlt);
+            __data = loadDataCached('coverage_%s.cache', test, __processTestAltAlt, version=CoverageParser.version);
             print(test, len(__data), __data[-1] if len(__data) > 0 else -1)
             name, module, run = getTestParams(test)
             print(name, module, run)
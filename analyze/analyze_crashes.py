@@ -181,7 +181,7 @@ def plotCrashes(tests=["KCOV", "RAMINDEX"]):
         __data = None
         try:
             # p_all, p_generated, p_corpus, p_triage, __data = __processTest(test);
-            __data = loadDataCached('crashes_%s.cache', test, __processTest);
+            __data = loadDataCached('crashes_%s.cache', test, __processTest, source='workdir_' + test);
             #__data = __processTest(test)
             datas[name].append(__data)
         except:
@@ -9,75 +9,64 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 import numpy as np
 
-from utils import loadDataCached, getTestParams, averageData
+from utils import loadDataCached, getTestParams, averageData, Columns
+from logparser import LogParser, parseResult, EV_TIMESTAMP, EV_EXECUTE, EV_DEBUG
 from plot import plot, plotCDF
 
-def __processTest(test):
-    ret = []
-    fn = 'result_' + test
-    if not os.path.isfile(fn):
-        return ret;
-    f = open(fn);
-    # X-axis
-    executeCount = 0; 
-    syscallCount = 0;
-    ts_bgn = 0;
-    # Y-axis
-    status = {
-        "ts": 0.0,
-        "executeCount": 0,
-        "syscallCount": 0,
-        "MABOverhead": 0.0,
-        "MABSync": 0.0,
-        "MABUpdate": 0.0,
-        "MABPoll": 0.0,
-        "MABDequeue": 0.0,
-        "MABWeight": [1.0, 1.0, 1.0],
-        "MABProbability": [0.33,0.33,0.33],
-        "MABGLC": [[0.0,0.0,0.0,0.0,0.0,0.0], [0.0,0.0,0.0,0.0,0.0,0.0], [0.0,0.0,0.0,0.0,0.0,0.0]]
-    }
-    MABGLC = [[[0.0,0.0,0.0,0.0,0.0,0.0]], [[0.0,0.0,0.0,0.0,0.0,0.0]], [[0.0,0.0,0.0,0.0,0.0,0.0]]] # Gen, Mut, Tri, [Gain, Loss, Cost, NormGain, NormLoss, NormCost] 
-    idx = 0;
-    
-    cur_choice = 0
-    cur_gain = 0.0
-    cur_loss = 0.0
-    cur_cost = 0.0
-    cur_normgain = 0.0
-    cur_normloss = 0.0
-    cur_normcost = 0.0
-    ts_cur = 0
-    prev_ts = 0
-    cur_ts = 0
-    TIME_THRESHOLD = 10.000
-    for line in f:
-        line = line.strip('\n').strip();
-        if len(line) == 0:
-            continue;
-        if line[:2] == '- ' and "executeRaw" in line: # Prog/Syscall count
-            tmp = line.split();
-            try:
-                n_calls = int(tmp[-1])
-            except:
-                n_calls = 1
-            #ret.append(copy.deepcopy(status))
-            status["executeCount"] += 1;
-            status["syscallCount"] += n_calls
-        if line[:3] == '<<<' and line[-3:] == '>>>': # Time
-            line = line.strip('<<<').strip('>>>')
-            ts_cur = int(line)
-            if ts_bgn == 0:
-                ts_bgn = ts_cur
-            status["ts"] = (ts_cur - ts_bgn) / 1000000000
-            cur_ts = status["ts"]
-            ret.append(copy.deepcopy(status))
-        elif line[0] == '-' and ("MAB Dequeue: " in line or "MAB Update: " in line or "MAB Poll: " in line or "MAB Sync" in line or "MAB NewTriage: " in line or "MAB CompleteTriage: " in line): # MAB Overhead
-            TIME_THRESHOLD = cur_ts - prev_ts + 10.0 # Upper bound
+class MABParser(LogParser):
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_DEBUG)
+    version = 2
+    def __init__(self):
+        self.ts_bgn = 0;
+        # Y-axis
+        self.status = {
+            "ts": 0.0,
+            "executeCount": 0,
+            "syscallCount": 0,
+            "MABOverhead": 0.0,
+            "MABSync": 0.0,
+            "MABUpdate": 0.0,
+            "MABPoll": 0.0,
+            "MABDequeue": 0.0,
+            "MABWeight": [1.0, 1.0, 1.0],
+            "MABProbability": [0.33,0.33,0.33],
+            "MABGLC": [[0.0,0.0,0.0,0.0,0.0,0.0], [0.0,0.0,0.0,0.0,0.0,0.0], [0.0,0.0,0.0,0.0,0.0,0.0]]
+        }
+        self.ret = Columns(self.status)
+        self.MABGLC = [[[0.0,0.0,0.0,0.0,0.0,0.0]], [[0.0,0.0,0.0,0.0,0.0,0.0]], [[0.0,0.0,0.0,0.0,0.0,0.0]]] # Gen, Mut, Tri, [Gain, Loss, Cost, NormGain, NormLoss, NormCost]
+        self.cur_choice = 0
+        self.cur_gain = 0.0
+        self.cur_loss = 0.0
+        self.cur_cost = 0.0
+        self.cur_normgain = 0.0
+        self.cur_normloss = 0.0
+        self.cur_normcost = 0.0
+        self.prev_ts = 0
+        self.cur_ts = 0
+        self.TIME_THRESHOLD = 10.000
+    def onExecute(self, line): # Prog/Syscall count
+        tmp = line.split();
+        try:
+            n_calls = int(tmp[-1])
+        except:
+            n_calls = 1
+        self.status["executeCount"] += 1;
+        self.status["syscallCount"] += n_calls
+    def onTimestamp(self, ts): # Time
+        if self.ts_bgn == 0:
+            self.ts_bgn = ts
+        self.status["ts"] = (ts - self.ts_bgn) / 1000000000
+        self.cur_ts = self.status["ts"]
+        self.ret.append(self.status)
+    def onDebug(self, line):
+        status = self.status
+        if "MAB Dequeue: " in line or "MAB Update: " in line or "MAB Poll: " in line or "MAB Sync" in line or "MAB NewTriage: " in line or "MAB CompleteTriage: " in line: # MAB Overhead
+            self.TIME_THRESHOLD = TIME_THRESHOLD = self.cur_ts - self.prev_ts + 10.0 # Upper bound
             tmp = line.split(": ");
             try:
                 t = int(tmp[1]) / 1000000000
             except:
-                continue
+                return
             t = t if t < TIME_THRESHOLD else TIME_THRESHOLD
             t = 0 if t < 0 else t
             status["MABOverhead"] += t
@@ -89,39 +78,43 @@ def __processTest(test):
                 status["MABPoll"] += t
             elif "MAB Sync: " in line or "MAB Sync Read: " in line or "MAB Sync Write: " in line:
                 status["MABSync"] += t
-            prev_ts = status["ts"]
-        elif line[0] == '-' and "MABWeight " in line:
+            self.prev_ts = status["ts"]
+        elif "MABWeight " in line:
             tmp = line.split("MABWeight ")[1].split("], ")[0] + "]"
             try:
                 w = json.loads(tmp)
             except:
-                continue
+                return
             status["MABWeight"] = w
-        elif line[0] == '-' and "MAB Choice:" in line:
-            cur_choice = int(line.split("MAB Choice: ")[1].split()[0].strip(','))
-            #cur_gain = float(line.split("Gain: ")[1].split()[0].strip(','))
-            #cur_loss = float(line.split("Loss: ")[1].split()[0].strip(','))
-            #cur_cost = float(line.split("Choice: ")[1].split()[0].strip(','))
-        elif line[0] == '-' and "MAB Normalized " in line:
+        elif "MAB Choice:" in line:
+            self.cur_choice = int(line.split("MAB Choice: ")[1].split()[0].strip(','))
+        elif "MAB Normalized " in line:
             if "Gain: " in line:
-                 cur_normgain = float(line.split("Gain: ")[1].split()[0].strip(','))
+                 self.cur_normgain = float(line.split("Gain: ")[1].split()[0].strip(','))
             if "Loss: " in line:
-                 cur_normloss = float(line.split("Loss: ")[1].split()[0].strip(','))
+                 self.cur_normloss = float(line.split("Loss: ")[1].split()[0].strip(','))
             if "Cost: " in line:
-                 cur_normcost = float(line.split("Cost: ")[1].split()[0].strip(','))
-            MABGLC[cur_choice].append([cur_gain, cur_loss, cur_cost, cur_normgain, cur_normloss, cur_normcost])
+                 self.cur_normcost = float(line.split("Cost: ")[1].split()[0].strip(','))
+            MABGLC = self.MABGLC
+            MABGLC[self.cur_choice].append([self.cur_gain, self.cur_loss, self.cur_cost, self.cur_normgain, self.cur_normloss, self.cur_normcost])
             for i in range(3):
                 for j in range(6):
                     status["MABGLC"][i][j] = MABGLC[i][-1][j]
-            # ret.append(copy.deepcopy(status))
-        elif line[0] == '-' and "MAB Probability: " in line:
+        elif "MAB Probability: " in line:
             try:
                 tmp = json.loads(line.split("MAB Probability: ")[1])
                 status["MABProbability"] = tmp
             except:
-                continue
-    f.close();
-    return ret, MABGLC;
+                return
+    def result(self):
+        return self.ret, self.MABGLC
+
+def __processTest(test):
+    ret = []
+    fn = 'result_' + test
+    if not os.path.isfile(fn):
+        return ret;
+    return parseResult(test, [MABParser()])[0]
 
 def plotMAB(tests=["RAMINDEX", "KCOV"]):
     data = {}
@@ -133,7 +126,7 @@ def plotMAB(tests=["RAMINDEX", "KCOV"]):
         #if not "MAB" in test:
         #    continue
         try:
-            __data, GLC = loadDataCached('mab_%s.cache', test, __processTest);
+            __data, GLC = loadDataCached('mab_%s.cache', test, __processTest, version=MABParser.version);
             print(test, len(__data), __data[-1] if len(__data) > 0 else -1)
             print(GLC[0][-1], GLC[1][-1], GLC[2][-1])
             name, module, run = getTestParams(test)
@@ -189,15 +182,14 @@ def plotMAB(tests=["RAMINDEX", "KCOV"]):
             prob = [[], [], []]
             for i in range(len(data[module][name])):
                 d = data[module][name][i]
-                for v in d:
-                    ts = v["ts"]
-                    prob[0].append((ts, v["MABProbability"][0]))
-                    prob[1].append((ts, v["MABProbability"][1]))
-                    prob[2].append((ts, v["MABProbability"][2]))
-                    if v["MABProbability"][2] > 0:
-                        tri.append((ts, v["MABProbability"][2]))
-                    if v["MABProbability"][0] > 0 and v["MABProbability"][1] > 0:
-                        mg.append((ts, math.log(v["MABProbability"][1] / v["MABProbability"][0], 10)))
+                ts = d["ts"]
+                p = d["MABProbability"]
+                for arm in range(3):
+                    prob[arm].extend(zip(ts.tolist(), p[:,arm].tolist()))
+                sel = p[:,2] > 0
+                tri.extend(zip(ts[sel].tolist(), p[sel,2].tolist()))
+                sel = (p[:,0] > 0) & (p[:,1] > 0)
+                mg.extend(zip(ts[sel].tolist(), np.log10(p[sel,1] / p[sel,0]).tolist()))
                 mab_prob["Generate"].append(prob[0])
                 mab_prob["Mutate"].append(prob[1])
                 mab_prob["Triage"].append(prob[2])
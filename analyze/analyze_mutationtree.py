@@ -14,7 +14,7 @@ import pygraphviz as PG
 
 from plot import plot, plotBar, plotCDF, plotBar1, plotCDF2
 from utils import loadDataCached, getTestParams
-from analyze_programs import Program, __processTest 
+from analyze_programs import Program, ProgramParser, ORIGIN_GENERATE, ORIGIN_MINIMIZE, rootTable, __processTest
 
 class Node:
     def __init__(self, p: Program):
@@ -25,108 +25,203 @@ class Node:
         self.children = []
         self.parent = None
         self.id = None
+    def __preorder(self, visited=None):
+        ret = []
+        stack = [self]
+        while len(stack) > 0:
+            n = stack.pop()
+            ret.append(n)
+            for c in reversed(n.children):
+                if visited is not None and c.program.sig in visited:
+                    print("Cycle detected:", c.program.sig)
+                    continue
+                stack.append(c)
+        return ret
     def computeLevel(self, level=-1, visited=None, maxlevel=10000000):
         if level >= 0:
             self.level = level
-        height = self.level
-        self.size = 1
-        if self.level >= maxlevel:
-            self.children = []
-        for n in self.children:
-            if visited is not None and n.program.sig in visited:
-                print("Cycle detected:", n.program.sig)
-                continue
-            n.computeLevel(self.level + 1, visited, maxlevel)
-            d = n.height
-            s = n.size
-            self.size += s
-            height = d if d > height else height
-        self.height = height
-        return height
+        # Levels top-down, then sizes and heights bottom-up
+        nodes = []
+        stack = [self]
+        while len(stack) > 0:
+            n = stack.pop()
+            nodes.append(n)
+            if n.level >= maxlevel:
+                n.children = []
+            for c in reversed(n.children):
+                if visited is not None and c.program.sig in visited:
+                    print("Cycle detected:", c.program.sig)
+                    continue
+                c.level = n.level + 1
+                stack.append(c)
+        for n in nodes:
+            n.size = 1
+            n.height = n.level
+        for n in reversed(nodes):
+            if n.parent is not None and n is not self:
+                n.parent.size += n.size
+                n.parent.height = max(n.parent.height, n.height)
+        return self.height
     def collectDegrees(self, result, visited=None):
-        degree = 0
-        leaves = 0
-        for n in self.children:
-            if visited is not None and n.program.sig in visited:
-                print("Cycle detected:", n.program.sig)
+        # Degrees of inner nodes in post-order, returns the number of leaves
+        leaves = {}
+        stack = [(self, False)]
+        while len(stack) > 0:
+            n, done = stack.pop()
+            children = [c for c in n.children if visited is None or not c.program.sig in visited]
+            if not done:
+                stack.append((n, True))
+                for c in reversed(children):
+                    stack.append((c, False))
                 continue
-            degree += 1
-            l = n.collectDegrees(result, visited=visited)
-            leaves += l
-        if degree > 0: # Ignore leaf nodes
-            result.append(degree)
-            return leaves
-        else:
-            return 1
+            if len(children) > 0:
+                result.append(len(children))
+                leaves[id(n)] = sum([leaves.pop(id(c)) for c in children])
+            else:
+                leaves[id(n)] = 1
+        return leaves[id(self)]
     def getOffspring(self):
-        ret = [self]
-        for n in self.children:
-            ret += n.getOffspring()
-        return ret
+        return self.__preorder()
         
     #def __eq__(self, other):
     #    return self.p.sig == self.other.sig
 
+class MutationForest:
+    """
+    Mutation trees of one run as arrays. Node i stands for program
+    program[i] of p_all and has the parent node parent[i] (-1 for roots).
+    The children of node i are children[offsets[i]:offsets[i+1]] in the
+    order they were linked. level, height (deepest level below), size,
+    degree and leaves are per node and computed without recursion. Nodes
+    that are not below one of `roots` keep level -1, height -1 and size 1.
+    """
+    def __init__(self, p_all, programs, parents, links, roots):
+        self.p_all = p_all
+        self.program = np.array(programs, dtype=np.int64)
+        self.parent = np.array(parents, dtype=np.int64)
+        self.roots = np.array(roots, dtype=np.int64)
+        links = np.array(links, dtype=np.int64)
+        self.children = links[np.argsort(self.parent[links], kind='stable')] if len(links) > 0 else links
+        self.offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent[links], minlength=len(self)), out=self.offsets[1:])
+        self.degree = np.diff(self.offsets)
+        self.__compute()
+    def __len__(self):
+        return len(self.program)
+    def getChildren(self, i):
+        return self.children[self.offsets[i]:self.offsets[i+1]]
+    def __compute(self):
+        n = len(self)
+        # Root and depth of every node by pointer doubling, log(depth) passes
+        anc = np.where(self.parent >= 0, self.parent, np.arange(n))
+        dist = (self.parent >= 0).astype(np.int64)
+        while n > 0:
+            nxt = anc[anc]
+            if np.array_equal(nxt, anc):
+                break
+            dist += dist[anc]
+            anc = nxt
+        reachable = np.zeros(n, dtype=bool)
+        reachable[self.roots] = True
+        reachable = reachable[anc] if n > 0 else reachable
+        self.tree = np.where(reachable, anc, -1)
+        self.level = np.where(reachable, dist, -1)
+        # Sizes, heights and leaves bottom-up, deepest nodes first
+        order = np.flatnonzero(reachable & (self.parent >= 0))
+        order = order[np.argsort(-self.level[order], kind='stable')].tolist()
+        parent = self.parent.tolist()
+        size = [1] * n
+        height = self.level.tolist()
+        leaves = (self.degree == 0).astype(np.int64).tolist()
+        for i in order:
+            p = parent[i]
+            size[p] += size[i]
+            if height[i] > height[p]:
+                height[p] = height[i]
+            leaves[p] += leaves[i]
+        self.size = np.array(size, dtype=np.int64)
+        self.height = np.array(height, dtype=np.int64)
+        self.leaves = np.array(leaves, dtype=np.int64)
+        self.leaves[~reachable] = 1
+    def getProgram(self, i):
+        return self.p_all[self.program[i]]
+    def treeDegrees(self, roots):
+        # Degrees of all inner nodes, grouped by the tree in roots they are in
+        rank = np.full(len(self), -1, dtype=np.int64)
+        rank[roots] = np.arange(len(roots))
+        r = rank[self.tree[self.tree >= 0]] if len(self) > 0 else rank
+        nodes = np.flatnonzero(self.tree >= 0)
+        sel = (r >= 0) & (self.degree[nodes] > 0)
+        nodes, r = nodes[sel], r[sel]
+        return self.degree[nodes[np.argsort(r, kind='stable')]]
+    def toNodes(self, keep=None):
+        # Node objects of the forest, or of the nodes in keep and the edges
+        # between them, as (trees, nodes by signature)
+        keep = range(len(self)) if keep is None else np.asarray(keep).tolist()
+        nodes = {}
+        for i in keep:
+            n = Node(self.getProgram(i))
+            n.level = int(self.level[i])
+            n.height = int(self.height[i])
+            n.size = int(self.size[i])
+            nodes[i] = n
+        for i, n in nodes.items():
+            p = int(self.parent[i])
+            if p in nodes:
+                n.parent = nodes[p]
+            n.children = [nodes[c] for c in self.getChildren(i).tolist() if c in nodes]
+        trees = [nodes[r] for r in self.roots.tolist() if r in nodes and len(nodes[r].children) > 0]
+        return trees, {n.program.sig: n for n in nodes.values()}
+
 def buildMutationTrees(p_all, p_generated, p_corpus, p_triage):
+    nodes_all_dedup = {} # Node ids by signature
+    programs = [] # Program of each node
+    parents = []
+    links = [] # Nodes in the order they were linked to their parents
     roots = []
-    nodes_all_dedup = {}
+    sig = p_all.sig.tolist()
     # Establish roots
     for pid in p_generated:
-        p = p_all[pid]
-        if not p.sig in nodes_all_dedup:
-            n = Node(p)
-            n.level = 0
-            nodes_all_dedup[p.sig] = n 
-            roots.append(n)
+        if not sig[pid] in nodes_all_dedup:
+            nodes_all_dedup[sig[pid]] = len(programs)
+            roots.append(len(programs))
+            programs.append(pid)
+            parents.append(-1)
     # Back trace to build the tree
+    parent = p_all.parent.tolist()
+    origin = p_all.origin.tolist()
+    # Nearest ancestor of every program that is not a minimization
+    skip = rootTable(np.where(p_all.origin == ORIGIN_MINIMIZE, p_all.parent, -1))[0].tolist()
+    executed = p_all.executed.tolist()
     for i in range(len(p_all)):
-        p = p_all[i]
-        if not p.executed:
+        if not executed[i]:
             continue
-        if p.sig in nodes_all_dedup:
+        if sig[i] in nodes_all_dedup:
             continue
         # Ignore minimize nodes
-        if p.origin == "Minimize":
+        if origin[i] == ORIGIN_MINIMIZE:
             continue
         # Backtrack
-        p_cur = p
-        n_cur = Node(p)
-        nodes_all_dedup[p.sig] = n_cur
-        n_parent = None
-        p_parent = None
-        root_reached = True
-        while p_cur.parent is not None:
-            p_parent = p_all[p_cur.parent]
-            dist = 1
-            while p_parent.origin == "Minimize" and p_parent.parent is not None: # Ignore minimize edges
-                p_parent = p_all[p_parent.parent]
-                dist += 1
-            #print(p_parent.sig, p_cur.sig, dist)
-            #exit()
-            if p_parent.sig in nodes_all_dedup: # This check ensures there will be no cycles
-                n_parent = nodes_all_dedup[p_parent.sig]
-                n_cur.parent = n_parent
-                n_parent.children.append(n_cur)
-                root_reached = False
+        p_cur = i
+        n_cur = len(programs)
+        nodes_all_dedup[sig[i]] = n_cur
+        programs.append(i)
+        parents.append(-1)
+        while parent[p_cur] >= 0:
+            p_parent = skip[parent[p_cur]] # Ignore minimize edges
+            links.append(n_cur)
+            n_parent = nodes_all_dedup.get(sig[p_parent])
+            if n_parent is not None: # This check ensures there will be no cycles
+                parents[n_cur] = n_parent
                 break
-            else:
-                n_parent = Node(p_parent)
-                nodes_all_dedup[p_parent.sig] = n_parent
-                n_cur.parent = n_parent
-                n_parent.children.append(n_cur)
-                p_cur = p_parent
-                n_cur = n_parent
-    # Sort out degree from root
-    for n in roots:
-        nodes_visited = set() # Check whether there are cycles
-        n.computeLevel(visited=nodes_visited)
-        # print(n.program.sig, n.height, len(n.children), len(n.program.children), len(n.program.minimizeChildren))
-    __roots = []
-    # Remove isolated roots
-    for n in roots:
-        if len(n.children) > 0:
-            __roots.append(n)
-    return __roots, nodes_all_dedup
+            n_parent = len(programs)
+            nodes_all_dedup[sig[p_parent]] = n_parent
+            programs.append(p_parent)
+            parents.append(-1)
+            parents[n_cur] = n_parent
+            p_cur = p_parent
+            n_cur = n_parent
+    return MutationForest(p_all, programs, parents, links, roots)
 
 def sortSample(l, n):
     if n == 0:
@@ -188,86 +283,65 @@ def sampleTreeNoAdd(trees, nodes, samplerate=0.05):
     return trees_sample, nodes_sample_dedup
 
 
-def sampleTree(trees, nodes, samplerate=0.05, maxlevel=100):
-    # Node sampling
-    nodes_sample = random.sample(nodes.keys(), math.ceil(len(nodes) * samplerate))
-    # Reconstruct sampled tree via back-tracking 
-    nodes_sample_dedup = {}
-    trees_sample = []
-    for nsig in nodes_sample:
-        if nsig in nodes_sample_dedup:
-            continue
-        n_cur = nodes[nsig]
-        n_new_cur = Node(nodes[nsig].program)
-        nodes_sample_dedup[nsig] = n_new_cur
-        n_parent = n_cur.parent
-        root_reached = True
-        while n_parent is not None:
-            n_parent_sig = n_parent.program.sig
-            if n_parent_sig in nodes_sample_dedup: # This check ensures there will be no cycles
-                n_new_parent = nodes_sample_dedup[n_parent_sig]
-                n_new_cur.parent = n_new_parent
-                n_new_parent.children.append(n_new_cur)
-                root_reached = False
-                break
-            else:
-                n_new_parent = Node(n_parent.program)
-                nodes_sample_dedup[n_parent_sig] = n_new_parent
-                n_new_cur.parent = n_new_parent
-                n_new_parent.children.append(n_new_cur)
-                n_new_cur = n_new_parent
-                n_cur = n_parent
-                n_parent = n_cur.parent
-        if root_reached and n_new_cur.program.origin == "Generate":
-            if len(n_new_cur.children) > 0:
-                trees_sample.append(n_new_cur)
-    for n in trees_sample:
-        nodes_visited = set() # Check whether there are cycles
-        n.computeLevel(visited=nodes_visited, maxlevel=maxlevel)
-    print(trees_sample, len(nodes_sample_dedup))
-    return trees_sample, nodes_sample_dedup
+def sampleTree(forest, samplerate=0.05, maxlevel=100):
+    # Node sampling, the sample is closed under ancestors. Returns the
+    # sampled nodes of generated trees up to maxlevel, roots first.
+    parent = forest.parent.tolist()
+    sampled = bytearray(len(forest))
+    if samplerate < 1.0:
+        nodes_sample = random.sample(range(len(forest)), math.ceil(len(forest) * samplerate))
+    else:
+        nodes_sample = range(len(forest))
+    # Reconstruct sampled tree via back-tracking
+    for i in nodes_sample:
+        while i >= 0 and not sampled[i]:
+            sampled[i] = 1
+            i = parent[i]
+    nodes = np.flatnonzero(np.frombuffer(bytes(sampled), dtype=np.uint8))
+    roots = forest.roots[forest.p_all.origin[forest.program[forest.roots]] == ORIGIN_GENERATE]
+    generated = np.zeros(len(forest), dtype=bool)
+    generated[roots] = True
+    nodes = nodes[(forest.level[nodes] >= 0) & (forest.level[nodes] <= maxlevel)]
+    nodes = nodes[generated[forest.tree[nodes]]]
+    # Drop stray roots
+    inner = np.zeros(len(forest), dtype=bool)
+    inner[forest.tree[nodes[forest.level[nodes] > 0]]] = True
+    nodes = nodes[inner[forest.tree[nodes]]]
+    return nodes[np.argsort(forest.level[nodes], kind='stable')]
+
+def pruneTree(forest, nodes, maxnodes):
+    # Random pruning: pick random nodes and remove their subtrees until at
+    # most maxnodes are left. A node survives as long as neither it nor an
+    # ancestor has been picked, so with a random pick order t, node n is
+    # removed at d[n] = min(t) over its ancestors and the nodes removed last
+    # are kept. nodes must be closed under ancestors and sorted by level.
+    if len(nodes) <= maxnodes:
+        return nodes
+    d = dict(zip(nodes.tolist(), random.sample(range(len(nodes)), len(nodes))))
+    parent = forest.parent[nodes].tolist()
+    for i, p in zip(nodes.tolist(), parent):
+        if p >= 0 and d[p] < d[i]:
+            d[i] = d[p]
+    d = np.array([d[i] for i in nodes.tolist()])
+    return nodes[d > np.sort(d)[::-1][maxnodes]]
 
-def plotForest(trees, nodes, samplerate=1.0, prunerate=0.0, maxnodes=500, maxtrees=100000, maxlevel=5000, outfile="tree.png"):
+def plotForest(forest, samplerate=1.0, prunerate=0.0, maxnodes=500, maxtrees=100000, maxlevel=5000, outfile="tree.png"):
     #if maxnodes / len(nodes) < samplerate / 2:
-    samplerate = maxnodes * 2.0 / len(nodes)
+    samplerate = maxnodes * 2.0 / max(len(forest), 1)
     AG = PG.AGraph(directed=True, strict=True)
     AG.graph_attr.update(penwidth=3, ratio='fill', size='10,16')
     AG.node_attr.update(color='black', shape='circle', style='filled', fillcolor='red',penwidth=3)
     AG.edge_attr.update(len='2.0',penwidth=3)
-    if samplerate < 1.0:
-        trees_sample, nodes_sample_dedup = sampleTree(trees, nodes, samplerate=samplerate, maxlevel=maxlevel)
-    else:
-        trees_sample = trees
+    nodes = sampleTree(forest, samplerate=samplerate, maxlevel=maxlevel)
+    print(len(nodes))
     # Prune randomly if necessary
+    nodes = pruneTree(forest, nodes, maxnodes)
+    trees_sample, nodes_sample_dedup = forest.toNodes(nodes)
     size_total = 0
     for r in trees_sample:
+        r.computeLevel(visited=set())
         size_total += r.size
     print(size_total)
-    while size_total > maxnodes:
-        nsig = random.choice(list(nodes_sample_dedup.keys()))
-        n = nodes_sample_dedup[nsig]
-        # Remove 
-        if n.parent is not None and n in n.parent.children:
-            n.parent.children.remove(n)
-        if n in trees_sample:
-            trees_sample.remove(n)
-        # Recompute sizes and everything
-        size_total = 0
-        for r in trees_sample:
-            nodes_visited = set() # Check whether there are cycles
-            r.computeLevel(visited=nodes_visited, maxlevel=maxlevel)
-            size_total += r.size
-        # Remove nodes from pool
-        deleted_nodes = n.getOffspring()
-        print("Deleting:", n, n.size)
-        for dn in deleted_nodes:
-            dnsig = dn.program.sig
-            if dnsig in nodes_sample_dedup:
-                del nodes_sample_dedup[dnsig]
-        #for n in trees_sample:
-        #    nodes_visited = set() # Check whether there are cycles
-        #    n.computeLevel(visited=nodes_visited, maxlevel=maxlevel)
-    print(size_total)
     '''
     if len(trees_sample) > 0:
         n_trees = min(math.ceil(len(trees_sample) * (1.0 - prunerate)), maxtrees)
@@ -373,45 +447,39 @@ def plotMutationTree(tests):
         # name = name + '_' + module
         print("Plotting mutation tree for %s" % test)
         try:
-            p_all, p_generated, p_corpus, p_triage, __data = loadDataCached('program_%s.cache', test, __processTest);
-            for i in range(len(p_all)):
-                if type(p_all[i]) == dict:
-                    p_all[i] = Program.FromDict(p_all[i])
+            p_all, p_generated, p_corpus, p_triage, __data = loadDataCached('program_%s.cache', test, __processTest, version=ProgramParser.cacheVersion(test));
         except:
             traceback.print_exc()
             continue;
-        trees, nodes = buildMutationTrees(p_all, p_generated, p_corpus, p_triage)
-        print(len(trees), len(nodes))
-        plotForest(trees, nodes, outfile="mt_sample_%s.png" % test)
+        forest = buildMutationTrees(p_all, p_generated, p_corpus, p_triage)
+        # Isolated roots are not counted as trees
+        trees = forest.roots[forest.degree[forest.roots] > 0]
+        print(len(trees), len(forest))
+        plotForest(forest, outfile="mt_sample_%s.png" % test)
         datas[name]["Num_Trees"].append(len(trees))
-        num_lf = 0
-        for r in trees:
-            # For generation, just consider ones that're mutated
-            if r.height > 0 and r.size > 1:
-                datas[name]["Tree_Height"].append(r.height)
-                datas[name]["Tree_Size"].append(r.size)
-            degrees = []
-            visited = set()
-            l = r.collectDegrees(degrees, visited)
-            # print(l, len(degrees))
-            datas[name]["Node_Degree"] += degrees
-            num_lf += l
-            datas[name]["Leaf_Nodes_Per_Tree"].append(l)
-            datas[name]["Leaf_Nodes_Percentage_Per_Tree"].append(l / r.size)
+        # For generation, just consider ones that're mutated
+        sel = trees[(forest.height[trees] > 0) & (forest.size[trees] > 1)]
+        datas[name]["Tree_Height"] += forest.height[sel].tolist()
+        datas[name]["Tree_Size"] += forest.size[sel].tolist()
+        datas[name]["Node_Degree"] += forest.treeDegrees(trees).tolist()
+        leaves = forest.leaves[trees]
+        num_lf = int(leaves.sum())
+        datas[name]["Leaf_Nodes_Per_Tree"] += leaves.tolist()
+        datas[name]["Leaf_Nodes_Percentage_Per_Tree"] += (leaves / forest.size[trees]).tolist()
         datas[name]["Leaf_Nodes"].append(num_lf)
-        if len(nodes) > 0:
-            datas[name]["Leaf_Nodes_Percentage"].append(100.0 * num_lf / len(nodes))
-        for sig in nodes:
-            n = nodes[sig]
-            # datas[name]["Node_Degree"].append(len(n.children))
-            csig = n.program.sig
+        if len(forest) > 0:
+            datas[name]["Leaf_Nodes_Percentage"].append(100.0 * num_lf / len(forest))
+        sigs = [sig.decode() for sig in p_all.sig[forest.program].tolist()]
+        for i in range(len(forest)):
+            # datas[name]["Node_Degree"].append(forest.degree[i])
+            csig = sigs[i]
             if csig in p_corpus:
                 src = p_all[p_corpus[csig]].corpusSource
                 if src is not None:
-                    datas[name]["Seed_Subtree_Height"][src].append(n.height)
-                    datas[name]["Seed_Subtree_Size"][src].append(n.size)
-                    datas[name]["Seed_Subtree_Height"]["All"].append(n.height)
-                    datas[name]["Seed_Subtree_Size"]["All"].append(n.size)
+                    datas[name]["Seed_Subtree_Height"][src].append(int(forest.height[i]))
+                    datas[name]["Seed_Subtree_Size"][src].append(int(forest.size[i]))
+                    datas[name]["Seed_Subtree_Height"]["All"].append(int(forest.height[i]))
+                    datas[name]["Seed_Subtree_Size"]["All"].append(int(forest.size[i]))
     # Overall Tree size and height
     # plotCDF(datas, key="Tree_Height", xlabel="Tree Height", ylabel="Cumulative # Trees", title="", outfile="mt_height_overall.png", xlogscale=True, raw=True, small=False);
     # plotCDF(datas, key="Tree_Size", xlabel="Tree Size", ylabel="Cumulative # Trees", title="", outfile="mt_size_overall.png", xlogscale=True, raw=True, small=False);
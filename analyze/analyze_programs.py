@@ -2,6 +2,7 @@ import sys
 import os
 import copy
 import traceback
+from array import array
 import simplejson as json
 import matplotlib.pyplot as plt
 from matplotlib.collections import PatchCollection
@@ -10,237 +11,389 @@ import numpy as np
 import pygraphviz as PG
 
 from plot import plot, plotBar, plotCDF, plotBar1, plot2
-from utils import loadDataCached, getTestParams, averageData
+from utils import loadDataCached, getTestParams, averageData, Columns
+from pcindex import pcIndexFile, pcIndexId, loadPCIndex, internPCs
+from logparser import LogParser, parseResult, SNAPSHOT_INTERVAL, EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_CORPUS_COVERAGE, EV_PROGRAM, EV_COMMENT
+
+ORIGINS = [None, "Generate", "Minimize", "Mutate"]
+ORIGIN_NONE = 0
+ORIGIN_GENERATE = 1
+ORIGIN_MINIMIZE = 2
+ORIGIN_MUTATE = 3
+
+class ProgramTable:
+    """
+    All programs of one run. Scalar attributes live in typed arrays indexed
+    by program id, list attributes in CSR offset/value arrays. While parsing,
+    list entries are logged as (id, value) pairs and finish() packs them.
+    p_all[i] returns a Program view of row i.
+    """
+    LISTS = ("coverage", "coverageCorpus", "children", "minimizeChildren")
+    def __init__(self):
+        self.sig = []
+        self.ts = array('d')
+        self.size = array('l')
+        self.executed = array('b')
+        self.inCorpus = array('b')
+        self.origin = array('b')
+        self.corpusSource = array('b')
+        self.parent = array('q')
+        self.minimize = array('q')
+        # PCs are unsigned 64 bit, program ids are not
+        self.lists = {}
+        for name in self.LISTS:
+            self.lists[name] = (array('q'), array('Q' if "coverage" in name else 'q'))
+        self.offsets = None
+        self.values = None
+        self.pcindex = None
+    def add(self, sig, ts, executed=True):
+        pid = len(self.sig)
+        self.sig.append(sig)
+        self.ts.append(ts)
+        self.size.append(0)
+        self.executed.append(executed)
+        self.inCorpus.append(False)
+        self.origin.append(ORIGIN_NONE)
+        self.corpusSource.append(ORIGIN_NONE)
+        self.parent.append(-1)
+        self.minimize.append(-1)
+        return pid
+    def append(self, name, pid, value):
+        pids, values = self.lists[name]
+        pids.append(pid)
+        values.append(value)
+    def finish(self):
+        if self.offsets is not None:
+            return self
+        n = len(self.sig)
+        self.sig = np.array([s.encode() for s in self.sig], dtype='S')
+        for name in ("ts", "size", "executed", "inCorpus", "origin", "corpusSource", "parent", "minimize"):
+            col = np.array(getattr(self, name))
+            if name in ("executed", "inCorpus"):
+                col = col.astype(bool)
+            setattr(self, name, col)
+        self.offsets = {}
+        self.values = {}
+        for name in self.LISTS:
+            pids, values = self.lists[name]
+            pids = np.array(pids, dtype=np.int64)
+            order = np.argsort(pids, kind='stable')
+            self.offsets[name] = np.concatenate(([0], np.cumsum(np.bincount(pids, minlength=n)))).astype(np.int64)
+            self.values[name] = np.array(values)[order]
+        self.lists = None
+        return self
+    def internPCs(self, fn):
+        # Replace raw PCs by uint32 ids of the per-kernel dictionary fn
+        if not self.pcindex is None:
+            return self
+        for name in ("coverage", "coverageCorpus"):
+            self.values[name] = internPCs(fn, self.values[name])
+        self.pcindex = fn
+        return self
+    def getList(self, name, pid):
+        offsets = self.offsets[name]
+        return self.values[name][offsets[pid]:offsets[pid+1]]
+    def getPCs(self, name, pid=None):
+        # Like getList, but always raw PCs. Without pid, the whole column
+        ids = self.values[name] if pid is None else self.getList(name, pid)
+        if self.pcindex is None:
+            return ids
+        return loadPCIndex(self.pcindex).pcs[ids]
+    def count(self, name):
+        return np.diff(self.offsets[name])
+    def __len__(self):
+        return len(self.sig)
+    def __getitem__(self, pid):
+        if pid < 0:
+            pid += len(self.sig)
+        if pid < 0 or pid >= len(self.sig):
+            raise IndexError(pid)
+        return Program(self, pid)
+    def __iter__(self):
+        for pid in range(len(self.sig)):
+            yield Program(self, pid)
 
 class Program:
-    def __init__(self, sig):
-        self.id = 0;
-        self.ts = 0;
-        self.executed = True;
-        self.inCorpus = False;
-        self.corpusSource = None;
-        self.sig = sig
-        self.size = 0
-        self.coverage = []
-        self.coverageCorpus = []
-        self.minimize = None
-        self.minimizeChildren = []
-        self.children = []
-        self.origin = None
-        self.parent = None
+    """ Read-only view of one row of a ProgramTable """
+    __slots__ = ("table", "id")
+    def __init__(self, table, pid):
+        self.table = table
+        self.id = pid
+    @property
+    def sig(self):
+        return self.table.sig[self.id].decode()
+    @property
+    def ts(self):
+        return float(self.table.ts[self.id])
+    @property
+    def size(self):
+        return int(self.table.size[self.id])
+    @property
+    def executed(self):
+        return bool(self.table.executed[self.id])
+    @property
+    def inCorpus(self):
+        return bool(self.table.inCorpus[self.id])
+    @property
+    def origin(self):
+        return ORIGINS[self.table.origin[self.id]]
+    @property
+    def corpusSource(self):
+        return ORIGINS[self.table.corpusSource[self.id]]
+    @property
+    def parent(self):
+        v = int(self.table.parent[self.id])
+        return None if v < 0 else v
+    @property
+    def minimize(self):
+        v = int(self.table.minimize[self.id])
+        return None if v < 0 else v
+    @property
+    def coverage(self):
+        return self.table.getPCs("coverage", self.id)
+    @property
+    def coverageCorpus(self):
+        return self.table.getPCs("coverageCorpus", self.id)
+    @property
+    def children(self):
+        return self.table.getList("children", self.id)
+    @property
+    def minimizeChildren(self):
+        return self.table.getList("minimizeChildren", self.id)
     def __eq__(self, other):
-        return self.data == other.data
+        return isinstance(other, Program) and self.table is other.table and self.id == other.id
     def __hash__(self):
-        return hash(self.data)
+        return hash(self.id)
     def _asdict(self):
-        return self.__dict__
-    @staticmethod
-    def FromDict(d):
-        ret = Program('')
-        for k in d:
-            ret.__setattr__(k, d[k])
+        ret = {"id": self.id}
+        for k in ("ts", "executed", "inCorpus", "corpusSource", "sig", "size", "minimize", "origin", "parent"):
+            ret[k] = getattr(self, k)
+        for k in ProgramTable.LISTS:
+            ret[k] = getattr(self, k).tolist()
         return ret
 
-def __processTest(test):
-    ret = []
-    fn = 'result_' + test
-    if not os.path.isfile(fn):
-        return set(), [], [];
-    p_db = {}
-    p_all = [] # No Dedup
-    p_generated = []
-    p_corpus = {}
-    p_triage = {} # Input of triage
-    f = open(fn)
-    coverageDb = set()
-    coverageCorpusDb = set()
-    status = "STATUS_NONE"
-    status_program = False;
-    sig_current = ""
-    sig_from = ""
-    data_current = ""
-    data_from = ""
-    p_current = None
-    p_from = None
-    ts_bgn = 0;
-    ts_cur = 0;
-    count = {
-        "Time_Elapsed": 0,
-        "Execute_Count": 0,
-        "Generate_Count": 0,
-        "Minimize_Count": 0,
-        "Mutate_Count": 0,
-        "Generate_Signal": 0,
-        "Minimize_Signal": 0,
-        "Mutate_Signal": 0,
-        "Generate_Coverage": 0,
-        "Minimize_Coverage": 0,
-        "Mutate_Coverage": 0,
-    }
-    for line in f:
-        line = line.strip('\n').strip();
-        if len(line) == 0:
-            continue;
-        if line[:3] == '<<<' and line[-3:] == '>>>':
-            ts_cur = int(line.strip('<<<').strip('>>>'))
-            if ts_bgn == 0:
-                ts_bgn = ts_cur
-            count["Time_Elapsed"] = (ts_cur - ts_bgn) / 1000000000.0
-            ret.append(copy.deepcopy(count))
-        elif line[:2] == '- ' and 'executeRaw' in line:
-            # print(status)
-            pgsz = int(line.split()[-1])
-            if not p_current is None:
-                p_current.size = pgsz
-            count["Execute_Count"] += 1;
+def rootTable(parent, weight=None):
+    # Root of every program along parent links (-1 ends a chain) and its
+    # depth, the sum of weight over the links walked (1 per link by default).
+    # Each program is resolved once: a walk stops at the first program that
+    # is already known and the whole path is filled in from there.
+    parent = np.asarray(parent).tolist()
+    weight = [1] * len(parent) if weight is None else np.asarray(weight, dtype=np.int64).tolist()
+    root = [-1] * len(parent)
+    depth = [0] * len(parent)
+    for i in range(len(parent)):
+        if root[i] >= 0:
+            continue
+        path = []
+        j = i
+        while j >= 0 and root[j] == -1:
+            root[j] = -2 # On the current path, breaks cycles
+            path.append(j)
+            j = parent[j]
+        if j < 0 or root[j] == -2:
+            # Chain ends (or loops back) at the last program of the path
+            r = path.pop()
+            root[r] = r
+            d = 0
+        else:
+            r = root[j]
+            d = depth[j]
+        for k in reversed(path):
+            d += weight[k]
+            root[k] = r
+            depth[k] = d
+    return np.array(root, dtype=np.int64), np.array(depth, dtype=np.int64)
+
+class ProgramParser(LogParser):
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_CORPUS_COVERAGE, EV_PROGRAM, EV_COMMENT)
+    version = 4
+    def __init__(self):
+        self.p_db = {}
+        self.p_all = ProgramTable() # No Dedup
+        self.p_generated = []
+        self.p_corpus = {}
+        self.p_triage = {} # Input of triage
+        self.coverageDb = set()
+        self.coverageCorpusDb = set()
+        self.status = "STATUS_NONE"
+        self.status_program = False;
+        self.sig_current = ""
+        self.data_current = ""
+        self.p_current = None
+        self.p_from = None
+        self.ts_bgn = 0;
+        self.ts_cur = 0;
+        self.count = {
+            "Time_Elapsed": 0.0,
+            "Execute_Count": 0,
+            "Generate_Count": 0,
+            "Minimize_Count": 0,
+            "Mutate_Count": 0,
+            "Generate_Signal": 0,
+            "Minimize_Signal": 0,
+            "Mutate_Signal": 0,
+            "Generate_Coverage": 0,
+            "Minimize_Coverage": 0,
+            "Mutate_Coverage": 0,
+        }
+        self.ret = Columns(self.count)
+    def onTimestamp(self, ts):
+        self.ts_cur = ts
+        if self.ts_bgn == 0:
+            self.ts_bgn = ts
+        self.count["Time_Elapsed"] = (self.ts_cur - self.ts_bgn) / 1000000000.0
+        self.ret.append(self.count)
+    def onExecute(self, line):
+        count = self.count
+        status = self.status
+        pgsz = int(line.split()[-1])
+        if not self.p_current is None:
+            self.p_all.size[self.p_current] = pgsz
+        count["Execute_Count"] += 1;
+        if "GENERATE" in status:
+            count["Generate_Count"] += 1;
+        elif "MINIMIZE" in status:
+            count["Minimize_Count"] += 1;
+        elif "MUTATE" in status:
+            count["Mutate_Count"] += 1;
+    def onCorpusCoverage(self, pc):
+        if (pc & 0xffff000000000000) != 0xffff000000000000 and (pc & 0xffff000000000000) != 0:
+            return
+        if not pc in self.coverageCorpusDb:
+            self.coverageCorpusDb.add(pc)
+            if self.p_current is not None:
+                self.p_all.append("coverageCorpus", self.p_current, pc)
+    def onCoverage(self, pc):
+        if (pc & 0xffff000000000000) != 0xffff000000000000 and (pc & 0xffff000000000000) != 0:
+            return
+        if not pc in self.coverageDb:
+            self.coverageDb.add(pc)
+            if self.p_current is not None:
+                self.p_all.append("coverage", self.p_current, pc)
+            status = self.status
             if "GENERATE" in status:
-                count["Generate_Count"] += 1;
+                self.count["Generate_Coverage"] += 1;
             elif "MINIMIZE" in status:
-                count["Minimize_Count"] += 1;
+                self.count["Minimize_Coverage"] += 1;
             elif "MUTATE" in status:
-                count["Mutate_Count"] += 1;
-            # ret.append(copy.deepcopy(count))
-        elif line[:2] == "+ ":
-            try:
-                pc = int(line.split()[1], 16)
-            except:
-                continue
-            if (pc & 0xffff000000000000) != 0xffff000000000000 and (pc & 0xffff000000000000) != 0:
-                continue
-            if not pc in coverageCorpusDb:
-                coverageCorpusDb.add(pc)
-                if p_current is not None:
-                    p_current.coverageCorpus.append(pc)
-        elif line[:2] == "= ":
-            try:
-                pc = int(line.split()[1], 16)
-            except:
-                continue
-            if (pc & 0xffff000000000000) != 0xffff000000000000 and (pc & 0xffff000000000000) != 0:
-                continue
-            if not pc in coverageDb:
-                coverageDb.add(pc)
-                if p_current is not None:
-                    p_current.coverage.append(pc)
-                if "GENERATE" in status:
-                    count["Generate_Coverage"] += 1;
-                elif "MINIMIZE" in status:
-                    count["Minimize_Coverage"] += 1;
-                elif "MUTATE" in status:
-                    count["Mutate_Coverage"] += 1;
-        elif line[0] != "#":
-            if (line == '>' or line[:3] == '>>>') and status_program == False:
-                status_program = True
-                data_current = '';
-                sig_current = '';
-                if line[:3] == '>>>':
-                    sig_current = line.strip('>>>').strip()
-                else:
-                    data_current += line.strip('>').strip() + '\n'
-            elif (line == '<' or line == '<<<') and status_program == True:
-                status_program = False
-                if status != "MINIMIZE_FROM" and status != "MUTATE_FROM":
-                    p_current = Program(sig=sig_current)
-                    p_current.ts = (ts_cur - ts_bgn) / 1000000000
-                    p_current.id = len(p_all)
-                    p_all.append(p_current)
+                self.count["Mutate_Coverage"] += 1;
+    def onProgram(self, line):
+        p_all = self.p_all
+        p_db = self.p_db
+        status = self.status
+        if (line == '>' or line[:3] == '>>>') and self.status_program == False:
+            self.status_program = True
+            self.data_current = '';
+            self.sig_current = '';
+            if line[:3] == '>>>':
+                self.sig_current = line.strip('>>>').strip()
+            else:
+                self.data_current += line.strip('>').strip() + '\n'
+        elif (line == '<' or line == '<<<') and self.status_program == True:
+            self.status_program = False
+            sig_current = self.sig_current
+            ts = (self.ts_cur - self.ts_bgn) / 1000000000
+            if status != "MINIMIZE_FROM" and status != "MUTATE_FROM":
+                self.p_current = p_all.add(sig_current, ts)
+                if not sig_current in p_db:
+                     p_db[sig_current] = self.p_current
+            p_current = self.p_current
+            p_from = self.p_from
+            if status == "GENERATE":
+                if p_all.origin[p_current] == ORIGIN_NONE:
+                    p_all.origin[p_current] = ORIGIN_GENERATE
+                self.p_generated.append(p_current)
+            elif status == "MINIMIZE_FROM":
+                sig_from = sig_current
+                if not sig_from in self.p_triage:
+                    p_current = self.p_current = p_all.add(sig_current, ts, executed=False)
                     if not sig_current in p_db:
-                         p_db[sig_current] = p_current.id
-                if status == "GENERATE":
-                    if p_current.origin is None:
-                        p_current.origin = "Generate"
-                    #elif p_current.origin != "Generate":
-                    #    print("Duplicate program: ", p_current.origin, "Generate")
-                    p_generated.append(p_current.id)
-                elif status == "MINIMIZE_FROM":
-                    sig_from = sig_current
-                    if not sig_from in p_triage:
-                        p_current = Program(sig=sig_current)
-                        p_current.executed = False
-                        p_current.ts = (ts_cur - ts_bgn) / 1000000000
-                        p_current.id = len(p_all)
-                        p_all.append(p_current)
-                        if not sig_current in p_db:
-                            p_db[sig_current] = p_current.id
-                        else:
-                            p_current.parent = p_all[p_db[sig_current]].id
-                        p_triage[sig_from] = p_current.id
-                    p_from = p_all[p_triage[sig_from]]
-                elif status == "MINIMIZE_ATTEMPT":
-                    # print(p_from.id, p_current.id)
-                    #if p_from != p_current:
-                    if p_current.origin is None:
-                        p_current.origin = "Minimize"
-                    p_from.minimizeChildren.append(p_current.id)
-                    p_current.parent = p_from.id
-                elif status == "MINIMIZE_TO":
-                    #if p_from != p_current:
-                    if p_current.origin is None:
-                        p_current.origin = "Minimize"
-                    #elif p_current.origin != "Minimize":
-                    #    print("Duplicate program: ", p_current.origin, "Minimize")
-                    p_current.executed = False
-                    p_from.minimize = p_current.id
-                    p_current.parent = p_from.id
-                    # print(p_from.id, p_current.id)
-                elif status == "MUTATE_FROM":
-                    sig_from = sig_current
-                    if not sig_from in p_corpus:
-                        print("This should not happen!!!!")
-                        print(sig_from)
-                        p_current = Program(sig=sig_current)
-                        p_current.executed = False
-                        p_current.ts = (ts_cur - ts_bgn) / 1000000000
-                        p_current.id = len(p_all)
-                        p_all.append(p_current)
-                        if not sig_current in p_db:
-                            p_db[sig_current] = p_current.id
-                        else:
-                            p_current.parent = p_all[p_db[sig_current]].id
-                        p_corpus[sig_from] = p_current.id
-                    p_from = p_all[p_corpus[sig_from]]
-                    status = "MUTATE_TO";
-                elif status == "MUTATE_TO":
-                    #if p_from != p_current:
-                    if p_current.origin is None:
-                        p_current.origin = "Mutate"
-                        #elif p_current.origin != "Mutate":
-                        #    print("Duplicate program: ", p_current.origin, "Mutate")
-                    p_from.children.append(p_current.id)
-                    p_current.parent = p_from.id
-                    # print(p_from.id, p_current.id)
-            elif status_program == True:
-                if line[:3] != ">>>":
-                    data_current += line.strip("> ") + '\n'
-        else:
-            if "Generate" in line:
-                status = "GENERATE"
-            elif line[-8:] == "Minimize":
-                status = "MINIMIZE_FROM"
-            elif "Minimize Attempt" in line:
-                status = "MINIMIZE_ATTEMPT"
-            elif "Minimize Final" in line:
-                status = "MINIMIZE_TO"
-            elif "# Result:" in line:
-                tmp = line.strip("# Result: ").split(',')
-            elif "Mutate" in line:
-                status = "MUTATE_FROM"
-            elif "addInputToCorpus" in line:
-                p_current.inCorpus = True
-                crpsrc = int(line.split("Source: ")[1])
-                if crpsrc == 0:
-                    p_current.corpusSource = "Generate"
-                elif crpsrc == 1:
-                    p_current.corpusSource = "Mutate"
-                elif crpsrc == 2:
-                    p_current.corpusSource = "Minimize"
-                else:
-                    print("WTF")
-                sig_current = p_current.sig
-                if not sig_current in p_corpus:
-                    p_corpus[sig_current] = p_current.id
-    f.close();
-    return p_all, p_generated, p_corpus, p_triage, ret;
+                        p_db[sig_current] = p_current
+                    else:
+                        p_all.parent[p_current] = p_db[sig_current]
+                    self.p_triage[sig_from] = p_current
+                self.p_from = self.p_triage[sig_from]
+            elif status == "MINIMIZE_ATTEMPT":
+                if p_all.origin[p_current] == ORIGIN_NONE:
+                    p_all.origin[p_current] = ORIGIN_MINIMIZE
+                p_all.append("minimizeChildren", p_from, p_current)
+                p_all.parent[p_current] = p_from
+            elif status == "MINIMIZE_TO":
+                if p_all.origin[p_current] == ORIGIN_NONE:
+                    p_all.origin[p_current] = ORIGIN_MINIMIZE
+                p_all.executed[p_current] = False
+                p_all.minimize[p_from] = p_current
+                p_all.parent[p_current] = p_from
+            elif status == "MUTATE_FROM":
+                sig_from = sig_current
+                if not sig_from in self.p_corpus:
+                    print("This should not happen!!!!")
+                    print(sig_from)
+                    p_current = self.p_current = p_all.add(sig_current, ts, executed=False)
+                    if not sig_current in p_db:
+                        p_db[sig_current] = p_current
+                    else:
+                        p_all.parent[p_current] = p_db[sig_current]
+                    self.p_corpus[sig_from] = p_current
+                self.p_from = self.p_corpus[sig_from]
+                self.status = "MUTATE_TO";
+            elif status == "MUTATE_TO":
+                if p_all.origin[p_current] == ORIGIN_NONE:
+                    p_all.origin[p_current] = ORIGIN_MUTATE
+                p_all.append("children", p_from, p_current)
+                p_all.parent[p_current] = p_from
+        elif self.status_program == True:
+            if line[:3] != ">>>":
+                self.data_current += line.strip("> ") + '\n'
+    def onComment(self, line):
+        if "Generate" in line:
+            self.status = "GENERATE"
+        elif line[-8:] == "Minimize":
+            self.status = "MINIMIZE_FROM"
+        elif "Minimize Attempt" in line:
+            self.status = "MINIMIZE_ATTEMPT"
+        elif "Minimize Final" in line:
+            self.status = "MINIMIZE_TO"
+        elif "# Result:" in line:
+            tmp = line.strip("# Result: ").split(',')
+        elif "Mutate" in line:
+            self.status = "MUTATE_FROM"
+        elif "addInputToCorpus" in line:
+            p_all = self.p_all
+            p_current = self.p_current
+            p_all.inCorpus[p_current] = True
+            crpsrc = int(line.split("Source: ")[1])
+            if crpsrc == 0:
+                p_all.corpusSource[p_current] = ORIGIN_GENERATE
+            elif crpsrc == 1:
+                p_all.corpusSource[p_current] = ORIGIN_MUTATE
+            elif crpsrc == 2:
+                p_all.corpusSource[p_current] = ORIGIN_MINIMIZE
+            else:
+                print("WTF")
+            sig_current = p_all.sig[p_current]
+            self.sig_current = sig_current
+            if not sig_current in self.p_corpus:
+                self.p_corpus[sig_current] = p_current
+    def result(self):
+        return self.p_all.finish(), self.p_generated, self.p_corpus, self.p_triage, self.ret;
+    @classmethod
+    def finalize(cls, data, test):
+        data[0].internPCs(pcIndexFile(test))
+        return data
+    @classmethod
+    def cacheVersion(cls, test):
+        # The cache holds ids of the PC dictionary, a new one invalidates it
+        return (cls.version, pcIndexId(pcIndexFile(test)))
+
+def __perCount(cov, count):
+    return np.where(count > 0, cov / np.maximum(count, 1), 0).tolist()
+
+def __processTest(test):
+    fn = 'result_' + test
+    if not os.path.isfile(fn):
+        return set(), [], [];
+    return ProgramParser.finalize(parseResult(test, [ProgramParser()], snapshot=SNAPSHOT_INTERVAL)[0], test)
 
 def __addNode(AG, p):
     if p.inCorpus:
@@ -387,10 +540,7 @@ def plotPrograms(tests=["KCOV", "RAMINDEX"]):
         print("Plotting programs for %s" % test)
         try:
             # p_all, p_generated, p_corpus, p_triage, __data = __processTest(test);
-            p_all, p_generated, p_corpus, p_triage, __data = loadDataCached('program_%s.cache', test, __processTest);
-            for i in range(len(p_all)):
-                if type(p_all[i]) == dict:
-                    p_all[i] = Program.FromDict(p_all[i])
+            p_all, p_generated, p_corpus, p_triage, __data = loadDataCached('program_%s.cache', test, __processTest, version=ProgramParser.cacheVersion(test));
         except:
             traceback.print_exc()
             continue;
@@ -404,18 +554,19 @@ def plotPrograms(tests=["KCOV", "RAMINDEX"]):
         datas_jobpower_sum[name]["Mutate"].append(__data[-1]["Mutate_Coverage"])
         datas_jobpower_sum[name]["Triage"].append(__data[-1]["Minimize_Coverage"])
         # Accumulated
+        ts = __data["Time_Elapsed"].tolist()
         datas[test] = {
-            "Generation": [(v["Time_Elapsed"], v["Generate_Coverage"]) for v in __data],
-            "Minimization": [(v["Time_Elapsed"], v["Minimize_Coverage"]) for v in __data],
-            "Mutation": [(v["Time_Elapsed"], v["Mutate_Coverage"]) for v in __data],
+            "Generation": list(zip(ts, __data["Generate_Coverage"].tolist())),
+            "Minimization": list(zip(ts, __data["Minimize_Coverage"].tolist())),
+            "Mutation": list(zip(ts, __data["Mutate_Coverage"].tolist())),
         }
         datas_jobpower[name]["Generate"].append(datas[test]["Generation"])
         datas_jobpower[name]["Triage"].append(datas[test]["Minimization"])
         datas_jobpower[name]["Mutate"].append(datas[test]["Mutation"])
         datas[test+"_average"] = {
-            "Generation": [(v["Time_Elapsed"], v["Generate_Coverage"] / v["Generate_Count"] if v["Generate_Count"] > 0 else 0) for v in __data],
-            "Minimization": [(v["Time_Elapsed"], v["Minimize_Coverage"] / v["Minimize_Count"] if v["Minimize_Count"] > 0 else 0) for v in __data],
-            "Mutation": [(v["Time_Elapsed"], v["Mutate_Coverage"] / v["Mutate_Count"] if v["Mutate_Count"] > 0 else 0) for v in __data],
+            "Generation": list(zip(ts, __perCount(__data["Generate_Coverage"], __data["Generate_Count"]))),
+            "Minimization": list(zip(ts, __perCount(__data["Minimize_Coverage"], __data["Minimize_Count"]))),
+            "Mutation": list(zip(ts, __perCount(__data["Mutate_Coverage"], __data["Mutate_Count"]))),
         } 
         #plot(datas[test], 0, 1, xlabel="Time elapsed (hr)", ylabel="Total coverage (# edges)", title="", outfile="programs_%s.png" % test, xunit=3600.0);
         #plot(datas[test+"_average"], 0, 1, xlabel="Time elapsed (hr)", ylabel="Average coverage (# edges)", title="", outfile="programs_%s_avg.png" % test, ylogscale=True, xunit=3600);
@@ -436,7 +587,7 @@ def plotPrograms(tests=["KCOV", "RAMINDEX"]):
         plotBar(data_bin_avg, 0, 1, width=bin_size, xlabel="Time elapsed (hr)", ylabel="# of signals", title="", outfile="programs_bin_avg_%s.png" % test, xunit=3600.0);
         '''
         # Program size
-        datas_pgsize[test] = [p.size for p in p_all]
+        datas_pgsize[test] = p_all.size.tolist()
         datas_cpsize[test] = [];
         for psig in p_corpus:
             p = p_all[p_corpus[psig]]
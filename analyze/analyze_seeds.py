@@ -11,21 +11,18 @@ import pygraphviz as PG
 
 from plot import plot, plotBar, plotCDF, plotBar1
 from utils import loadDataCached, getTestParams
-from analyze_programs import Program, __processTest 
+from analyze_programs import ProgramParser, rootTable, __processTest
+from pcindex import PCIndex, loadPCIndex
 
 
-def analyzeExclusiveCoverage(data, names, coverage_all, coverage):
-    # First, find all exlucsive coverages
-    cov_exclusive = [[], []]
-    for c in coverage_all:
-        if c in coverage[0] and not c in coverage[1]:
-            cov_exclusive[0].append(c)
-        elif c in coverage[1] and not c in coverage[0]:
-            cov_exclusive[1].append(c)
-    print(len(cov_exclusive[0]), len(cov_exclusive[1]))
+def analyzeExclusiveCoverage(data, names, index, coverage, cov_ids):
+    # First, find all exlucsive coverages. coverage[tidx] is a hit count per PC id
+    covered = [coverage[0] > 0, coverage[1] > 0]
+    cov_exclusive = [covered[0] & ~covered[1], covered[1] & ~covered[0]]
+    print(np.count_nonzero(cov_exclusive[0]), np.count_nonzero(cov_exclusive[1]))
     tmp = {"Exclusive Coverage": {}}
     for tidx in range(2):
-        tmp["Exclusive Coverage"][names[tidx]] = [len(cov_exclusive[tidx])]
+        tmp["Exclusive Coverage"][names[tidx]] = [np.count_nonzero(cov_exclusive[tidx])]
     plotBar1(tmp, ylabel="Coverage", outfile="exclusive_cov_sum_%s_vs_%s.png" % (names[0], names[1]))
     # Next, find all programs
     # We also try to find the very source of the program
@@ -38,22 +35,20 @@ def analyzeExclusiveCoverage(data, names, coverage_all, coverage):
       chain_length[name] = []
       for r in range(len(data[tidx])):
         p_all = data[tidx][r][0]
-        for p in p_all:
-          if not p.executed:
-            continue
-          cov = 0
-          for c in p.coverage:
-            if c in cov_exclusive[tidx]:
-              cov += 1
-          if cov > 0:
+        # Source of every program and its number of mutations / minimizations
+        parent = p_all.parent
+        source, chain = rootTable(parent, (parent >= 0) & (p_all.sig != p_all.sig[parent]))
+        # Exclusive PCs hit by each program
+        hit = cov_exclusive[tidx][cov_ids[tidx][r]]
+        owner = np.repeat(np.arange(len(p_all)), p_all.count("coverage"))
+        excl = np.bincount(owner[hit], minlength=len(p_all))
+        for pid in np.nonzero((excl > 0) & p_all.executed)[0]:
+            p = p_all[pid]
+            cov = int(excl[pid])
             p_exclusive[tidx].append((p, cov))
             # Backtrack
-            p_cur = p
-            l = 0
-            while p_cur.parent is not None:
-                if p_cur.data != p_cur.parent.data:
-                    l += 1
-                p_cur = p_cur.parent
+            p_cur = p_all[int(source[pid])]
+            l = int(chain[pid])
             if p_cur.origin != "Generate":
                 continue
             # We ignore the initial generated program
@@ -62,7 +57,7 @@ def analyzeExclusiveCoverage(data, names, coverage_all, coverage):
             for i in range(cov):
                 source_time[name].append(p_cur.ts)
                 chain_length[name].append(l)
-            print(p_cur.data, p_cur.id, p_cur.ts, l)
+            print(p_cur.sig, p_cur.id, p_cur.ts, l)
     print(len(p_exclusive[0]), len(p_exclusive[1]))
     plotCDF(source_time, xlabel="Time (s)", ylabel="CDF", title="", outfile="exclusive_cov_source_time_%s_vs_%s.png" % (names[0], names[1])); 
     plotCDF(chain_length, xlabel="# of Mutations / Minimizations", ylabel="CDF", title="", outfile="exclusive_cov_chain_length_%s_vs_%s.png" % (names[0], names[1]));
@@ -93,12 +88,9 @@ def __plotSeeds(tests, names):
     name0 = names[0]
     name1 = names[1]
 
-    coverageCorpus_all = {}
-    coverageCorpus = [{}, {}]
-    coverage_all = {}
-    coverage = [{}, {}]
+    coverage = [[], []]
+    coverageCorpus = [[], []]
     seeds = [[], []]
-    coverages_exclusive = [set(), set()]
     
     data = [[], []]
 
@@ -111,38 +103,42 @@ def __plotSeeds(tests, names):
             tidx = 0
             if name1 in name:
                 tidx = 1
-            d = __processTest(test)
+            d = loadDataCached('program_%s.cache', test, __processTest, version=ProgramParser.cacheVersion(test))
             data[tidx].append(d)
+            datas[tidx][test] = (d[0], d[1])
+    # Runs of the same kernel share a PC dictionary and their ids can be
+    # used as they are. Otherwise, map all PCs into a common index.
+    fns = set(d[0].pcindex for tidx in range(2) for d in data[tidx])
+    if len(fns) == 1 and not None in fns:
+        index = loadPCIndex(fns.pop())
+        ids = lambda p_all, name: p_all.values[name].astype(np.int64)
+    else:
+        index = PCIndex()
+        ids = lambda p_all, name: index.add(p_all.getPCs(name))
+    for tidx in range(2):
+        for d in data[tidx]:
             p_all, p_generated, p_corpus, p_triage, __data = d
-            datas[tidx][test] = (p_all, p_generated)
-            for p in p_all:
-                # All coverage
-                for c in p.coverage:
-                    if not c in coverage_all:
-                         coverage_all[c] = 0
-                    if not c in coverage[tidx]:
-                         coverage[tidx][c] = 0
-                    coverage_all[c] += 1
-                    coverage[tidx][c] += 1
+            # All coverage
+            coverage[tidx].append(ids(p_all, "coverage"))
+            # Corpus Coverage
+            in_corpus = np.zeros(len(p_all), dtype=bool)
+            in_corpus[list(p_corpus.values())] = True
+            owner = np.repeat(np.arange(len(p_all)), p_all.count("coverageCorpus"))
+            coverageCorpus[tidx].append(ids(p_all, "coverageCorpus")[in_corpus[owner]])
+            cov_count = p_all.count("coverage")
             for pname in p_corpus:
-                p = p_corpus[pname]
-                # Corpus Coverage
-                for c in p.coverageCorpus:
-                    if not c in coverageCorpus_all:
-                         coverageCorpus_all[c] = 0
-                    if not c in coverageCorpus[tidx]:
-                         coverageCorpus[tidx][c] = 0
-                    coverageCorpus_all[c] += 1
-                    coverageCorpus[tidx][c] += 1
+                p = p_all[p_corpus[pname]]
                 # Seed power
-                cov = 0
-                for c in p.children:
-                    cov += len(c.coverage)
+                cov = int(cov_count[p.children].sum())
                 seeds[tidx].append((p, cov))
-    print(len(coverage[0]), len(coverage[1]))
-    print(len(coverageCorpus[0]), len(coverageCorpus[1]))
+    cov_ids = [list(coverage[0]), list(coverage[1])]
+    for tidx in range(2):
+        coverage[tidx] = index.counts(np.concatenate(coverage[tidx] + [np.zeros(0, dtype=np.int64)]))
+        coverageCorpus[tidx] = index.counts(np.concatenate(coverageCorpus[tidx] + [np.zeros(0, dtype=np.int64)]))
+    print(np.count_nonzero(coverage[0]), np.count_nonzero(coverage[1]))
+    print(np.count_nonzero(coverageCorpus[0]), np.count_nonzero(coverageCorpus[1]))
 
-    analyzeExclusiveCoverage(data, names, coverage_all, coverage)
+    analyzeExclusiveCoverage(data, names, index, coverage, cov_ids)
     return
 
     # Seed power
@@ -13,24 +13,27 @@ from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.model_selection import KFold, ShuffleSplit
 from sklearn.dummy import DummyClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.neural_network import MLPClassifier
 from sklearn.svm import SVC
+from scipy.sparse import issparse
 
 from syscalls import syscalls
 from utils import loadDataCached
+from logparser import LogParser, parseResult, SNAPSHOT_INTERVAL, EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_PROGRAM, EV_COMMENT
 from plot import plot, plotCDF
-from prog import Prog
+from prog import ProgStore
 
-def __parseCall(call):
+def _parseCall(call):
     name = call.split('(')[0]
     if '=' in name:
         name = name.split('=')[1].strip()
     args = call.split(name)[1]
     return name.lower(), args
 
-def __processTest(test):
+class TriageParser(LogParser):
     """
     Things to collect:
         Times triaging failed programs
@@ -38,287 +41,222 @@ def __processTest(test):
         Minimization: Number. Time spent on failed programs. Success TP, FP. Fail TN, FN.
         Minimization success stats
     """
-    ret = []
-    fn = 'result_' + test
-    if not os.path.isfile(fn):
-        return ret;
-    f = open(fn);
-    prev_pc = 0;
-    executeCount = 0; 
-    idx = 0;
-    ts_cur = 0;
-    ts_bgn = 0;
-    status_cur = {
-        "triagingTotal": 0,
-        "triagingFail": 0,
-        "minimizeTotal": 0,
-        "minimizeFail": 0,
-        "minimizeNew": 0,
-        "minimizeTP": 0,
-        "minimizeFP": 0,
-        "minimizeTN": 0,
-        "minimizeFN": 0, 
-    }
-    minimizeSz = [{}, {}]
-    sigInit = 0;
-    corpusProg = False
-    # Minimize
-    progStatus = None
-    inProg = False
-    curCalls = []
-    curProg = None
-    minimizeProgFrom = None
-    minimizeProgTo = None
-    minimizeAttempts = []
-    minimizeSuccess = False
-    minimizeExec = 0
-    # Coverage
-    coverageTotal = set()
-    coveragePrev = 0
-    for line in f:
-        line = line.strip('\n').strip();
-        if len(line) == 0:
-            continue;
-        if line[:3] == '<<<' and line[-3:] == '>>>':
-            line = line.strip('<<<').strip('>>>')
-            ts_cur = int(line)
-            if ts_bgn == 0:
-                ts_bgn = ts_cur
-        elif (line == ">" or line[:3] == ">>>") and not inProg:
-            inProg = True
-            curCalls = []
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_PROGRAM, EV_COMMENT)
+    version = 2
+    def __init__(self):
+        self.ret = []
+        self.progs = ProgStore()
+        self.executeCount = 0;
+        self.ts_cur = 0;
+        self.ts_bgn = 0;
+        self.status_cur = {
+            "triagingTotal": 0,
+            "triagingFail": 0,
+            "minimizeTotal": 0,
+            "minimizeFail": 0,
+            "minimizeNew": 0,
+            "minimizeTP": 0,
+            "minimizeFP": 0,
+            "minimizeTN": 0,
+            "minimizeFN": 0,
+        }
+        self.sigInit = 0;
+        self.corpusProg = False
+        # Minimize
+        self.progStatus = None
+        self.inProg = False
+        self.curCalls = []
+        self.minimizeProgFrom = None
+        self.minimizeProgTo = None
+        self.minimizeAttempts = []
+        self.minimizeSuccess = False
+        self.minimizeExec = 0
+        # Coverage
+        self.coverageTotal = set()
+        self.coveragePrev = 0
+    def onTimestamp(self, ts):
+        self.ts_cur = ts
+        if self.ts_bgn == 0:
+            self.ts_bgn = ts
+    def onProgram(self, line):
+        if (line == ">" or line[:3] == ">>>") and not self.inProg:
+            self.inProg = True
+            self.curCalls = []
         elif line == "<" or line == "<<<":
-            inProg = False
-            curProg = Prog.newProg(calls=curCalls, ts=ts_cur, signal=0, origin=None)
-            if progStatus == "MinimizeFrom":
-                minimizeProgFrom = curProg
-            elif progStatus == "MinimizeAttempt":
-                minimizeProgTo = curProg
-            progStatus = None
-        elif inProg:
+            self.inProg = False
+            curProg = self.progs.newProg(calls=self.curCalls, ts=self.ts_cur, signal=0, origin=None)
+            if self.progStatus == "MinimizeFrom":
+                self.minimizeProgFrom = curProg
+            elif self.progStatus == "MinimizeAttempt":
+                self.minimizeProgTo = curProg
+            self.progStatus = None
+        elif self.inProg:
             if line[:2] == "> ":
                 line = line.strip("> ")
             if len(line) == 0:
-                continue
-            curCalls.append(' '.join(__parseCall(line)))
-        elif line[:2] == '= ':
-            tmp = line.split();
-            try:
-                pc = int(tmp[1], 16)
-            except:
-                continue
-            if (pc & 0xffff000000000000) == 0xffff000000000000:
-                coverageTotal.add(pc);
-            elif (pc & 0xffffffff00000000) == 0:
-                coverageTotal.add(pc);
-        elif line[:2] == "- " and "executeRaw" in line:
-            executeCount += 1;
-            status = copy.deepcopy(status_cur);
-            status["executeCount"] = executeCount;
-            status["ts"] = (ts_cur - ts_bgn) / 1000000000;
-            ret.append(status)
-            coveragePrev = len(coverageTotal)
-        elif "# signalRun 0: " in line:
+                return
+            self.curCalls.append(' '.join(_parseCall(line)))
+    def onCoverage(self, pc):
+        if (pc & 0xffff000000000000) == 0xffff000000000000:
+            self.coverageTotal.add(pc);
+        elif (pc & 0xffffffff00000000) == 0:
+            self.coverageTotal.add(pc);
+    def onExecute(self, line):
+        self.executeCount += 1;
+        status = copy.deepcopy(self.status_cur);
+        status["executeCount"] = self.executeCount;
+        status["ts"] = (self.ts_cur - self.ts_bgn) / 1000000000;
+        self.ret.append(status)
+        self.coveragePrev = len(self.coverageTotal)
+    def onComment(self, line):
+        status_cur = self.status_cur
+        if "# signalRun 0: " in line:
             tmp = line.split("# signalRun 0: ")[1].split('+');
-            sigInit = int(tmp[0])
+            self.sigInit = int(tmp[0])
         elif line[:8] == "# Result":
             tmp = line.strip("# Result: ").split(',')
             if int(tmp[2]) > 0:
-                corpusProg = True
+                self.corpusProg = True
             else:
-                corpusProg = False
+                self.corpusProg = False
                 status_cur["triagingFail"] += 1;
-            # print(tmp[2], status_cur["triagingFail"])
             status_cur["triagingTotal"] += 1;
         elif line[-8:] == "Minimize":
-            progStatus = "MinimizeFrom"
+            self.progStatus = "MinimizeFrom"
         elif "# Minimize Attempt" in line:
-            progStatus = "MinimizeAttempt"
+            self.progStatus = "MinimizeAttempt"
         elif "# Minimize Fail" in line or "# Minimize Success" in line:
-            minimizeProgFrom.childrenMinimize.append(minimizeProgTo)
+            self.minimizeProgFrom.childrenMinimize.append(self.minimizeProgTo)
             entry = {
-                    "from": minimizeProgFrom,
-                    "to": minimizeProgTo,
+                    "from": self.minimizeProgFrom,
+                    "to": self.minimizeProgTo,
                     "success": "Success" in line
             }
-            minimizeAttempts.append(entry)	
+            self.minimizeAttempts.append(entry)
         elif "# Minimize" in line and "->" in line:
             tmp = line.split(': ')[1].replace('->',' ').replace('+', ' ').replace(',', ' ').split();
             if tmp[3] == tmp[5]:
-                minimizeSuccess = True
-            minimizeExec += 1
-            if len(coverageTotal) > coveragePrev:
+                self.minimizeSuccess = True
+            self.minimizeExec += 1
+            if len(self.coverageTotal) > self.coveragePrev:
                  status_cur["minimizeNew"] += 1
-    f.close();
-    return ret, minimizeAttempts;
+    def result(self):
+        return self.ret, self.minimizeAttempts;
+
+def __processTest(test):
+    ret = []
+    fn = 'result_' + test
+    if not os.path.isfile(fn):
+        return ret;
+    return parseResult(test, [TriageParser()], snapshot=SNAPSHOT_INTERVAL)[0]
 
-def CrossValidation(data, y, vocabulary=syscalls, train_size=0.2, batch=10000, mode=None, test_name=""):
-    idx_bgn = 0
-    idx_end = batch
+def __confusion(pred, y):
+    # [TP, TN, FP, FN] of binary predictions
+    pred = np.asarray(pred) == 1
+    y = np.asarray(y) == 1
+    return [
+        np.count_nonzero(pred & y), np.count_nonzero(~pred & ~y),
+        np.count_nonzero(pred & ~y), np.count_nonzero(~pred & y)
+    ]
+
+def CrossValidation(data, y, vocabulary=syscalls, train_size=0.2, batch=10000, mode=None, test_name="", online=False):
+    # Models are trained on the first train_size of each batch and tested on
+    # the rest. The -I models are trained incrementally over all batches,
+    # SVM-I and NN-I only with online. For TF-IDF and Term Count, NB-I is
+    # also only trained with online and otherwise keeps score -1, and the
+    # features stay sparse. data can also be a sparse matrix.
+    # Prints one line: test_name, the number of samples, then TP, TN, FP,
+    # FN (as fractions of all samples) and the accuracy of each model in
+    # the order of models. SVM-I and NN-I are appended at the end.
     models = ["Dummy", "NB", "NB-I", "SVM", "KNN", "NN"]
+    if online:
+        models += ["SVM-I", "NN-I"]
     scores = {}
     number_total = {}
     for m in models:
         scores[m] = []
         number_total[m] = [0,0,0,0]
+    text = (mode == "TF-IDF" or mode == "Count")
     clf_NBI = MultinomialNB()
+    clf_SVMI = SGDClassifier(loss='hinge', random_state=1)
+    clf_NNI = MLPClassifier(solver='adam', alpha=1e-5, hidden_layer_sizes=(5, 2), random_state=1)
     vectorizer_NBI = CountVectorizer(vocabulary=vocabulary)
-    while idx_bgn < len(data):
-        __data = data[idx_bgn:idx_end]
-        __y = y[idx_bgn:idx_end]
+    if not text and not issparse(data):
+        data = np.asarray(data)
+    y = np.asarray(y)
+    n = data.shape[0] if issparse(data) else len(data)
+    for idx_bgn in range(0, n, batch):
+        __data = data[idx_bgn:idx_bgn + batch]
+        __y = y[idx_bgn:idx_bgn + batch]
         scores_local = {}
         number_local = {}
         for m in models:
             scores_local[m] = []
             number_local[m] = [0,0,0,0]
-        #kf = KFold(n_splits=K)
-        #for train_index, test_index in kf.split(__data):
-            # Reverse
-            # d_train = [__data[i] for i in test_index]
-            # d_test = [__data[i] for i in train_index]
-            # y_test, y_train = y[train_index], y[test_index]
+        if type(train_size) == float:
+            split_point = int(batch * train_size)
+        elif type(train_size) == int:
+            split_point = train_size
+        else:
+            continue
+        if split_point >= (__data.shape[0] if issparse(__data) else len(__data)):
+            continue
         try:
-            if type(train_size) == float:
-                split_point = int(batch * train_size)
-                if split_point > len(__data):
-                    continue
-            elif type(train_size) == int and train_size < len(__data):
-                split_point = train_size
-            else:
-                continue
             d_train = __data[:split_point]
             d_test = __data[split_point:]
             y_train = __y[:split_point]
             y_test = __y[split_point:]
             if mode == "TF-IDF":
                 vectorizer = TfidfVectorizer()
-                X_train = vectorizer.fit_transform(d_train).toarray()
-                X_test = vectorizer.transform(d_test).toarray()
+                X_train = vectorizer.fit_transform(d_train)
+                X_test = vectorizer.transform(d_test)
             elif mode == "Count":
                 vectorizer = CountVectorizer()
-                X_train = vectorizer.fit_transform(d_train).toarray()
-                X_test = vectorizer.transform(d_test).toarray()
-                #X_train_NBI = vectorizer_NBI.transform(d_train).toarray()
-                #X_test_NBI = vectorizer_NBI.transform(d_test).toarray()
+                X_train = vectorizer.fit_transform(d_train)
+                X_test = vectorizer.transform(d_test)
+            else:
+                X_train = d_train
+                X_test = d_test
+            # Incremental models need the same features in every batch
+            if text:
+                X_train_I = vectorizer_NBI.transform(d_train)
+                X_test_I = vectorizer_NBI.transform(d_test)
             else:
-                X_train = np.array(d_train)
-                X_test = np.array(d_test)
-                X_train_NBI = X_train
-                X_test_NBI = X_test
-            # Dummy
-            sys.stderr.write("Dummy ")
-            clf_dummy = DummyClassifier(strategy='uniform')
-            clf_dummy.fit(X_train, y_train)
-            pred = clf_dummy.predict(X_test)
-            for i in range(len(pred)):
-                if pred[i] == 1 and y_test[i] == 1:
-                    number_local["Dummy"][0] += 1
-                elif pred[i] == 0 and y_test[i] == 0:
-                    number_local["Dummy"][1] += 1
-                elif pred[i] == 1 and y_test[i] == 0:
-                    number_local["Dummy"][2] += 1
-                elif pred[i] == 0 and y_test[i] == 1:
-                    number_local["Dummy"][3] += 1
-            scores_local["Dummy"].append(clf_dummy.score(X_test, y_test))
-            # NB
-            sys.stderr.write("NB ")
-            clf_NB = MultinomialNB()
-            clf_NB.fit(X_train, y_train)
-            pred = clf_NB.predict(X_test)
-            for i in range(len(pred)):
-                if pred[i] == 1 and y_test[i] == 1:
-                    number_local["NB"][0] += 1
-                elif pred[i] == 0 and y_test[i] == 0:
-                    number_local["NB"][1] += 1
-                elif pred[i] == 1 and y_test[i] == 0:
-                    number_local["NB"][2] += 1
-                elif pred[i] == 0 and y_test[i] == 1:
-                    number_local["NB"][3] += 1
-            scores_local["NB"].append(clf_NB.score(X_test, y_test))
-            # NB-I
-            sys.stderr.write("NB-I ")
-            if (mode != "TF-IDF" and mode != "Count"):
-              clf_NBI.partial_fit(X_train_NBI, y_train, classes=[0,1])
-              X_increment = []
-              y_increment = []
-              for i in range(len(X_test)):
-                pred = clf_NBI.predict([X_test_NBI[i]])[0]
-                if pred == 1 and y_test[i] == 1:
-                    number_local["NB-I"][0] += 1
-                elif pred == 0 and y_test[i] == 0:
-                    number_local["NB-I"][1] += 1
-                elif pred == 1 and y_test[i] == 0:
-                    number_local["NB-I"][2] += 1
-                elif pred == 0 and y_test[i] == 1:
-                    number_local["NB-I"][3] += 1
-              scores_local["NB-I"].append((number_local["NB-I"][0] + number_local["NB-I"][1]) / len(X_test))
-            # SVM
-            # SVM is too slow for TF-IDF or Term Count
-            sys.stderr.write("SVM ")
-            if (mode != "TF-IDF" and mode != "Count"):
-              clf_SVN = SVC(gamma='auto')
-              clf_SVN.fit(X_train, y_train)
-              pred = clf_SVN.predict(X_test)
-              for i in range(len(pred)):
-                if pred[i] == 1 and y_test[i] == 1:
-                    number_local["SVM"][0] += 1
-                elif pred[i] == 0 and y_test[i] == 0:
-                    number_local["SVM"][1] += 1
-                elif pred[i] == 1 and y_test[i] == 0:
-                    number_local["SVM"][2] += 1
-                elif pred[i] == 0 and y_test[i] == 1:
-                    number_local["SVM"][3] += 1
-              scores_local["SVM"].append(clf_SVN.score(X_test, y_test))
-            # KNN
-            # KNN is too slow for TF-IDF or Term Count
-            sys.stderr.write("KNN ")
-            if (mode != "TF-IDF" and mode != "Count"):
-              clf_KNN = KNeighborsClassifier(n_neighbors=1)
-              clf_KNN.fit(X_train, y_train)
-              pred = clf_KNN.predict(X_test)
-              for i in range(len(pred)):
-                if pred[i] == 1 and y_test[i] == 1:
-                    number_local["KNN"][0] += 1
-                elif pred[i] == 0 and y_test[i] == 0:
-                    number_local["KNN"][1] += 1
-                elif pred[i] == 1 and y_test[i] == 0:
-                    number_local["KNN"][2] += 1
-                elif pred[i] == 0 and y_test[i] == 1:
-                    number_local["KNN"][3] += 1
-              scores_local["KNN"].append(clf_KNN.score(X_test, y_test))
-            # NN 
-            # NN is too slow for TF-IDF or Term Count
-            sys.stderr.write("KNN ")
-            if (mode != "TF-IDF" and mode != "Count"):
-              clf_NN = MLPClassifier(solver='lbfgs', alpha=1e-5, hidden_layer_sizes=(5, 2), random_state=1)
-              clf_NN.fit(X_train, y_train)
-              pred = clf_NN.predict(X_test)
-              for i in range(len(pred)):
-                if pred[i] == 1 and y_test[i] == 1:
-                    number_local["NN"][0] += 1
-                elif pred[i] == 0 and y_test[i] == 0:
-                    number_local["NN"][1] += 1
-                elif pred[i] == 1 and y_test[i] == 0:
-                    number_local["NN"][2] += 1
-                elif pred[i] == 0 and y_test[i] == 1:
-                    number_local["NN"][3] += 1
-              scores_local["NN"].append(clf_NN.score(X_test, y_test))
+                X_train_I = X_train
+                X_test_I = X_test
+            clfs = [
+                ("Dummy", DummyClassifier(strategy='uniform')),
+                ("NB", MultinomialNB()),
+            ]
+            # SVM, KNN and NN are too slow for TF-IDF or Term Count
+            if not text:
+                clfs += [
+                    ("SVM", SVC(gamma='auto')),
+                    ("KNN", KNeighborsClassifier(n_neighbors=1)),
+                    ("NN", MLPClassifier(solver='lbfgs', alpha=1e-5, hidden_layer_sizes=(5, 2), random_state=1)),
+                ]
+            for m, clf in clfs:
+                sys.stderr.write(m + " ")
+                clf.fit(X_train, y_train)
+                number_local[m] = __confusion(clf.predict(X_test), y_test)
+                scores_local[m].append((number_local[m][0] + number_local[m][1]) / len(y_test))
+            clfs = [] if text and not online else [("NB-I", clf_NBI)]
+            if online:
+                clfs += [("SVM-I", clf_SVMI), ("NN-I", clf_NNI)]
+            for m, clf in clfs:
+                sys.stderr.write(m + " ")
+                clf.partial_fit(X_train_I, y_train, classes=[0,1])
+                number_local[m] = __confusion(clf.predict(X_test_I), y_test)
+                scores_local[m].append((number_local[m][0] + number_local[m][1]) / len(y_test))
             sys.stderr.write("DONE\n")
         except:
             traceback.print_exc()
-            idx_bgn += batch
-            idx_end += batch
             continue
-        idx_bgn += batch
-        idx_end += batch
         for model in scores_local:
             scores[model] += scores_local[model]
-            if len(scores_local[model]) > 0:
-                scores_local[model] = np.mean(scores_local[model])
         for model in number_total:
             for i in range(4):
                 number_total[model][i] += number_local[model][i]
-        # print("%f\t%f\t%f\t%f\t%f" % (len(X_test), number_local["NB-TN"], number_local["NB-FN"], number_local["SVM-TN"], number_local["SVM-FN"]))
     for model in scores:
         if len(scores[model]) > 0:
             scores[model] = np.mean(scores[model])
@@ -326,14 +264,15 @@ def CrossValidation(data, y, vocabulary=syscalls, train_size=0.2, batch=10000, m
             scores[model] = -1
     for model in number_total:
         for i in range(4):
-            number_total[model][i] /= len(data)
-    out = "%s\t%d" % (test_name, len(data))
+            number_total[model][i] /= n
+    out = "%s\t%d" % (test_name, n)
     for m in models:
         out += "\t%f\t%f\t%f\t%f\t%f" % (
                 number_total[m][0], number_total[m][1], number_total[m][2], number_total[m][3], scores[m]
             )
     print(out)
     sys.stdout.flush()
+    return number_total, scores
 
 def MLMinimize(attempts):
     if len(attempts) < 100:
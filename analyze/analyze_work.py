@@ -11,10 +11,11 @@ import numpy as np
 
 from plot import plot, plotBar1
 from utils import loadDataCached, getTestParams, averageData
+from logparser import LogParser, parseResult, EV_TIMESTAMP, EV_EXECUTE, EV_DEBUG
 
 keys = ["Generate", "signalRun", "Minimize", "Mutate", "Triage Total"]
 
-def __parseResult(s):
+def _parseResult(s):
     ret = {}
     tmp = s.strip().strip('{').strip('}').split()
     for d in tmp:
@@ -33,7 +34,7 @@ def __parseResult(s):
             ret[k] = v
     return ret
 
-def __flattenStatus(s):
+def _flattenStatus(s):
     ret = {}
     for k in s:
         if type(s[k]) != list:
@@ -45,99 +46,103 @@ def __flattenStatus(s):
             ret[k+"_All"] = s[k][0] + s[k][1] + s[k][2]
     return ret
 
+class WorkParser(LogParser):
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_DEBUG)
+    version = 1
+    def __init__(self):
+        self.ret = []
+        self.t_bgn = -1;
+        self.cur_func = -1
+        self.exec_count = 0
+        self.syscall_count = 0
+        self.TIME_THRESHOLD = 10000.0
+        self.prev_ts = 0
+        self.cur_ts = 0
+        self.cur_status = {
+            "Time_Elapsed": 0.0,
+            "Works_Done": [0,0,0],
+            "Execute_Time": [0.0, 0.0, 0.0],
+            "Total_Time": [0.0, 0.0, 0.0],
+            "Syscalls_Made": [0, 0, 0],
+            "Programs_Executed": [0, 0, 0],
+            "Triages_Failed": 0
+        }
+        self.exec_time = [[], [], []]
+    def onTimestamp(self, ts):
+        if self.t_bgn < 0:
+            self.t_bgn = ts;
+        ts = ts - self.t_bgn
+        self.cur_status["Time_Elapsed"] = ts / 1000000000.0
+        self.cur_ts = self.cur_status["Time_Elapsed"]
+        self.ret.append(_flattenStatus(self.cur_status))
+    def onDebug(self, line):
+        if not ("MAB Choice: " in line or "Work Type: " in line):
+            return
+        cur_status = self.cur_status
+        exec_time = self.exec_time
+        self.TIME_THRESHOLD = TIME_THRESHOLD = self.cur_ts - self.prev_ts + 10.0 # Upper bound
+        try:
+          if "Work Type: " in line:
+            cur_func = int(line.split("Work Type: ")[1].split(',')[0])
+          elif "MAB Choice: " in line:
+            cur_func = int(line.split("MAB Choice: ")[1].split(',')[0])
+        except:
+          print("WTF", line)
+          return
+        self.cur_func = cur_func
+        cur_status["Works_Done"][cur_func] += 1
+        if "Result: " in line:
+            d = line.split("Result: ")[1]
+            d = _parseResult(d)
+            _ttot = 0
+            if "timeTotal" in d:
+                _ttot = d["timeTotal"] / 1000.0
+            _ttot = _ttot if _ttot < TIME_THRESHOLD else TIME_THRESHOLD
+            _ttot = _ttot if _ttot > 0.0 else 0.0
+            cur_status["Total_Time"][cur_func] += _ttot
+            if cur_func == 2: # Triage: Combine minimize and verify together
+                _texc = 0
+                if "minimizeTime" in d and "verifyTime" in d:
+                    _texc = (d["minimizeTime"] + d["verifyTime"]) / 1000.0
+                _texc = _texc if _texc < TIME_THRESHOLD else TIME_THRESHOLD
+                _texc = _texc if _texc > 0.0 else 0.0
+                cur_status["Execute_Time"][2] += _texc
+                exec_time[2].append(_texc)
+                if "success" in d and not d["success"]:
+                    cur_status["Triages_Failed"] += 1
+            else:
+                _texc = 0
+                if "time" in d:
+                    _texc = (d["time"]) / 1000.0
+                _texc = _texc if _texc < TIME_THRESHOLD else TIME_THRESHOLD
+                _texc = _texc if _texc > 0.0 else 0.0
+                exec_time[cur_func].append(_texc)
+                cur_status["Execute_Time"][cur_func] += _texc
+        cur_status["Programs_Executed"][cur_func] += self.exec_count
+        cur_status["Syscalls_Made"][cur_func] += self.syscall_count
+        self.exec_count = 0
+        self.syscall_count = 0
+        self.prev_ts = cur_status["Time_Elapsed"]
+    def onExecute(self, line):
+        self.exec_count += 1;
+        try:
+            sz = int(line.split()[-1])
+            self.syscall_count += sz;
+        except:
+            sz = 0
+    def result(self):
+        return self.ret, self.exec_time
+
 def __processTest(test):
     ret = []
     fn = 'result_' + test
     if not os.path.isfile(fn):
         return ret;
-    t_bgn = -1;
-    cur_func = -1
-    exec_count = 0
-    syscall_count = 0
-    TIME_THRESHOLD = 10000.0
-    prev_ts = 0
-    cur_ts = 0
-    cur_status = {
-        "Time_Elapsed": 0.0,
-        "Works_Done": [0,0,0],
-        "Execute_Time": [0.0, 0.0, 0.0],
-        "Total_Time": [0.0, 0.0, 0.0],
-        "Syscalls_Made": [0, 0, 0],
-        "Programs_Executed": [0, 0, 0],
-        "Triages_Failed": 0
-    }
-    exec_time = [[], [], []]
-    f = open(fn)
-    for line in f:
-        line = line.strip('\n').strip();
-        if len(line) == 0:
-            continue;
-        if line[:3] == "<<<" and line[-3:] == ">>>":
-            ts = int(line.strip("<<<").strip(">>>"))
-            if t_bgn < 0:
-                t_bgn = ts;
-            ts = ts - t_bgn
-            cur_status["Time_Elapsed"] = ts / 1000000000.0
-            cur_ts = cur_status["Time_Elapsed"]
-            ret.append(__flattenStatus(cur_status))
-        elif ("MAB Choice: " in line or "Work Type: " in line):
-            TIME_THRESHOLD = cur_ts - prev_ts + 10.0 # Upper bound
-            try:
-              if "Work Type: " in line:
-                cur_func = int(line.split("Work Type: ")[1].split(',')[0])
-              elif "MAB Choice: " in line:
-                cur_func = int(line.split("MAB Choice: ")[1].split(',')[0])
-            except:
-              print("WTF", line)
-              continue
-            cur_status["Works_Done"][cur_func] += 1
-            if "Result: " in line:
-                d = line.split("Result: ")[1]
-                d = __parseResult(d)
-                _ttot = 0
-                if "timeTotal" in d:
-                    _ttot = d["timeTotal"] / 1000.0
-                _ttot = _ttot if _ttot < TIME_THRESHOLD else TIME_THRESHOLD
-                _ttot = _ttot if _ttot > 0.0 else 0.0
-                cur_status["Total_Time"][cur_func] += _ttot
-                if cur_func == 2: # Triage: Combine minimize and verify together
-                    _texc = 0
-                    if "minimizeTime" in d and "verifyTime" in d:
-                        _texc = (d["minimizeTime"] + d["verifyTime"]) / 1000.0
-                    _texc = _texc if _texc < TIME_THRESHOLD else TIME_THRESHOLD
-                    _texc = _texc if _texc > 0.0 else 0.0
-                    cur_status["Execute_Time"][2] += _texc
-                    exec_time[2].append(_texc)
-                    if "success" in d and not d["success"]:
-                        cur_status["Triages_Failed"] += 1
-                else:
-                    _texc = 0
-                    if "time" in d:
-                        _texc = (d["time"]) / 1000.0
-                    _texc = _texc if _texc < TIME_THRESHOLD else TIME_THRESHOLD
-                    _texc = _texc if _texc > 0.0 else 0.0
-                    exec_time[cur_func].append(_texc)
-                    cur_status["Execute_Time"][cur_func] += _texc
-            cur_status["Programs_Executed"][cur_func] += exec_count
-            cur_status["Syscalls_Made"][cur_func] += syscall_count
-            exec_count = 0
-            syscall_count = 0
-            prev_ts = cur_status["Time_Elapsed"]
-        elif line[0] == '-' and 'executeRaw' in line:
-            exec_count += 1;
-            try:
-                sz = int(line.split()[-1])
-                #if cur_func in sizes:
-                #    sizes[cur_func].append(sz)
-                syscall_count += sz;
-            except:
-                sz = 0
-    f.close();
-    return ret, exec_time;
+    return parseResult(test, [WorkParser()])[0]
 
 def __plotWork(test):
     # __data = __processTest(test);
-    __data, exec_time = loadDataCached("work_%s.cache", test, __processTest);
+    __data, exec_time = loadDataCached("work_%s.cache", test, __processTest, version=WorkParser.version);
     if len(__data) <= 1:
         return;
     # Execute time percentile
@@ -201,7 +206,7 @@ def plotWork(tests=["KCOV", "RAMINDEX"]):
         exec_time = []
         for test in modules[module]:
           try:
-            __data, exec_time = loadDataCached('work_%s.cache', test, __processTest);
+            __data, exec_time = loadDataCached('work_%s.cache', test, __processTest, version=WorkParser.version);
             print(test, len(__data), __data[-1] if len(__data) > 0 else -1)
             name, module, run = getTestParams(test)
             print(name, module, run)
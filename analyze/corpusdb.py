@@ -0,0 +1,180 @@
+import os
+import sys
+import zlib
+import struct
+import traceback
+
+# Record format of pkg/db
+DB_MAGIC = 0xbaddb
+REC_MAGIC = 0xfee1bad
+CUR_VERSION = 2
+SEQ_DELETED = 2 ** 64 - 1
+
+def _readHeader(f):
+    # Returns the user version, None for an empty file
+    buf = f.read(8)
+    if len(buf) == 0:
+        return None
+    if len(buf) < 8:
+        raise ValueError("truncated db header")
+    magic, ver = struct.unpack("<II", buf)
+    if magic != DB_MAGIC:
+        raise ValueError("bad db header: 0x%x" % magic)
+    if ver == 0 or ver > CUR_VERSION:
+        raise ValueError("bad db version: %d" % ver)
+    if ver < 2:
+        return 0
+    buf = f.read(8)
+    if len(buf) < 8:
+        raise ValueError("truncated db header")
+    return struct.unpack("<Q", buf)[0]
+
+def _readRecord(f, skipValue=False, size=None):
+    # Returns (key, seq, value offset, value length, compressed value) or
+    # None at the end of the file. The value is not read with skipValue,
+    # then size is the size of the file.
+    buf = f.read(8)
+    if len(buf) == 0:
+        return None
+    if len(buf) < 8:
+        raise ValueError("truncated record")
+    magic, keylen = struct.unpack("<II", buf)
+    if magic != REC_MAGIC:
+        raise ValueError("bad record header: 0x%x" % magic)
+    key = f.read(keylen)
+    buf = f.read(8)
+    if len(key) < keylen or len(buf) < 8:
+        raise ValueError("truncated record")
+    seq = struct.unpack("<Q", buf)[0]
+    if seq == SEQ_DELETED:
+        return key.decode(), seq, -1, 0, None
+    buf = f.read(4)
+    if len(buf) < 4:
+        raise ValueError("truncated record")
+    vallen = struct.unpack("<I", buf)[0]
+    offset = f.tell()
+    if skipValue:
+        if offset + vallen > size:
+            raise ValueError("truncated record")
+        f.seek(vallen, os.SEEK_CUR)
+        data = None
+    else:
+        data = f.read(vallen)
+        if len(data) < vallen:
+            raise ValueError("truncated record")
+    return key.decode(), seq, offset, vallen, data
+
+def _inflate(data):
+    if len(data) == 0:
+        return b''
+    return zlib.decompress(data, -15)
+
+def iterRecords(fn):
+    # Streams every record of the file in order, including overwritten and
+    # deleted ones, as (sig, seq, program); the program is None for deletes.
+    # Like syz-db, stops at the first broken record.
+    with open(fn, "rb") as f:
+        try:
+            if _readHeader(f) is None:
+                return
+            while True:
+                rec = _readRecord(f)
+                if rec is None:
+                    return
+                key, seq, offset, vallen, data = rec
+                yield key, seq, None if data is None else _inflate(data)
+        except (ValueError, zlib.error):
+            traceback.print_exc()
+
+class CorpusDB:
+    """
+    Read-only view of a syz-manager corpus.db. Opening only scans the record
+    headers into an index of the live offset of each sig (the last record of
+    a sig wins, deletes drop it); programs are read and inflated on access.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+        self.version = 0
+        self.index = {} # (value offset, value length, seq) by sig
+        self.records = 0 # including overwritten and deleted ones
+        self.f = open(fn, "rb")
+        size = os.fstat(self.f.fileno()).st_size
+        try:
+            self.version = _readHeader(self.f) or 0
+            while True:
+                rec = _readRecord(self.f, skipValue=True, size=size)
+                if rec is None:
+                    break
+                key, seq, offset, vallen, _ = rec
+                self.records += 1
+                if seq == SEQ_DELETED:
+                    self.index.pop(key, None)
+                else:
+                    self.index[key] = (offset, vallen, seq)
+        except ValueError:
+            print("%s: %s, keeping %d records" % (fn, sys.exc_info()[1], len(self.index)))
+    def close(self):
+        self.f.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def __len__(self):
+        return len(self.index)
+    def __contains__(self, sig):
+        return sig in self.index
+    def __iter__(self):
+        # (sig, program) of the live records, lazily
+        for sig in self.index:
+            yield sig, self[sig]
+    def keys(self):
+        return self.index.keys()
+    def seq(self, sig):
+        return self.index[sig][2]
+    def __getitem__(self, sig):
+        offset, vallen, _ = self.index[sig]
+        self.f.seek(offset)
+        return _inflate(self.f.read(vallen))
+    def get(self, sig, default=None):
+        if not sig in self.index:
+            return default
+        return self[sig]
+
+def diffCorpora(a, b):
+    # Returns the sigs only in a, only in b and in both
+    ka = a.keys()
+    kb = b.keys()
+    return ka - kb, kb - ka, ka & kb
+
+def callNames(prog):
+    # Syscall names of a serialized program
+    ret = []
+    for line in prog.decode(errors="replace").split('\n'):
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+        if " = " in line:
+            line = line.split(" = ", 1)[1]
+        ret.append(line.split('(', 1)[0])
+    return ret
+
+def compareCorpora(tests):
+    dbs = {}
+    for test in tests:
+        fn = "corpus_%s.db" % test
+        if os.path.isfile(fn):
+            dbs[test] = CorpusDB(fn)
+    names = sorted(dbs)
+    calls = {}
+    for test in names:
+        calls[test] = set()
+        for sig, prog in dbs[test]:
+            calls[test].update(callNames(prog))
+        print("%s: %d seeds, %d records, %d calls" % (test, len(dbs[test]), dbs[test].records, len(calls[test])))
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            a, b = names[i], names[j]
+            onlyA, onlyB, both = diffCorpora(dbs[a], dbs[b])
+            print("%s vs %s: %d shared, %d / %d unique seeds, %d / %d unique calls" % (a, b, len(both), len(onlyA), len(onlyB), len(calls[a] - calls[b]), len(calls[b] - calls[a])))
+    for db in dbs.values():
+        db.close()
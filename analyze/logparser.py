@@ -0,0 +1,580 @@
+import sys
+import os
+import mmap
+import struct
+import time
+import resource
+import traceback
+import multiprocessing
+import numpy as np
+
+from utils import isCached, storeDataCached, pinData, storeCheckpoint, loadCheckpoint
+
+# Events emitted by the result log tokenizer
+EV_TIMESTAMP = 0        # <<<ts>>>
+EV_EXECUTE = 1          # - executeRaw n
+EV_COVERAGE = 2         # = pc
+EV_CORPUS_COVERAGE = 3  # + pc
+EV_PROGRAM = 4          # > / < program blocks
+EV_COMMENT = 5          # # ...
+EV_DEBUG = 6            # - ... everything else (MAB, Work Type, ...)
+EV_COUNT = 7
+
+class LogParser:
+    """
+    Base class of result log plug-ins. A plug-in lists the events it
+    subscribes to in `events` and overrides the matching handlers.
+    Handlers receive the stripped line, except onTimestamp and
+    onCoverage/onCorpusCoverage which receive the parsed integer.
+    Bump `version` whenever the result format changes to invalidate caches.
+    finalize() runs in the main process on the result before it is cached,
+    cacheVersion() is the version its cache is stored and looked up with.
+    """
+    events = ()
+    version = 0
+    def onTimestamp(self, ts):
+        pass
+    def onExecute(self, line):
+        pass
+    def onCoverage(self, pc):
+        pass
+    def onCorpusCoverage(self, pc):
+        pass
+    def onProgram(self, line):
+        pass
+    def onComment(self, line):
+        pass
+    def onDebug(self, line):
+        pass
+    def result(self):
+        return None
+    @classmethod
+    def finalize(cls, data, test):
+        return data
+    @classmethod
+    def cacheVersion(cls, test):
+        return cls.version
+
+def __handlers(parsers):
+    ret = [[] for _ in range(EV_COUNT)]
+    for p in parsers:
+        for ev in p.events:
+            if ev == EV_TIMESTAMP:
+                ret[ev].append(p.onTimestamp)
+            elif ev == EV_EXECUTE:
+                ret[ev].append(p.onExecute)
+            elif ev == EV_COVERAGE:
+                ret[ev].append(p.onCoverage)
+            elif ev == EV_CORPUS_COVERAGE:
+                ret[ev].append(p.onCorpusCoverage)
+            elif ev == EV_PROGRAM:
+                ret[ev].append(p.onProgram)
+            elif ev == EV_COMMENT:
+                ret[ev].append(p.onComment)
+            elif ev == EV_DEBUG:
+                ret[ev].append(p.onDebug)
+    return ret
+
+def parseLines(lines, parsers):
+    hts, hexec, hcov, hcorpus, hprog, hcomment, hdebug = __handlers(parsers)
+    for line in lines:
+        line = line.strip('\n').strip();
+        if len(line) == 0:
+            continue;
+        c = line[0]
+        if c == '<' and line[:3] == '<<<' and line[-3:] == '>>>':
+            try:
+                ts = int(line[3:-3])
+            except:
+                continue
+            for h in hts:
+                h(ts)
+        elif c == '-':
+            if line[:2] == '- ' and 'executeRaw' in line:
+                for h in hexec:
+                    h(line)
+            else:
+                for h in hdebug:
+                    h(line)
+        elif c == '=' or c == '+':
+            handlers = hcov if c == '=' else hcorpus
+            if len(handlers) == 0:
+                continue
+            try:
+                pc = int(line.split()[1], 16)
+            except:
+                continue
+            for h in handlers:
+                h(pc)
+        elif c == '#':
+            for h in hcomment:
+                h(line)
+        elif c == '>' or c == '<':
+            for h in hprog:
+                h(line)
+
+# Binary result log, written next to result_<test> as result_<test>.bin by
+# filter_log or encodeResult(). The header is BINLOG_MAGIC and a uint32
+# version, followed by records starting with a one byte tag:
+#   TAG_SYNC                         varint ts
+#   EV_TIMESTAMP                     zigzag varint delta to the previous ts
+#   EV_COVERAGE, EV_CORPUS_COVERAGE  varint n, varint size, varint pc,
+#                                    n - 1 zigzag varint deltas (size bytes)
+#   any other event                  varint length, the stripped line
+# A SYNC replaces the delta every BINLOG_INDEX_INTERVAL seconds and its ts
+# and offset are appended to <fn>.idx as two little-endian uint64s, so
+# readers can seek to a time window without decoding what comes before.
+BINLOG_MAGIC = b'SZRL'
+BINLOG_VERSION = 1
+BINLOG_INDEX_INTERVAL = 60
+BINLOG_MAX_RUN = 4096
+BINLOG_CHUNK_SIZE = 16 * 2 ** 20
+TAG_SYNC = EV_COUNT
+MASK64 = 2 ** 64 - 1
+
+def _putVarint(buf, v):
+    while v >= 0x80:
+        buf.append((v & 0x7f) | 0x80)
+        v >>= 7
+    buf.append(v)
+
+def _zigzag(d):
+    d &= MASK64
+    return ((d << 1) & MASK64) ^ (MASK64 if d >> 63 else 0)
+
+def __varint(data, pos):
+    b = data[pos]
+    pos += 1
+    if b < 0x80:
+        return b, pos
+    v = b & 0x7f
+    shift = 7
+    while True:
+        b = data[pos]
+        pos += 1
+        v |= (b & 0x7f) << shift
+        if b < 0x80:
+            return v, pos
+        shift += 7
+
+def __decodeRuns(buf, pos, size, n):
+    # PCs of many coverage runs, all varints are decoded with NumPy at once.
+    # pos, size and n are arrays with the payload offset, size and PC count
+    # of each run. Returns the PCs and the index of the first PC of each run.
+    offsets = np.cumsum(size) - size
+    b = buf[np.arange(offsets[-1] + size[-1]) + np.repeat(pos - offsets, size)]
+    ends = np.flatnonzero(b < 0x80)
+    first = np.cumsum(n) - n
+    if len(ends) != first[-1] + n[-1]:
+        raise ValueError("corrupted coverage run")
+    starts = np.zeros(len(ends), dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    k = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    v = np.add.reduceat((b & 0x7f).astype(np.uint64) << (7 * k).astype(np.uint64), starts)
+    # The first PC of a run is absolute, the rest are zigzag deltas
+    d = (v >> np.uint64(1)) ^ (np.uint64(0) - (v & np.uint64(1)))
+    d[first] = v[first]
+    pcs = np.cumsum(d, dtype=np.uint64)
+    pcs -= np.repeat(pcs[first] - d[first], n)
+    return pcs.tolist(), first.tolist()
+
+class BinaryLogWriter(LogParser):
+    """
+    Writes the binary result log. It subscribes to every event, so
+    encodeResult() can convert a text result by parsing it.
+    """
+    events = (EV_TIMESTAMP, EV_EXECUTE, EV_COVERAGE, EV_CORPUS_COVERAGE, EV_PROGRAM, EV_COMMENT, EV_DEBUG)
+    def __init__(self, fn, interval=BINLOG_INDEX_INTERVAL):
+        self.f = open(fn, "wb+")
+        self.fidx = open(fn + ".idx", "wb+")
+        self.buf = bytearray(BINLOG_MAGIC + struct.pack('<I', BINLOG_VERSION))
+        self.offset = 0
+        self.interval = interval * 1000000000
+        self.ts = None
+        self.ts_sync = None
+        self.run_tag = None
+        self.run = []
+    def __flushRun(self):
+        run = self.run
+        if len(run) == 0:
+            return
+        payload = bytearray()
+        _putVarint(payload, run[0])
+        prev = run[0]
+        for pc in run[1:]:
+            _putVarint(payload, _zigzag(pc - prev))
+            prev = pc
+        buf = self.buf
+        buf.append(self.run_tag)
+        _putVarint(buf, len(run))
+        _putVarint(buf, len(payload))
+        buf += payload
+        self.run = []
+        if len(buf) >= 2 ** 20:
+            self.__flush()
+    def __flush(self):
+        self.f.write(self.buf)
+        self.offset += len(self.buf)
+        self.buf = bytearray()
+    def __text(self, tag, line):
+        self.__flushRun()
+        data = line.encode()
+        self.buf.append(tag)
+        _putVarint(self.buf, len(data))
+        self.buf += data
+    def __coverage(self, tag, pc):
+        if self.run_tag != tag or len(self.run) >= BINLOG_MAX_RUN:
+            self.__flushRun()
+            self.run_tag = tag
+        self.run.append(pc & MASK64)
+    def onTimestamp(self, ts):
+        self.__flushRun()
+        ts &= MASK64
+        if self.ts_sync is None or ts - self.ts_sync >= self.interval:
+            self.fidx.write(struct.pack('<QQ', ts, self.offset + len(self.buf)))
+            self.buf.append(TAG_SYNC)
+            _putVarint(self.buf, ts)
+            self.ts_sync = ts
+        else:
+            self.buf.append(EV_TIMESTAMP)
+            _putVarint(self.buf, _zigzag(ts - self.ts))
+        self.ts = ts
+    def onExecute(self, line):
+        self.__text(EV_EXECUTE, line)
+    def onCoverage(self, pc):
+        self.__coverage(EV_COVERAGE, pc)
+    def onCorpusCoverage(self, pc):
+        self.__coverage(EV_CORPUS_COVERAGE, pc)
+    def onProgram(self, line):
+        self.__text(EV_PROGRAM, line)
+    def onComment(self, line):
+        self.__text(EV_COMMENT, line)
+    def onDebug(self, line):
+        self.__text(EV_DEBUG, line)
+    def result(self):
+        self.__flushRun()
+        self.__flush()
+        self.f.close();
+        self.fidx.close();
+        return self.offset
+
+def encodeResult(test):
+    # Convert result_<test> to result_<test>.bin
+    fn = 'result_' + test
+    size = parseResult(test, [BinaryLogWriter(fn + '.bin.tmp')], binary=False)[0]
+    os.replace(fn + '.bin.tmp.idx', fn + '.bin.idx')
+    os.replace(fn + '.bin.tmp', fn + '.bin')
+    return size
+
+def __seekIndex(fn, ts_from):
+    # Offset of the last SYNC at or before ts_from
+    if ts_from is None or not os.path.isfile(fn + ".idx"):
+        return None
+    idx = np.fromfile(fn + ".idx", dtype='<u8')
+    idx = idx[:len(idx) // 2 * 2].reshape(-1, 2)
+    i = np.searchsorted(idx[:,0], ts_from, side='right') - 1
+    if i < 0:
+        return None
+    return int(idx[i,1])
+
+def __dispatch(buf, events, runs, handlers):
+    if len(runs) > 0:
+        runs = np.array(runs, dtype=np.int64)
+        pcs, first = __decodeRuns(buf, runs[:,0], runs[:,1], runs[:,2])
+    for tag, v in events:
+        if tag == EV_COVERAGE or tag == EV_CORPUS_COVERAGE:
+            i = first[v]
+            for h in handlers[tag]:
+                for pc in pcs[i:i+runs[v,2]]:
+                    h(pc)
+        else:
+            for h in handlers[tag]:
+                h(v)
+
+def parseBinary(fn, parsers, ts_from=None, ts_to=None, chunk_size=BINLOG_CHUNK_SIZE, state=None, max_bytes=None):
+    # Events are only delivered while ts_from <= ts <= ts_to (in ns). Records
+    # are collected per chunk, so coverage runs can be decoded in bulk.
+    # state is the (offset, ts) returned by an earlier call to continue from,
+    # max_bytes stops after about that many bytes. Returns the state after
+    # the last complete record.
+    handlers = __handlers(parsers)
+    f = open(fn, "rb")
+    if os.fstat(f.fileno()).st_size < 8:
+        f.close();
+        return (8, 0) if state is None else state
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:4] != BINLOG_MAGIC or struct.unpack('<I', data[4:8])[0] != BINLOG_VERSION:
+        data.close();
+        f.close();
+        raise ValueError("%s is not a version %d binary result log" % (fn, BINLOG_VERSION))
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if state is None:
+        pos = __seekIndex(fn, ts_from) or 8
+        ts = 0
+    else:
+        pos, ts = state
+    start = pos
+    active = ts_from is None
+    size = len(data)
+    events = []
+    runs = []
+    chunk_end = pos + chunk_size
+    while pos < size:
+        if not max_bytes is None and pos - start >= max_bytes:
+            break
+        if pos >= chunk_end:
+            __dispatch(buf, events, runs, handlers)
+            events = []
+            runs = []
+            chunk_end = pos + chunk_size
+        # A record cut off at the end is from a log still being written
+        rec = pos
+        try:
+            tag = data[pos]
+            v = data[pos + 1]
+            pos += 2
+            if v >= 0x80:
+                v, pos = __varint(data, pos - 1)
+            if tag == TAG_SYNC or tag == EV_TIMESTAMP:
+                t = v if tag == TAG_SYNC else (ts + ((v >> 1) ^ -(v & 1))) & MASK64
+                if not ts_to is None and t > ts_to:
+                    pos = rec
+                    break
+                ts = t
+                active = ts_from is None or ts >= ts_from
+                if active and len(handlers[EV_TIMESTAMP]) > 0:
+                    events.append((EV_TIMESTAMP, ts))
+            elif tag == EV_COVERAGE or tag == EV_CORPUS_COVERAGE:
+                run_size, pos = __varint(data, pos)
+                if pos + run_size > size:
+                    pos = rec
+                    break
+                if active and len(handlers[tag]) > 0:
+                    events.append((tag, len(runs)))
+                    runs.append((pos, run_size, v))
+                pos += run_size
+            elif tag < EV_COUNT:
+                if pos + v > size:
+                    pos = rec
+                    break
+                if active and len(handlers[tag]) > 0:
+                    events.append((tag, data[pos:pos+v].decode()))
+                pos += v
+            else:
+                raise ValueError("%s: unknown record %d at offset %d" % (fn, tag, pos - 1))
+        except IndexError:
+            pos = rec
+            break
+    __dispatch(buf, events, runs, handlers)
+    del buf
+    data.close();
+    f.close();
+    return pos, ts
+
+# Default interval between snapshots of long running parsers (seconds)
+SNAPSHOT_INTERVAL = 600
+SNAPSHOT_CHUNK_SIZE = 64 * 2 ** 20
+
+def __snapshotFmt(parsers, binary):
+    return 'snapshot_%s_' + ('bin_' if binary else '') + '_'.join([p.__class__.__name__ for p in parsers]) + '.cache'
+
+def __parseSnapshotted(test, parsers, interval):
+    # Parse result_<test> from the last snapshot of the same parsers on. A snapshot is
+    # taken every interval seconds and, if parsing took that long, at the end of the
+    # file, so reruns and runs that were extended later skip what was parsed before.
+    fmt = __snapshotFmt(parsers, False)
+    fl = LogFollower(test, [(None, p.__class__) for p in parsers], cache_fmt=fmt, parsers=parsers)
+    ts = time.time()
+    saved = fl.resumed
+    while fl.poll(max_bytes=SNAPSHOT_CHUNK_SIZE) > 0:
+        if time.time() - ts >= interval:
+            print("Snapshot of %s at %d MB" % (test, fl.offset / 2 ** 20))
+            sys.stdout.flush()
+            fl.checkpoint()
+            saved = True
+            ts = time.time()
+    if saved:
+        fl.checkpoint()
+    fl.finish()
+    return fl.results()
+
+def __parseBinarySnapshotted(test, parsers, interval):
+    # Like __parseSnapshotted on result_<test>.bin. The snapshot holds the
+    # parsers and the reader state, the offset of the next record and the
+    # last timestamp that deltas are relative to.
+    fn = 'result_%s.bin' % test
+    fmt = __snapshotFmt(parsers, True)
+    version = (BINLOG_VERSION,) + tuple([(p.__class__.__name__, p.__class__.version) for p in parsers])
+    offset, data = loadCheckpoint(fmt, test, source=fn, version=version)
+    state = None
+    if not data is None:
+        ts_log, parsers = data
+        state = (offset, ts_log)
+        print("Resuming %s at %d MB" % (test, offset / 2 ** 20))
+    saved = not data is None
+    ts = time.time()
+    while True:
+        new = parseBinary(fn, parsers, state=state, max_bytes=SNAPSHOT_CHUNK_SIZE)
+        if not state is None and new[0] == state[0]:
+            break
+        state = new
+        if time.time() - ts >= interval:
+            print("Snapshot of %s at %d MB" % (test, state[0] / 2 ** 20))
+            sys.stdout.flush()
+            storeCheckpoint(fmt, test, state[0], (state[1], parsers), source=fn, version=version)
+            saved = True
+            ts = time.time()
+    if saved:
+        storeCheckpoint(fmt, test, state[0], (state[1], parsers), source=fn, version=version)
+    return [p.result() for p in parsers]
+
+def parseResult(test, parsers, binary=True, snapshot=None):
+    # The binary log is used when it exists. With snapshot (seconds), either
+    # log is parsed with snapshots, see __parseSnapshotted.
+    fn = 'result_' + test
+    use_binary = binary and os.path.isfile(fn + '.bin')
+    if not snapshot is None:
+        if use_binary:
+            return __parseBinarySnapshotted(test, parsers, snapshot)
+        return __parseSnapshotted(test, parsers, snapshot)
+    if use_binary:
+        parseBinary(fn + '.bin', parsers)
+        return [p.result() for p in parsers]
+    f = open(fn)
+    parseLines(f, parsers)
+    f.close();
+    return [p.result() for p in parsers]
+
+FOLLOW_CHUNK_SIZE = 16 * 2 ** 20
+
+class LogFollower:
+    """
+    Parses a result file that is still being written. Only complete lines
+    are consumed and the parsers keep their state between polls, so each
+    poll costs as much as the bytes added since the last one. The state
+    is checkpointed to cache_fmt (follow_<test>.cache) to survive restarts.
+    """
+    def __init__(self, test, specs, cache_fmt='follow_%s.cache', parsers=None):
+        self.test = test
+        self.specs = specs
+        self.cache_fmt = cache_fmt
+        self.version = tuple([(cls.__name__, cls.version) for fmt, cls in specs])
+        self.offset, self.parsers = loadCheckpoint(cache_fmt, test, version=self.version)
+        self.resumed = not self.parsers is None
+        if self.parsers is None:
+            self.parsers = parsers if not parsers is None else [cls() for fmt, cls in specs]
+        elif self.offset > 0:
+            print("Resuming %s at %d MB" % (test, self.offset / 2 ** 20))
+    def poll(self, chunk_size=FOLLOW_CHUNK_SIZE, max_bytes=None):
+        # Returns the number of bytes consumed, stops early after max_bytes
+        fn = 'result_' + self.test
+        n = 0
+        f = open(fn, "rb")
+        f.seek(self.offset)
+        rest = b''
+        while max_bytes is None or n < max_bytes:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            buf = rest + data
+            idx = buf.rfind(b'\n')
+            if idx < 0:
+                rest = buf
+                continue
+            rest = buf[idx+1:]
+            parseLines(buf[:idx].decode().split('\n'), self.parsers)
+            self.offset += idx + 1
+            n += idx + 1
+        f.close();
+        return n
+    def finish(self):
+        # Parse a last line without newline, the offset stays before it
+        f = open('result_' + self.test, "rb")
+        f.seek(self.offset)
+        parseLines(f.read().decode().split('\n'), self.parsers)
+        f.close();
+    def checkpoint(self):
+        storeCheckpoint(self.cache_fmt, self.test, self.offset, self.parsers, version=self.version)
+    def results(self):
+        return [p.result() for p in self.parsers]
+
+def followResults(tests, specs, callback, interval=300):
+    # Poll the result files of tests every interval seconds and call callback
+    # whenever one of them grew. loadDataCached returns the data parsed so far.
+    # Only parsers whose result() can be called repeatedly can be followed.
+    followers = {}
+    first = True
+    while True:
+        grown = False
+        for test in tests:
+            if not os.path.isfile('result_' + test):
+                continue
+            if not test in followers:
+                followers[test] = LogFollower(test, specs)
+            fl = followers[test]
+            try:
+                n = fl.poll()
+            except:
+                traceback.print_exc()
+                continue
+            if n > 0:
+                print("%s: %d KB new, %d MB total" % (test, n / 2 ** 10, fl.offset / 2 ** 20))
+                sys.stdout.flush()
+                fl.checkpoint()
+                grown = True
+            for (fmt, cls), d in zip(specs, fl.results()):
+                pinData(fmt, test, d)
+        if grown or first:
+            callback()
+        first = False
+        time.sleep(interval)
+
+def __limitMemory(mem_limit):
+    if not mem_limit is None:
+        resource.setrlimit(resource.RLIMIT_AS, (mem_limit, mem_limit))
+
+def _parseTest(job):
+    test, classes, snapshot = job
+    try:
+        return parseResult(test, [cls() for cls in classes], snapshot=snapshot)
+    except MemoryError:
+        print("Error: ran out of memory while parsing %s" % test)
+    except:
+        traceback.print_exc()
+    return None
+
+def preparseResults(tests, specs, jobs=1, mem_limit=None, snapshot=None):
+    # Read each result file once and feed every analyzer that is not cached yet.
+    # With jobs > 1 the files are parsed in worker processes, each limited to
+    # mem_limit bytes, and the results are stored by the parent in test order.
+    # With snapshot, long parses are snapshotted and resumed (see parseResult).
+    work = []
+    for test in tests:
+        if not os.path.isfile('result_' + test):
+            continue
+        pending = [(fmt, cls) for fmt, cls in specs if not isCached(fmt, test, version=cls.cacheVersion(test))]
+        if len(pending) > 0:
+            work.append((test, pending))
+    if len(work) == 0:
+        return
+    print("Parsing %d tests with %d jobs" % (len(work), jobs))
+    sys.stdout.flush()
+    args = [(test, [cls for fmt, cls in pending], snapshot) for test, pending in work]
+    if jobs > 1:
+        pool = multiprocessing.Pool(min(jobs, len(work)), initializer=__limitMemory, initargs=(mem_limit,))
+        results = pool.imap(_parseTest, args)
+    else:
+        pool = None
+        results = map(_parseTest, args)
+    for (test, pending), data in zip(work, results):
+        if data is None:
+            print("Skipping %s" % test)
+            continue
+        print("Parsed %s for %s" % (test, ", ".join([cls.__name__ for fmt, cls in pending])))
+        sys.stdout.flush()
+        for (fmt, cls), d in zip(pending, data):
+            d = cls.finalize(d, test)
+            storeDataCached(fmt, test, d, version=cls.cacheVersion(test))
+    if not pool is None:
+        pool.close()
+        pool.join()
@@ -0,0 +1,127 @@
+import os
+import fcntl
+import hashlib
+import traceback
+import simplejson as json
+import numpy as np
+
+class PCIndex:
+    """
+    Maps kernel PCs to dense integer ids, assigned in the order PCs are
+    first added. Lookups are vectorized through a sorted copy of the PCs,
+    so coverage of whole runs can be turned into ids and bitmaps at once.
+    """
+    def __init__(self, pcs=None):
+        self.pcs = np.zeros(0, dtype=np.uint64) if pcs is None else np.asarray(pcs, dtype=np.uint64)
+        self.__sort()
+    def __sort(self):
+        self.order = np.argsort(self.pcs, kind='stable')
+        self.sorted = self.pcs[self.order]
+    def __len__(self):
+        return len(self.pcs)
+    def lookup(self, pcs):
+        # Ids of pcs, -1 for PCs that are not in the index
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        if len(self.pcs) == 0:
+            return np.full(len(pcs), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted, pcs), len(self.sorted) - 1)
+        return np.where(self.sorted[pos] == pcs, self.order[pos], -1)
+    def add(self, pcs):
+        # Ids of pcs, new PCs get the next ids in order of first appearance
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        ids = self.lookup(pcs)
+        new = pcs[ids < 0]
+        if len(new) > 0:
+            uniq, first = np.unique(new, return_index=True)
+            self.pcs = np.concatenate((self.pcs, uniq[np.argsort(first)]))
+            self.__sort()
+            ids = self.lookup(pcs)
+        return ids
+    def bitmap(self, ids):
+        ret = np.zeros(len(self.pcs), dtype=bool)
+        ret[ids[ids >= 0]] = True
+        return ret
+    def counts(self, ids):
+        return np.bincount(ids[ids >= 0], minlength=len(self.pcs))
+    def save(self, fn):
+        f = open(fn + ".tmp", "wb+")
+        np.save(f, self.pcs)
+        f.close();
+        os.replace(fn + ".tmp", fn)
+
+# Persistent dictionaries, one per kernel build. Ids are only ever appended,
+# so uint32 ids stored in caches stay valid as the dictionary grows. Writers
+# from several processes are serialized by a lock on <fn>.lock and every
+# dictionary gets a random token in <fn>.id when it is created, which is
+# part of the key of the caches that hold its ids.
+__indexes = {} # (stat, PCIndex) by file
+
+def __stat(fn):
+    try:
+        st = os.stat(fn)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def __lock(fn):
+    # Closing the returned file releases the lock
+    f = open(fn + ".lock", "a+")
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+def __create(fn):
+    # Called with the lock held
+    if os.path.isfile(fn) and os.path.isfile(fn + ".id"):
+        return
+    if not os.path.isfile(fn):
+        PCIndex().save(fn)
+    f = open(fn + ".id.tmp", "w+")
+    f.write(os.urandom(16).hex())
+    f.close();
+    os.replace(fn + ".id.tmp", fn + ".id")
+
+def pcIndexFile(test):
+    kernel = "default"
+    cfg_fn = "tmp_%s.cfg" % test
+    if os.path.isfile(cfg_fn):
+        try:
+            f = open(cfg_fn)
+            data = json.load(f)
+            f.close();
+            kernel = data.get("kernel_obj") or data.get("vm", {}).get("kernel") or kernel
+        except:
+            traceback.print_exc()
+    return "pcindex_%s.npy" % hashlib.blake2b(kernel.encode(), digest_size=8).hexdigest()
+
+def pcIndexId(fn):
+    # Token of dictionary fn, which is created if it does not exist
+    if not os.path.isfile(fn) or not os.path.isfile(fn + ".id"):
+        with __lock(fn):
+            __create(fn)
+    f = open(fn + ".id")
+    ret = f.read().strip()
+    f.close();
+    return ret
+
+def loadPCIndex(fn):
+    # Reloaded whenever another process replaced the file
+    st = __stat(fn)
+    if not fn in __indexes or __indexes[fn][0] != st:
+        __indexes[fn] = (st, PCIndex(np.load(fn) if not st is None else None))
+    return __indexes[fn][1]
+
+def internPCs(fn, pcs):
+    # uint32 ids of pcs in dictionary fn. New PCs are appended to what is on
+    # disk under the lock, then the dictionary is replaced atomically.
+    pcs = np.asarray(pcs, dtype=np.uint64)
+    ids = loadPCIndex(fn).lookup(pcs)
+    if (ids < 0).any():
+        with __lock(fn):
+            __create(fn)
+            index = loadPCIndex(fn)
+            n = len(index)
+            ids = index.add(pcs)
+            if len(index) != n:
+                index.save(fn)
+                __indexes[fn] = (__stat(fn), index)
+    return ids.astype(np.uint32)
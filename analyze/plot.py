@@ -4,6 +4,8 @@ from matplotlib.patches import Rectangle
 from matplotlib.figure import SubplotParams
 import numpy as np
 
+from utils import Columns
+
 linecolors = ["r", "g", "b", "black"]
 markers = ['s', 'o', '^', 'v', 'd', '+', 'x', '2']
 fillcolors = ["tab:red", "tab:olive", "tab:blue", "tab:cyan"]
@@ -22,6 +24,12 @@ linestyles = ["-",
      (0, (3, 10, 1, 10)),
      (0, (3, 1, 1, 1, 1, 1))]
 
+def __xy(d, key, value, xunit, yunit):
+    # Series are either lists of rows or Columns
+    if isinstance(d, Columns):
+        return (d[key] / xunit).tolist(), (d[value] / yunit).tolist()
+    return [v[key] / xunit for v in d], [v[value] / yunit for v in d]
+
 order = [""]
 def sortKeys(keys):
     prefix = []
@@ -60,8 +68,7 @@ def __plotAx(ax, data, key, value, xlabel="", ylabel="", title="", xlogscale=Fal
         label = test.replace("KCOV", "").replace('_', ' ').replace('dev-', '').strip()
         if len(data[test]) == 0:
             continue;
-        x = [v[key] / xunit for v in data[test]];
-        y = [v[value] / yunit for v in data[test]];
+        x, y = __xy(data[test], key, value, xunit, yunit)
         maxx = maxx if maxx > x[-1] else x[-1]
         marker = markers[int(idx%len(markers))] if nmarkers > 1 else None
         markevery = int((len(x)-1) / (nmarkers-1)) if nmarkers > 1 else None
@@ -141,8 +148,7 @@ xlogscale=False, ylogscale=False, xmax=None, ymax=None, scatter=False, xunit=1.0
         label = test.replace("KCOV", "").replace('_', ' ').replace('dev-', '').strip()
         if len(data[test]) == 0:
             continue;
-        x = [v[key] / xunit for v in data[test]];
-        y = [v[value] / yunit for v in data[test]];
+        x, y = __xy(data[test], key, value, xunit, yunit)
         maxx = maxx if maxx > x[-1] else x[-1]
         marker = markers[int(idx%len(markers))] if nmarkers > 1 else None
         markevery = int((len(x)-1) / (nmarkers-1)) if nmarkers > 1 else None
@@ -1,58 +1,107 @@
-import copy
+import hashlib
 import traceback
 
+class ProgStore:
+    """
+    Interning tables of the programs of one log. Each distinct program text
+    is stored once, keyed by a 128 bit digest of the text in knownProgs.
+    Programs refer to their store, so the tables are pickled with them and
+    logs parsed in the same process do not share ids.
+    """
+    def __init__(self):
+        self.allProgs = []
+        self.knownProgs = {} # Program id by digest
+        self.callNames = []
+        self.callNameIds = {}
+    def internCall(self, name):
+        i = self.callNameIds.get(name)
+        if i is None:
+            i = len(self.callNames)
+            self.callNameIds[name] = i
+            self.callNames.append(name)
+        return i
+    def newProg(self, calls, ts=0, signal=0, origin=None):
+        digest = Prog.digestCalls(calls)
+        i = self.knownProgs.get(digest)
+        if i is not None:
+            return self.allProgs[i]
+        p = Prog(calls, ts=ts, signal=signal, origin=origin, digest=digest, store=self)
+        p.id = len(self.allProgs)
+        self.allProgs.append(p)
+        self.knownProgs[digest] = p.id
+        return p
+    def __len__(self):
+        return len(self.allProgs)
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.callNameIds = {name: i for i, name in enumerate(self.callNames)}
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["callNameIds"]
+        return state
+
 class Prog:
-    allProgs = []
-    knownProgs = {}
+    """
+    Interned program. The calls are kept as a tuple of ids into the call
+    names of its store, see ProgStore.
+    """
+    sharedStore = ProgStore() # Used without a store
+    __slots__ = ("id", "ts", "digest", "callIds", "signal", "origin", "childrenMinimize", "argCount", "argSize", "store")
 
-    def __init__(self, calls, ts=0, signal=0, origin=None):
+    def __init__(self, calls, ts=0, signal=0, origin=None, digest=None, store=None):
         self.id = -1;
         self.ts = ts;
-        self.calls = copy.deepcopy(calls);
+        self.store = Prog.sharedStore if store is None else store
+        self.digest = Prog.digestCalls(calls) if digest is None else digest
         self.signal = signal
-        self.origin = None
+        self.origin = origin
         self.childrenMinimize = []
         # inaccurate arg count and size
         self.argCount = 0
         self.argSize = 0
-        for call in self.calls:
+        ids = []
+        for call in calls:
             try:
-                argv = call.split(' ', 1)[1]
+                name, argv = call.split(' ', 1)
             except:
                 traceback.print_exc()
                 print(call)
                 exit(1)
+            ids.append(self.store.internCall(name))
             self.argSize += len(argv)
             if argv != '()':
                 self.argCount += (argv.count(", ") + 1)
-    
+        self.callIds = tuple(ids)
+
     @staticmethod
-    def newProg(calls, ts=0, signal=0, origin=None):
-        str_calls = '\n'.join(calls)
-        if str_calls in Prog.knownProgs:
-            i = Prog.knownProgs[str_calls].id
-            return Prog.allProgs[i]
-        p = Prog(calls, signal, origin)
-        p.id = len(Prog.allProgs)
-        Prog.allProgs.append(p)
-        Prog.knownProgs[str_calls] = p
-        return p
+    def digestCalls(calls):
+        return hashlib.blake2b('\n'.join(calls).encode(), digest_size=16).digest()
+    @staticmethod
+    def newProg(calls, ts=0, signal=0, origin=None, store=None):
+        return (Prog.sharedStore if store is None else store).newProg(calls, ts=ts, signal=signal, origin=origin)
+    @property
+    def calls(self):
+        # Names of the calls
+        return [self.store.callNames[i] for i in self.callIds]
     def toDict(self):
         ret = {}
-        for k in self.__dict__.keys():
+        for k in self.__slots__:
             if k == "childrenMinimize":
                 ret[k] = [];
                 for p in self.childrenMinimize:
                      ret[k].append(p.id)
-            else:
-                ret[k] = self.__dict__[k]
+            elif k == "callIds":
+                ret["calls"] = self.calls
+            elif k == "digest":
+                ret[k] = self.digest.hex()
+            elif k != "store":
+                ret[k] = getattr(self, k)
         return ret
     def __str__(self):
         return str(self.toDict())
     def __eq__(self, other):
-        return self.calls == other.calls
+        return isinstance(other, Prog) and self.digest == other.digest
     def __hash__(self):
-        return hash(self.calls)
+        return hash(self.digest)
     def __len__(self):
-        return len(self.calls)
-
+        return len(self.callIds)
@@ -0,0 +1,24 @@
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.join(TESTS_DIR, "..", "..")
+
+# The analyzers import each other by module name
+sys.path.insert(0, os.path.join(TESTS_DIR, ".."))
+# The runner package, after the analyzers so that utils is analyze/utils
+sys.path.append(ROOT_DIR)
+
+@pytest.fixture(scope="session")
+def filter_log(tmp_path_factory):
+    # filter_log.c built for the test run
+    cc = shutil.which("cc") or shutil.which("gcc")
+    if cc is None:
+        pytest.skip("no C compiler")
+    exe = str(tmp_path_factory.mktemp("filter_log") / "filter_log")
+    subprocess.check_call([cc, "-O2", "-o", exe, os.path.join(ROOT_DIR, "filter_log.c")])
+    return exe
@@ -0,0 +1,62 @@
+import struct
+import zlib
+
+from corpusdb import CorpusDB, iterRecords, diffCorpora, callNames, SEQ_DELETED
+
+def _record(key, val, seq):
+    ret = struct.pack("<II", 0xfee1bad, len(key)) + key.encode() + struct.pack("<Q", seq)
+    if seq == SEQ_DELETED:
+        return ret
+    data = b''
+    if len(val) > 0:
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        data = c.compress(val) + c.flush()
+    return ret + struct.pack("<I", len(data)) + data
+
+def _db(path, records, version=3):
+    data = struct.pack("<IIQ", 0xbaddb, 2, version)
+    for r in records:
+        data += _record(*r)
+    path.write_bytes(data)
+    return str(path)
+
+RECORDS = [
+    ("s1", b"r0 = open(&(0x7f0000000000)='./file0\\x00', 0x0, 0x0)\nclose(r0)\n", 0),
+    ("s2", b"getpid()\n", 0),
+    ("s1", b"mmap(&(0x7f0000000000/0x1000)=nil, 0x1000, 0x3, 0x32, 0xffffffffffffffff, 0x0)\n", 1),
+    ("s3", b"read(0x0, 0x0, 0x0)\n", 0),
+    ("s3", b"", SEQ_DELETED),
+    ("s4", b"", 0),
+]
+
+def test_overwrites_and_deletes(tmp_path):
+    fn = _db(tmp_path / "corpus.db", RECORDS)
+    with CorpusDB(fn) as db:
+        assert db.version == 3 and db.records == 6 and len(db) == 3
+        assert db["s1"] == RECORDS[2][1] and db.seq("s1") == 1
+        assert not "s3" in db and db.get("s3") is None
+        assert db["s4"] == b''
+        assert dict(db) == {"s1": RECORDS[2][1], "s2": b"getpid()\n", "s4": b''}
+    assert [(k, s) for k, s, v in iterRecords(fn)] == [(k, s) for k, v, s in RECORDS]
+    assert list(iterRecords(fn))[4][2] is None
+
+def test_truncated_tail(tmp_path):
+    # A manager killed while writing leaves a partial last record
+    fn = _db(tmp_path / "corpus.db", RECORDS[:4] + [("s5", b"write(0x1, 0x0, 0x0)\n", 0)])
+    with open(fn, "rb+") as f:
+        f.truncate(len(f.read()) - 3)
+    with CorpusDB(fn) as db:
+        assert db.records == 4
+        assert sorted(db.keys()) == ["s1", "s2", "s3"]
+        assert len(list(db)) == 3
+    assert [k for k, s, v in iterRecords(fn)] == ["s1", "s2", "s1", "s3"]
+
+def test_diff(tmp_path):
+    a = CorpusDB(_db(tmp_path / "a.db", RECORDS))
+    b = CorpusDB(_db(tmp_path / "b.db", [("s2", b"getpid()\n", 0), ("s5", b"r0 = socket(0x2, 0x1, 0x0)\n", 0)]))
+    onlyA, onlyB, both = diffCorpora(a, b)
+    assert (onlyA, onlyB, both) == ({"s1", "s4"}, {"s5"}, {"s2"})
+    assert callNames(b["s5"]) == ["socket"]
+    assert callNames(RECORDS[0][1]) == ["open", "close"]
+    a.close()
+    b.close()
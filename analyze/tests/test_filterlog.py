@@ -0,0 +1,81 @@
+import random
+import subprocess
+
+import utils
+from python.utils import LogFilter, filterLog
+
+def _filterLogOriginal(infile, outfile):
+    # analyze/utils.filterLog before it read in chunks
+    buf = b''
+    with open(outfile, "w+") as fout:
+      with open(infile, "rb") as fin:
+        byte = fin.read(1)
+        while byte:
+          buf += byte
+          if byte == b'\n':
+            try:
+              s = buf.decode()
+              if s[0] != '[':
+                fout.write(s)
+            except:
+              pass
+            buf = b''
+          byte = fin.read(1)
+
+def _debugLog(seed, lines=3000):
+    # syz-manager debug output: kept and dropped prefixes, kernel lines,
+    # broken UTF-8 and high bytes, empty lines and carriage returns
+    rnd = random.Random(seed)
+    heads = [b"# ", b"- ", b"= ", b"+ ", b">", b"<", b"#", b"-", b"[", b"[  12.5] ", b"", b" ", b"\r", b"2024/01/01 "]
+    body = [b"executing program 3", b"r0 = open(&(0x7f0000000000)='./file0\\x00', 0x0, 0x0)",
+            "détail".encode(), b"\xff\xfe", b"\xc3", b"\x80\x81ok", b"\t", b"\r"]
+    out = []
+    for i in range(lines):
+        line = rnd.choice(heads) + b"".join(rnd.choice(body) for j in range(rnd.randrange(3)))
+        out.append(line + b"\n")
+    return b"".join(out)
+
+def test_log_filter(tmp_path, filter_log):
+    # python.utils.filterLog writes the same bytes as filter_log.c, for any chunk size
+    for seed in range(3):
+        fn = str(tmp_path / "debug")
+        with open(fn, "wb") as f:
+            f.write(_debugLog(seed))
+        subprocess.check_call([filter_log, fn, fn + ".c"], stdout=subprocess.DEVNULL)
+        with open(fn + ".c", "rb") as f:
+            expected = f.read()
+        assert len(expected) > 1000
+        for chunk_size in (1, 7, 4096, 2 ** 20):
+            filterLog(fn, fn + ".py", chunk_size=chunk_size)
+            with open(fn + ".py", "rb") as f:
+                assert f.read() == expected, chunk_size
+
+def test_log_filter_tail(tmp_path, filter_log):
+    # A trailing line without newline is kept; filter_log.c also writes the
+    # EOF it reads as a stray 0x7f there
+    data = _debugLog(3, lines=100) + b"- last line"
+    fn = str(tmp_path / "debug")
+    with open(fn, "wb") as f:
+        f.write(data)
+    subprocess.check_call([filter_log, fn, fn + ".c"], stdout=subprocess.DEVNULL)
+    with open(fn + ".c", "rb") as f:
+        expected = f.read()
+    assert expected.endswith(b"- last line\x7f")
+    lf = LogFilter()
+    out = b"".join(lf.feed(data[i:i + 13]) for i in range(0, len(data), 13)) + lf.flush()
+    assert out == expected[:-1]
+
+def test_filter_log(tmp_path):
+    # analyze/utils.filterLog keeps what the byte-at-a-time version kept
+    for seed in range(3):
+        fn = str(tmp_path / "debug")
+        with open(fn, "wb") as f:
+            f.write(_debugLog(seed) + b"# no newline")
+        _filterLogOriginal(fn, fn + ".orig")
+        with open(fn + ".orig", "rb") as f:
+            expected = f.read()
+        assert len(expected) > 1000
+        for chunk_size in (1, 7, 4096, 2 ** 20):
+            utils.filterLog(fn, fn + ".new", chunk_size=chunk_size)
+            with open(fn + ".new", "rb") as f:
+                assert f.read() == expected, chunk_size
@@ -0,0 +1,150 @@
+import os
+import gzip
+import json
+import shutil
+import subprocess
+import pytest
+import numpy as np
+
+import logparser
+from logparser import parseResult, parseBinary, encodeResult, BINLOG_MAGIC
+from analyze_coverage import CoverageParser
+from analyze_work import WorkParser
+from analyze_mab import MABParser
+from analyze_programs import ProgramParser
+from analyze_triage import TriageParser
+
+# result_fixture.json.gz holds what the per-analyzer __processTest functions
+# returned for result_fixture before they were turned into plug-ins
+DATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+TEST = "fixture"
+PARSERS = [CoverageParser, WorkParser, MABParser, ProgramParser, TriageParser]
+
+def _norm(x):
+    if hasattr(x, "cols") and hasattr(x, "keys"):
+        return [_norm(r) for r in x]
+    if isinstance(x, (list, tuple)):
+        return [_norm(v) for v in x]
+    if isinstance(x, dict):
+        return {k: _norm(v) for k, v in x.items()}
+    if isinstance(x, np.ndarray):
+        return _norm(x.tolist())
+    if isinstance(x, np.generic):
+        return x.item()
+    return x
+
+def _results(parsers, data):
+    ret = {}
+    for p, d in zip(parsers, data):
+        name = p.__class__.__name__
+        d = p.__class__.finalize(d, TEST)
+        if name == "ProgramParser":
+            p_all, p_generated, p_corpus, p_triage, status = d
+            d = [[p._asdict() for p in p_all], p_generated, p_corpus, p_triage, status]
+        elif name == "TriageParser":
+            # Prog only keeps the names of the calls
+            status, attempts = d
+            d = [status, [[a["from"].calls, a["to"].calls, a["success"], a["from"].argCount, a["to"].argSize] for a in attempts]]
+        ret[name] = _norm(d)
+    return ret
+
+def _parse(**kwargs):
+    parsers = [cls() for cls in PARSERS]
+    return _results(parsers, parseResult(TEST, parsers, **kwargs))
+
+@pytest.fixture(scope="module")
+def expected():
+    with gzip.open(os.path.join(DATA, "result_fixture.json.gz"), "rt") as f:
+        return json.load(f)
+
+@pytest.fixture
+def logdir(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(DATA, "result_fixture"), str(tmp_path / ("result_" + TEST)))
+    monkeypatch.chdir(tmp_path)
+    # Snapshot after every small chunk
+    monkeypatch.setattr(logparser, "SNAPSHOT_CHUNK_SIZE", 4096)
+    return tmp_path
+
+def _check(results, expected):
+    for name in expected:
+        assert results[name] == expected[name], name
+
+def test_text(logdir, expected):
+    _check(_parse(binary=False), expected)
+
+def test_binary(logdir, expected):
+    assert encodeResult(TEST) > 0
+    assert open("result_%s.bin" % TEST, "rb").read(4) == BINLOG_MAGIC
+    _check(_parse(), expected)
+
+def test_text_snapshot(logdir, expected):
+    # Parse the first half of the log, then resume when it is complete
+    fn = "result_" + TEST
+    data = open(fn, "rb").read()
+    half = data.rfind(b'\n', 0, len(data) // 2) + 1
+    open(fn, "wb").write(data[:half])
+    _parse(binary=False, snapshot=0)
+    open(fn, "wb").write(data)
+    _check(_parse(binary=False, snapshot=0), expected)
+    # Resumed from the snapshot at the end
+    _check(_parse(binary=False, snapshot=0), expected)
+
+def test_binary_snapshot(logdir, expected):
+    encodeResult(TEST)
+    fn = "result_%s.bin" % TEST
+    data = open(fn, "rb").read()
+    # Cut in the middle of a record, like a log that is still written
+    open(fn, "wb").write(data[:len(data) // 2 + 1])
+    _parse(snapshot=0)
+    assert os.path.isfile("snapshot_%s_bin_%s.cache" % (TEST, "_".join([cls.__name__ for cls in PARSERS])))
+    open(fn, "wb").write(data)
+    _check(_parse(snapshot=0), expected)
+    _check(_parse(snapshot=0), expected)
+
+def test_binary_round_trip(logdir):
+    # Every event of the text log comes back from the binary log in order
+    class Recorder(logparser.LogParser):
+        events = tuple(range(logparser.EV_COUNT))
+        def __init__(self):
+            self.log = []
+        def onTimestamp(self, ts):
+            self.log.append(("ts", ts))
+        def onExecute(self, line):
+            self.log.append(("exec", line))
+        def onCoverage(self, pc):
+            self.log.append(("cov", pc))
+        def onCorpusCoverage(self, pc):
+            self.log.append(("corpus", pc))
+        def onProgram(self, line):
+            self.log.append(("prog", line))
+        def onComment(self, line):
+            self.log.append(("comment", line))
+        def onDebug(self, line):
+            self.log.append(("debug", line))
+        def result(self):
+            return self.log
+    text = parseResult(TEST, [Recorder()], binary=False)[0]
+    encodeResult(TEST)
+    binary = parseResult(TEST, [Recorder()])[0]
+    assert len(text) > 1000
+    assert binary == text
+    # Small chunks decode the same
+    r = Recorder()
+    state = parseBinary("result_%s.bin" % TEST, [r], chunk_size=64)
+    assert r.log == text
+    assert state[0] == os.path.getsize("result_%s.bin" % TEST)
+    # A time window starts at the first timestamp inside it
+    ts = [v for k, v in text if k == "ts"]
+    r = Recorder()
+    parseBinary("result_%s.bin" % TEST, [r], ts_from=ts[10], ts_to=ts[20])
+    assert [v for k, v in r.log if k == "ts"] == ts[10:21]
+
+def test_filter_log_binary(logdir, filter_log):
+    # filter_log.c writes the same binary log and index as encodeResult
+    subprocess.check_call([filter_log, "result_" + TEST, "filtered", "c.bin"], stdout=subprocess.DEVNULL)
+    encodeResult(TEST)
+    with open("filtered", "rb") as a, open("result_" + TEST, "rb") as b:
+        assert a.read() == b.read()
+    for ext in (".bin", ".bin.idx"):
+        with open("c" + ext, "rb") as a, open("result_%s%s" % (TEST, ext), "rb") as b:
+            assert a.read() == b.read(), ext
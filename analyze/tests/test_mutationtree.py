@@ -0,0 +1,117 @@
+import random
+import numpy as np
+
+from analyze_programs import ProgramTable, ORIGIN_GENERATE, ORIGIN_MINIMIZE, ORIGIN_MUTATE
+from analyze_mutationtree import buildMutationTrees
+
+# Node objects and buildMutationTrees before the forest became arrays
+class _Node:
+    def __init__(self, p):
+        self.program = p
+        self.level = -1
+        self.height = -1
+        self.size = 1
+        self.children = []
+        self.parent = None
+    def computeLevel(self, level=-1):
+        if level >= 0:
+            self.level = level
+        height = self.level
+        self.size = 1
+        for n in self.children:
+            n.computeLevel(self.level + 1)
+            self.size += n.size
+            height = n.height if n.height > height else height
+        self.height = height
+        return height
+    def collectDegrees(self, result):
+        degree = 0
+        leaves = 0
+        for n in self.children:
+            degree += 1
+            leaves += n.collectDegrees(result)
+        if degree > 0:
+            result.append(degree)
+            return leaves
+        return 1
+
+def _buildMutationTreesOriginal(p_all, p_generated):
+    roots = []
+    nodes_all_dedup = {}
+    for pid in p_generated:
+        p = p_all[pid]
+        if not p.sig in nodes_all_dedup:
+            n = _Node(p)
+            n.level = 0
+            nodes_all_dedup[p.sig] = n
+            roots.append(n)
+    for i in range(len(p_all)):
+        p = p_all[i]
+        if not p.executed:
+            continue
+        if p.sig in nodes_all_dedup:
+            continue
+        if p.origin == "Minimize":
+            continue
+        p_cur = p
+        n_cur = _Node(p)
+        nodes_all_dedup[p.sig] = n_cur
+        while p_cur.parent is not None:
+            p_parent = p_all[p_cur.parent]
+            while p_parent.origin == "Minimize" and p_parent.parent is not None:
+                p_parent = p_all[p_parent.parent]
+            if p_parent.sig in nodes_all_dedup:
+                n_parent = nodes_all_dedup[p_parent.sig]
+                n_cur.parent = n_parent
+                n_parent.children.append(n_cur)
+                break
+            n_parent = _Node(p_parent)
+            nodes_all_dedup[p_parent.sig] = n_parent
+            n_cur.parent = n_parent
+            n_parent.children.append(n_cur)
+            p_cur = p_parent
+            n_cur = n_parent
+    for n in roots:
+        n.computeLevel()
+    return [n for n in roots if len(n.children) > 0], nodes_all_dedup
+
+def _programs(seed, n=3000):
+    # Generated roots, mutation chains with minimized steps in between,
+    # repeated signatures, programs that did not execute and orphans
+    rnd = random.Random(seed)
+    p_all = ProgramTable()
+    generated = []
+    for i in range(n):
+        sig = "%040x" % rnd.randrange(n * 9 // 10)
+        pid = p_all.add(sig, float(i), executed=rnd.random() > 0.05)
+        if i == 0 or rnd.random() < 0.05:
+            p_all.origin[pid] = ORIGIN_GENERATE
+            generated.append(pid)
+            continue
+        r = rnd.random()
+        p_all.origin[pid] = ORIGIN_MINIMIZE if r < 0.2 else ORIGIN_MUTATE
+        if r < 0.98:
+            # Mostly extend recent programs to get deep trees
+            p_all.parent[pid] = max(0, pid - 1 - int(rnd.expovariate(0.2)))
+    return p_all.finish(), generated
+
+def test_forest_metrics():
+    for seed in range(3):
+        p_all, generated = _programs(seed)
+        trees, nodes = _buildMutationTreesOriginal(p_all, generated)
+        forest = buildMutationTrees(p_all, generated, {}, [])
+        assert len(forest) == len(nodes)
+        assert max(n.height for n in nodes.values()) > 20
+        sigs = [sig.decode() for sig in p_all.sig[forest.program].tolist()]
+        for i in range(len(forest)):
+            n = nodes[sigs[i]]
+            assert n.program.id == forest.program[i]
+            assert (n.level, n.height, n.size) == (forest.level[i], forest.height[i], forest.size[i])
+        roots = forest.roots[forest.degree[forest.roots] > 0]
+        assert [sigs[r] for r in roots.tolist()] == [n.program.sig for n in trees]
+        degrees = []
+        leaves = []
+        for n in trees:
+            leaves.append(n.collectDegrees(degrees))
+        assert forest.leaves[roots].tolist() == leaves
+        assert sorted(forest.treeDegrees(roots).tolist()) == sorted(degrees)
@@ -0,0 +1,44 @@
+import os
+import multiprocessing
+import numpy as np
+
+from pcindex import PCIndex, pcIndexId, loadPCIndex, internPCs
+
+def _intern(args):
+    fn, k = args
+    ret = []
+    for r in range(20):
+        pcs = np.arange(k * 100000 + r * 10, k * 100000 + r * 10 + 10, dtype=np.uint64)
+        ret.append((pcs, internPCs(fn, pcs)))
+    return ret
+
+def test_lookup():
+    index = PCIndex()
+    ids = index.add([0x30, 0x10, 0x30, 0x20])
+    assert ids.tolist() == [0, 1, 0, 2]
+    assert index.lookup([0x20, 0x40]).tolist() == [2, -1]
+    assert index.bitmap(ids).tolist() == [True, True, True]
+
+def test_concurrent_intern(tmp_path):
+    fn = str(tmp_path / "pcindex_test.npy")
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        results = pool.map(_intern, [(fn, k) for k in range(4)])
+    pcs = np.load(fn)
+    assert len(pcs) == 4 * 20 * 10
+    assert len(set(pcs.tolist())) == len(pcs)
+    for ret in results:
+        for p, ids in ret:
+            assert (pcs[ids] == p).all()
+    # This process sees what the workers appended
+    assert len(loadPCIndex(fn)) == len(pcs)
+
+def test_new_dictionary_gets_new_id(tmp_path):
+    fn = str(tmp_path / "pcindex_test.npy")
+    internPCs(fn, [1, 2, 3])
+    token = pcIndexId(fn)
+    assert pcIndexId(fn) == token
+    os.remove(fn)
+    assert pcIndexId(fn) != token
+    assert len(loadPCIndex(fn)) == 0
+    assert internPCs(fn, [3]).tolist() == [0]
@@ -0,0 +1,63 @@
+import pickle
+
+from prog import Prog, ProgStore
+from logparser import parseLines
+from analyze_triage import TriageParser
+
+def _triageLog(calls):
+    # One failed and one successful minimization of a program of calls
+    lines = ["<<<1000000000>>>", "# 0 Minimize", ">>> 0"]
+    lines += ["> %s(0x0)" % c for c in calls] + ["<<<"]
+    for i, result in enumerate(("Fail", "Success")):
+        lines += ["# Minimize Attempt", ">>> %d" % (i + 1)]
+        lines += ["> %s(0x%x)" % (c, i) for c in calls[i:]] + ["<<<"]
+        lines += ["# Minimize: 1,2+3 -> 4,5+6", "# Minimize %s" % result]
+    return lines
+
+def _calls(parser):
+    return [(a["from"].calls, a["to"].calls, a["success"]) for a in parser.minimizeAttempts]
+
+def test_interning():
+    store = ProgStore()
+    a = store.newProg(["open (0x0)", "write (0x0, 0x1)"], ts=5)
+    b = store.newProg(["open (0x0)", "write (0x0, 0x1)"], ts=6)
+    c = store.newProg(["open (0x0)"])
+    assert a is b and a == b and a != c
+    assert a.id == 0 and c.id == 1 and len(store) == 2
+    assert store.callNames == ["open", "write"]
+    assert a.calls == ["open", "write"] and len(a) == 2
+    assert a.argCount == 3
+
+def test_snapshot_keeps_other_logs():
+    # Restoring the snapshot of one log must not touch the programs of
+    # another log parsed in the same process
+    p0 = TriageParser()
+    parseLines(_triageLog(["open", "write"]), [p0])
+    before = _calls(p0)
+    p1 = TriageParser()
+    parseLines(_triageLog(["read", "close", "mmap"])[:12], [p1])
+    p1 = pickle.loads(pickle.dumps(p1))
+    parseLines(_triageLog(["read", "close", "mmap"])[12:], [p1])
+    assert _calls(p0) == before
+    assert before[0] == (["open", "write"], ["open", "write"], False)
+    assert _calls(p1) == [
+        (["read", "close", "mmap"], ["read", "close", "mmap"], False),
+        (["read", "close", "mmap"], ["close", "mmap"], True),
+    ]
+
+def test_pickled_results_decode_in_a_fresh_store(monkeypatch):
+    p = TriageParser()
+    parseLines(_triageLog(["open", "write"]), [p])
+    ret, attempts = pickle.loads(pickle.dumps(p.result()))
+    # A new shared store, like in another process
+    monkeypatch.setattr(Prog, "sharedStore", ProgStore())
+    assert [a["to"].calls for a in attempts] == [["open", "write"], ["write"]]
+
+def test_new_prog_keeps_ts_signal_and_origin():
+    # The original newProg passed (calls, signal, origin) positionally, so
+    # ts was the signal, signal the origin and origin always None
+    store = ProgStore()
+    p = store.newProg(["open (0x0)"], ts=7, signal=3, origin="Mutate")
+    assert (p.ts, p.signal, p.origin) == (7, 3, "Mutate")
+    d = p.toDict()
+    assert d["ts"] == 7 and d["calls"] == ["open"] and not "store" in d
@@ -0,0 +1,71 @@
+import numpy as np
+import scipy.sparse as sp
+
+from analyze_triage import CrossValidation
+
+OLD_MODELS = ["Dummy", "NB", "NB-I", "SVM", "KNN", "NN"]
+
+def _data(n=600, features=40, seed=1):
+    rng = np.random.RandomState(seed)
+    X = sp.random(n, features, density=0.1, format='csr', random_state=rng, data_rvs=lambda k: rng.randint(1, 5, k))
+    # Learnable: the label depends on the first features
+    y = (np.asarray(X[:,:5].sum(axis=1)).ravel() > 2).astype(int)
+    return X, y
+
+def test_confusion_counts_add_up(capsys):
+    X, y = _data()
+    batch = 200
+    train_size = 50
+    number_total, scores = CrossValidation(X, y, batch=batch, train_size=train_size, test_name="sparse", online=True)
+    tested = 3 * (batch - train_size)
+    for m, counts in number_total.items():
+        assert round(sum(counts) * X.shape[0]) == tested, m
+        assert 0 <= scores[m] <= 1, m
+    # TP + FN is the same for every model
+    positives = [round((c[0] + c[3]) * X.shape[0]) for c in number_total.values()]
+    assert len(set(positives)) == 1
+    out = capsys.readouterr().out.strip().split('\t')
+    assert out[:2] == ["sparse", str(X.shape[0])]
+    assert len(out) == 2 + 5 * 8
+
+def test_default_output_format(capsys):
+    X, y = _data()
+    number_total, scores = CrossValidation(X.toarray().tolist(), y, batch=200, train_size=50, test_name="dense")
+    assert list(number_total) == OLD_MODELS
+    out = capsys.readouterr().out.strip().split('\t')
+    assert len(out) == 2 + 5 * len(OLD_MODELS)
+    # Columns of each model are TP, TN, FP, FN, accuracy
+    for i, m in enumerate(OLD_MODELS):
+        cols = [float(v) for v in out[2 + 5 * i:2 + 5 * (i + 1)]]
+        assert abs(cols[4] - scores[m]) < 1e-6
+        assert abs(cols[0] + cols[1] - scores[m] * 450 / 600) < 1e-6
+
+VOCABULARY = ["open", "read", "write", "close", "mmap", "ioctl", "socket", "bind"]
+
+def _text(n=600, seed=2):
+    # Programs as call names, the label depends on whether they mmap
+    rng = np.random.RandomState(seed)
+    data = [" ".join(rng.choice(VOCABULARY, rng.randint(1, 6))) for i in range(n)]
+    y = np.array([1 if "mmap" in d.split() else 0 for d in data])
+    return data, y
+
+def test_text_modes(capsys):
+    data, y = _text()
+    for mode in ("Count", "TF-IDF"):
+        # Only Dummy and NB by default, like before NB-I was trained on text
+        number_total, scores = CrossValidation(data, y, vocabulary=VOCABULARY, batch=200, train_size=50, mode=mode, test_name=mode)
+        assert list(number_total) == OLD_MODELS
+        for m in OLD_MODELS:
+            if m in ("Dummy", "NB"):
+                assert round(sum(number_total[m]) * len(data)) == 450, m
+            else:
+                assert scores[m] == -1 and sum(number_total[m]) == 0, m
+        out = capsys.readouterr().out.strip().split('\t')
+        assert out[:2] == [mode, str(len(data))]
+        assert len(out) == 2 + 5 * len(OLD_MODELS)
+        # NB-I learns on the shared vocabulary with online
+        number_total, scores = CrossValidation(data, y, vocabulary=VOCABULARY, batch=200, train_size=50, mode=mode, test_name=mode, online=True)
+        assert round(sum(number_total["NB-I"]) * len(data)) == 450
+        assert scores["NB-I"] > 0.8
+        assert scores["SVM-I"] > 0.8
+        capsys.readouterr()
@@ -0,0 +1,134 @@
+import random
+import numpy as np
+
+from utils import averageData, cliffsDelta
+
+# averageData and cliffsDelta before they were vectorized
+def _averageDataOriginal(data, key=0, value=1, bin_size=100, percentile=50, median=False, bin_avg=False):
+    if median:
+        percentile = 50
+    ret = []
+    num = len(data)
+    cur_x = 0
+    idx = [0 for _ in range(num)]
+    width = -1
+    while True:
+        y = []
+        end = 0
+        for i in range(num):
+             if len(data[i]) == 0:
+                 continue
+             b_avg = []
+             while idx[i] < len(data[i]) and data[i][idx[i]][key] < cur_x:
+                 b_avg.append(data[i][idx[i]][value])
+                 idx[i] += 1
+             _idx = idx[i]
+             if idx[i] >= len(data[i]):
+                 _idx = len(data[i]) - 1
+                 end += 1
+             if bin_avg and len(b_avg) > 0:
+                 y.append(np.mean(b_avg))
+             else:
+                 y.append(data[i][_idx][value])
+        if width < 0:
+            width = len(y)
+        if len(y) == 0 or len(y) < width:
+            break;
+        if percentile == False or percentile < 0:
+            ret.append((cur_x, np.average(y)))
+        else:
+            ret.append((cur_x, np.percentile(y, percentile)))
+        cur_x += bin_size
+        if end == width:
+            break
+    return ret
+
+def _cliffsDeltaPair(a, b):
+    ret = 0.0
+    for va in a:
+        for vb in b:
+            if va > vb:
+                ret += 1.0
+            elif va < vb:
+                ret -= 1.0
+    return ret / float(len(a) * len(b))
+
+def _cliffsDeltaOriginal(data0, data1, key=0, value=1, bin_size=30):
+    ret = []
+    n0 = len(data0)
+    n1 = len(data1)
+    cur_x = 0
+    idx0 = [0 for _ in range(n0)]
+    idx1 = [0 for _ in range(n1)]
+    while True:
+        y0 = []
+        y1 = []
+        end0 = 0
+        end1 = 0
+        for i in range(n0):
+             if len(data0[i]) == 0:
+                 end0 += 1
+                 continue
+             while idx0[i] < len(data0[i]) and data0[i][idx0[i]][key] < cur_x:
+                 idx0[i] += 1
+             _idx = idx0[i]
+             if idx0[i] >= len(data0[i]):
+                 _idx = len(data0[i]) - 1
+                 end0 += 1
+             y0.append(data0[i][_idx][value])
+        for i in range(n1):
+             if len(data1[i]) == 0:
+                 end1 += 1
+                 continue
+             while idx1[i] < len(data1[i]) and data1[i][idx1[i]][key] < cur_x:
+                 idx1[i] += 1
+             _idx = idx1[i]
+             if idx1[i] >= len(data1[i]):
+                 _idx = len(data1[i]) - 1
+                 end1 += 1
+             y1.append(data1[i][_idx][value])
+        if end0 == n0 and end1 == n1:
+            break;
+        ret.append((cur_x, _cliffsDeltaPair(y0, y1)))
+        cur_x += bin_size
+    return ret
+
+def _runs(rnd, n, floats=False):
+    # Coverage-like series: increasing timestamps, repeated ones, empty runs
+    runs = []
+    for i in range(n):
+        run = []
+        ts = rnd.randrange(5)
+        v = 0
+        for j in range(rnd.choice([0, 1, 5, 50, 200])):
+            ts += rnd.choice([0, 1, 7, 30, 100])
+            v += rnd.random() * 10 if floats else rnd.randrange(20)
+            run.append((ts, v, -v))
+        runs.append(run)
+    return runs
+
+def _check(ret, expected):
+    assert len(ret) == len(expected)
+    assert [x for x, y in ret] == [x for x, y in expected]
+    assert np.allclose([y for x, y in ret], [y for x, y in expected])
+
+def test_average_data(capsys):
+    rnd = random.Random(1)
+    for i in range(40):
+        data = _runs(rnd, rnd.randrange(1, 8), floats=i % 2 == 1)
+        if sum(len(d) for d in data) == 0:
+            continue
+        for kwargs in ({}, {"bin_size": 7}, {"percentile": 90}, {"percentile": False}, {"median": True},
+                       {"bin_avg": True, "bin_size": 13}, {"value": 2, "percentile": -1}):
+            _check(averageData(data, **kwargs), _averageDataOriginal(data, **kwargs))
+
+def test_cliffs_delta():
+    rnd = random.Random(2)
+    for i in range(40):
+        data0 = _runs(rnd, rnd.randrange(1, 6), floats=i % 2 == 1)
+        data1 = _runs(rnd, rnd.randrange(1, 6), floats=i % 2 == 1)
+        # The original divides by zero without samples on one side
+        if min(sum(len(d) > 0 for d in data0), sum(len(d) > 0 for d in data1)) == 0:
+            continue
+        for kwargs in ({}, {"bin_size": 11}, {"value": 2}):
+            _check(cliffsDelta(data0, data1, **kwargs), _cliffsDeltaOriginal(data0, data1, **kwargs))
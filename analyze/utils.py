@@ -1,5 +1,9 @@
 import sys
 import os
+import time
+import glob
+import pickle
+import hashlib
 import traceback
 import simplejson as json
 import matplotlib.pyplot as plt
@@ -7,41 +11,262 @@ from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 import numpy as np
 
-def filterLog(infile, outfile):
-    buf = b''
-    lc = 0
-    with open(outfile, "w+") as fout:
+def __filterLines(lines):
+    # Drop kernel console lines and lines that are not valid UTF-8
+    lines = [l for l in lines if l[:1] != b'[']
+    if len(lines) == 0:
+        return b''
+    out = b'\n'.join(lines) + b'\n'
+    try:
+        out.decode()
+        return out
+    except:
+        pass
+    ret = []
+    for l in lines:
+        try:
+            l.decode()
+            ret.append(l + b'\n')
+        except:
+            pass
+    return b''.join(ret)
+
+def filterLog(infile, outfile, chunk_size=16 * 2 ** 20):
+    rest = b''
+    size_in = 0
+    size_reported = 0
+    ts_bgn = time.time()
+    with open(outfile, "wb+") as fout:
       with open(infile, "rb") as fin:
-        byte = fin.read(1)
-        while byte:
-          buf += byte
-          if byte == b'\n':
-            try:
-              lc += 1
-              s = buf.decode()
-              if s[0] != '[':
-                fout.write(s)
-            except:
-              pass
-            buf = b''
-          byte = fin.read(1)
-
-def loadDataCached(cache_fn_fmt, test, func):
+        while True:
+          data = fin.read(chunk_size)
+          if not data:
+            break
+          size_in += len(data)
+          buf = rest + data
+          idx = buf.rfind(b'\n')
+          if idx < 0:
+            rest = buf
+            continue
+          rest = buf[idx+1:]
+          fout.write(__filterLines(buf[:idx].split(b'\n')))
+          if size_in - size_reported >= 2 ** 30:
+            size_reported = size_in
+            elapsed = time.time() - ts_bgn
+            print("%s: Filtered %d MB (%.1f MB/s)" % (infile, size_in / 2 ** 20, size_in / 2 ** 20 / elapsed if elapsed > 0 else 0))
+    if size_reported > 0:
+        elapsed = time.time() - ts_bgn
+        print("%s: Filtered %d MB in %.1f seconds" % (infile, size_in / 2 ** 20, elapsed))
+
+# Analysis caches are pickled as (key, data). The key covers the input file and the
+# parser version, so a cache is rebuilt whenever either of them changes.
+CACHE_VERSION = 1
+CACHE_MAX_SIZE = 32 * 2 ** 30
+CACHE_SAMPLE_SIZE = 2 ** 20
+
+def __fingerprint(fn):
+    # Size, mtime and a hash of the head and tail of the input file
+    if not os.path.exists(fn):
+        return None
+    st = os.stat(fn)
+    if os.path.isdir(fn):
+        return (0, st.st_mtime_ns, '')
+    h = hashlib.blake2b(digest_size=16)
+    with open(fn, "rb") as f:
+        h.update(f.read(CACHE_SAMPLE_SIZE))
+        if st.st_size > CACHE_SAMPLE_SIZE:
+            f.seek(max(CACHE_SAMPLE_SIZE, st.st_size - CACHE_SAMPLE_SIZE))
+            h.update(f.read(CACHE_SAMPLE_SIZE))
+    return (st.st_size, st.st_mtime_ns, h.hexdigest())
+
+def cacheKey(test, source=None, version=0):
+    if source is None:
+        source = 'result_' + test
+    return (CACHE_VERSION, source, version, __fingerprint(source))
+
+def __readCache(cache_fn, key):
+    try:
+        f = open(cache_fn, "rb")
+        if pickle.load(f) != key:
+            f.close();
+            return False, None
+        data = pickle.load(f)
+        f.close();
+    except:
+        return False, None
+    # Keep recently used caches alive during eviction
+    os.utime(cache_fn)
+    return True, data
+
+def __evictCache(max_size=CACHE_MAX_SIZE):
+    caches = []
+    for fn in glob.glob('*.cache'):
+        try:
+            st = os.stat(fn)
+        except FileNotFoundError:
+            continue
+        caches.append((st.st_mtime, st.st_size, fn))
+    total = sum([c[1] for c in caches])
+    for mtime, size, fn in sorted(caches):
+        if total <= max_size:
+            break
+        print("Evicting %s (%d MB)" % (fn, size / 2 ** 20))
+        try:
+            os.remove(fn)
+        except FileNotFoundError:
+            # Parsing workers evict concurrently
+            pass
+        total -= size
+
+def isCached(cache_fn_fmt, test, source=None, version=0):
+    cache_fn = cache_fn_fmt % test
+    if not os.path.isfile(cache_fn):
+        return False
+    try:
+        f = open(cache_fn, "rb")
+        key = pickle.load(f)
+        f.close();
+    except:
+        return False
+    return key == cacheKey(test, source=source, version=version)
+
+def storeDataCached(cache_fn_fmt, test, data, source=None, version=0):
+    cache_fn = cache_fn_fmt % test
+    f = open(cache_fn + ".tmp", "wb+")
+    pickle.dump(cacheKey(test, source=source, version=version), f, protocol=5)
+    pickle.dump(data, f, protocol=5)
+    f.close();
+    os.replace(cache_fn + ".tmp", cache_fn)
+    __evictCache()
+
+def loadDataCached(cache_fn_fmt, test, func, source=None, version=0):
     cache_fn = cache_fn_fmt % test
+    if cache_fn in __pinned:
+        return __pinned[cache_fn]
     if os.path.isfile(cache_fn):
-       try:
-           f = open(cache_fn)
-           data = json.load(f)
-           f.close();
-           return data;
-       except:
-           pass
+        hit, data = __readCache(cache_fn, cacheKey(test, source=source, version=version))
+        if hit:
+            return data;
     data = func(test)
-    f = open(cache_fn, "w+")
-    json.dump(data, f)
-    f.close();
+    storeDataCached(cache_fn_fmt, test, data, source=source, version=version)
     return data;
 
+# Data of inputs that are still growing, returned by loadDataCached instead
+# of the cache while following a run
+__pinned = {}
+
+def pinData(cache_fn_fmt, test, data):
+    __pinned[cache_fn_fmt % test] = data
+
+# Checkpoints are pickled as (key, offset, data) for parsers that consume an input
+# up to offset. The key covers the input only up to offset, so a checkpoint stays
+# valid while the input grows and can be resumed from there.
+def __prefixFingerprint(fn, offset):
+    if not os.path.isfile(fn) or os.path.getsize(fn) < offset:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    with open(fn, "rb") as f:
+        h.update(f.read(min(offset, CACHE_SAMPLE_SIZE)))
+        if offset > CACHE_SAMPLE_SIZE:
+            f.seek(max(CACHE_SAMPLE_SIZE, offset - CACHE_SAMPLE_SIZE))
+            h.update(f.read(offset - max(CACHE_SAMPLE_SIZE, offset - CACHE_SAMPLE_SIZE)))
+    return (offset, h.hexdigest())
+
+def storeCheckpoint(cache_fn_fmt, test, offset, data, source=None, version=0):
+    if source is None:
+        source = 'result_' + test
+    cache_fn = cache_fn_fmt % test
+    f = open(cache_fn + ".tmp", "wb+")
+    pickle.dump((CACHE_VERSION, source, version, __prefixFingerprint(source, offset)), f, protocol=5)
+    pickle.dump(offset, f, protocol=5)
+    pickle.dump(data, f, protocol=5)
+    f.close();
+    os.replace(cache_fn + ".tmp", cache_fn)
+    __evictCache()
+
+def loadCheckpoint(cache_fn_fmt, test, source=None, version=0):
+    # (offset, data) of the checkpoint, or (0, None) if there is no valid one
+    if source is None:
+        source = 'result_' + test
+    cache_fn = cache_fn_fmt % test
+    if not os.path.isfile(cache_fn):
+        return 0, None
+    try:
+        f = open(cache_fn, "rb")
+        key = pickle.load(f)
+        offset = pickle.load(f)
+        if key != (CACHE_VERSION, source, version, __prefixFingerprint(source, offset)):
+            f.close();
+            return 0, None
+        data = pickle.load(f)
+        f.close();
+    except:
+        traceback.print_exc()
+        return 0, None
+    os.utime(cache_fn)
+    return offset, data
+
+class Columns:
+    """
+    Growable column store for per-timestamp status snapshots. Every key of
+    the status dict becomes one NumPy array, list values add dimensions.
+    data[key] returns a column, data[i] returns the row as a dict.
+    """
+    def __init__(self, status, capacity=4096):
+        self.keys = list(status.keys())
+        self.n = 0
+        self.cols = {}
+        for k in self.keys:
+            v = np.asarray(status[k])
+            self.cols[k] = np.zeros((capacity,) + v.shape, dtype=v.dtype)
+    def append(self, status):
+        if self.n == len(self.cols[self.keys[0]]):
+            for k in self.keys:
+                col = self.cols[k]
+                self.cols[k] = np.concatenate((col, np.zeros((max(len(col), 4096),) + col.shape[1:], dtype=col.dtype)))
+        for k in self.keys:
+            self.cols[k][self.n] = status[k]
+        self.n += 1
+    def __len__(self):
+        return self.n
+    def __getitem__(self, k):
+        if isinstance(k, str):
+            return self.cols[k][:self.n]
+        if k < 0:
+            k += self.n
+        if k < 0 or k >= self.n:
+            raise IndexError(k)
+        return {key: self.cols[key][k].tolist() for key in self.keys}
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+    def __getstate__(self):
+        return {"keys": self.keys, "n": self.n, "cols": {k: self.cols[k][:self.n].copy() for k in self.keys}}
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+def __column(d, key):
+    if isinstance(d, Columns):
+        return d[key]
+    return np.array([v[key] for v in d])
+
+def __bins(xs, bin_size):
+    # Bin starts up to and including the first one past every sample.
+    # Accumulated like the original loop so the x values match exactly.
+    xmax = max([np.max(x) for x in xs if len(x) > 0])
+    ret = []
+    cur_x = 0
+    while True:
+        ret.append(cur_x)
+        if xmax < cur_x:
+            break
+        cur_x += bin_size
+    return ret
+
+def __binIndex(x, bins):
+    # Index of the first sample >= each bin start, as a forward-only cursor finds it
+    return np.searchsorted(np.maximum.accumulate(x), bins, side='left')
+
 def getTestParams(test_name):
     tmp = test_name.split('_')
     run = 0
@@ -67,102 +292,57 @@ def averageData(data, key=0, value=1, bin_size=100, percentile=50, median=False,
     if median:
         percentile = 50
     ret = []
-    num = len(data)
-    cur_x = 0
-    idx = [0 for _ in range(num)]
-    y = [0 for _ in range(num)]
-    width = -1
-    while True:
-        y = []
-        end = 0
-        for i in range(num):
-             if len(data[i]) == 0:
-                 continue
-             b_avg = []
-             while idx[i] < len(data[i]) and data[i][idx[i]][key] < cur_x:
-                 b_avg.append(data[i][idx[i]][value])
-                 idx[i] += 1
-             _idx = idx[i]
-             if idx[i] >= len(data[i]):
-                 _idx = len(data[i]) - 1
-                 end += 1
-             #if _idx < len(data[i]):
-             #    if type(value) == list:
-             #        tmp = []
-             #        for v in value:
-             #            tmp.append(data[i][_idx][v])
-             #        y.append(tmp)
-             #    else:
-             if bin_avg and len(b_avg) > 0:
-                 y.append(np.mean(b_avg))
-             else:
-                 y.append(data[i][_idx][value])
-        if width < 0:
-            width = len(y)
-        if len(y) == 0 or len(y) < width:
-            break;
-        if percentile == False or percentile < 0:
-            ret.append((cur_x, np.average(y)))
-        else:
-            ret.append((cur_x, np.percentile(y, percentile)))
-        cur_x += bin_size
-        if end == width:
-            break
+    xs = []
+    ys = []
+    for d in data:
+        if len(d) > 0:
+            xs.append(__column(d, key))
+            ys.append(__column(d, value))
+    if len(xs) == 0:
+        print(ret[-5:])
+        return ret
+    bins = __bins(xs, bin_size)
+    y = []
+    for x_i, y_i in zip(xs, ys):
+        idx = __binIndex(x_i, bins)
+        v = y_i[np.minimum(idx, len(x_i) - 1)]
+        if bin_avg:
+            v = v.astype(np.float64) if v.dtype.kind != 'f' else v.copy()
+            prev = 0
+            for b in range(len(bins)):
+                if idx[b] > prev:
+                    v[b] = np.mean(y_i[prev:idx[b]])
+                    prev = idx[b]
+        y.append(v)
+    y = np.ascontiguousarray(np.array(y).T)
+    if percentile == False or percentile < 0:
+        vals = np.average(y, axis=1)
+    else:
+        vals = np.percentile(y, percentile, axis=1)
+    ret = list(zip(bins, vals))
     print(ret[-5:])
     return ret
 
 def __cliffsDelta(a, b):
-    ret = 0.0
-    for va in a:
-        for vb in b:
-            if va > vb:
-                ret += 1.0
-            elif va < vb:
-                ret -= 1.0
-    r = ret / float(len(a) * len(b))
-    # print(ret, len(a), len(b), r)
+    # (#(a > b) - #(a < b)) / (|a| * |b|) by rank counting on sorted b
+    a = np.asarray(a)
+    b = np.sort(b)
+    gt = np.searchsorted(b, a, side='left').sum()
+    lt = (len(b) - np.searchsorted(b, a, side='right')).sum()
+    r = float(gt - lt) / float(len(a) * len(b))
     return r
 
 def cliffsDelta(data0, data1, key=0, value=1, bin_size=30):
     ret = []
-    n0 = len(data0)
-    n1 = len(data1)
-    cur_x = 0
-    idx0 = [0 for _ in range(n0)]
-    idx1 = [0 for _ in range(n1)]
-    width0 = n0
-    width1 = n1
-    while True:
-        y0 = []
-        y1 = []
-        end0 = 0
-        end1 = 0
-        for i in range(n0):
-             if len(data0[i]) == 0:
-                 end0 += 1
-                 continue
-             while idx0[i] < len(data0[i]) and data0[i][idx0[i]][key] < cur_x:
-                 idx0[i] += 1
-             _idx = idx0[i]
-             if idx0[i] >= len(data0[i]):
-                 _idx = len(data0[i]) - 1
-                 end0 += 1
-             y0.append(data0[i][_idx][value])
-        for i in range(n1):
-             if len(data1[i]) == 0:
-                 end1 += 1
-                 continue
-             while idx1[i] < len(data1[i]) and data1[i][idx1[i]][key] < cur_x:
-                 idx1[i] += 1
-             _idx = idx1[i]
-             if idx1[i] >= len(data1[i]):
-                 _idx = len(data1[i]) - 1
-                 end1 += 1
-             y1.append(data1[i][_idx][value])
-        if end0 == width0 and end1 == width1:
-            break;
-        # ret.append((cur_x, np.average(y, axis=0)))
-        cd = __cliffsDelta(y0, y1)
-        ret.append((cur_x, cd))
-        cur_x += bin_size
+    runs0 = [(__column(d, key), __column(d, value)) for d in data0 if len(d) > 0]
+    runs1 = [(__column(d, key), __column(d, value)) for d in data1 if len(d) > 0]
+    if len(runs0) + len(runs1) == 0:
+        return ret
+    # The last bin is past every sample and is not reported
+    bins = __bins([x for x, y in runs0 + runs1], bin_size)[:-1]
+    y0 = [y[np.minimum(__binIndex(x, bins), len(x) - 1)] for x, y in runs0]
+    y1 = [y[np.minimum(__binIndex(x, bins), len(x) - 1)] for x, y in runs1]
+    for b in range(len(bins)):
+        cd = __cliffsDelta([v[b] for v in y0], [v[b] for v in y1])
+        ret.append((bins[b], cd))
     return ret
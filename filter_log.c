@@ -1,3 +1,4 @@
+#define _GNU_SOURCE
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -5,6 +6,245 @@
 
 struct timespec tsc_timespec;
 
+/*
+ * Binary result log, see analyze/logparser.py for the format. Every
+ * filtered line is also encoded as a record when a binary output is given.
+ */
+#define BINLOG_MAGIC "SZRL"
+#define BINLOG_VERSION 1
+#define BINLOG_INDEX_INTERVAL 60000000000ULL
+#define BINLOG_MAX_RUN 4096
+
+enum {
+    EV_TIMESTAMP = 0,
+    EV_EXECUTE = 1,
+    EV_COVERAGE = 2,
+    EV_CORPUS_COVERAGE = 3,
+    EV_PROGRAM = 4,
+    EV_COMMENT = 5,
+    EV_DEBUG = 6,
+    TAG_SYNC = 7,
+};
+
+struct binlog {
+    FILE *f;
+    FILE *fidx;
+    unsigned long long offset;
+    unsigned long long ts;
+    unsigned long long ts_sync;
+    int synced;
+    int run_tag;
+    int run_len;
+    unsigned long long run_prev;
+    unsigned char run[BINLOG_MAX_RUN * 10];
+    int run_size;
+    char *line;
+    size_t line_len;
+    size_t line_cap;
+};
+
+static int putVarint(unsigned char *buf, unsigned long long v) {
+    int n = 0;
+    while (v >= 0x80) {
+        buf[n++] = (v & 0x7f) | 0x80;
+        v >>= 7;
+    }
+    buf[n++] = v;
+    return n;
+}
+
+static unsigned long long zigzag(unsigned long long d) {
+    return (d << 1) ^ ((d >> 63) ? ~0ULL : 0);
+}
+
+static void binWrite(struct binlog *bl, const void *data, size_t len) {
+    fwrite(data, 1, len, bl->f);
+    bl->offset += len;
+}
+
+static void binHeader(struct binlog *bl, int tag, unsigned long long v) {
+    unsigned char buf[11];
+    buf[0] = tag;
+    binWrite(bl, buf, 1 + putVarint(buf + 1, v));
+}
+
+static void binFlushRun(struct binlog *bl) {
+    unsigned char buf[10];
+    if (bl->run_len == 0)
+        return;
+    binHeader(bl, bl->run_tag, bl->run_len);
+    binWrite(bl, buf, putVarint(buf, bl->run_size));
+    binWrite(bl, bl->run, bl->run_size);
+    bl->run_len = 0;
+    bl->run_size = 0;
+}
+
+static void binTimestamp(struct binlog *bl, unsigned long long ts) {
+    unsigned char entry[16];
+    int i;
+    binFlushRun(bl);
+    /* Signed, so the index stays sorted when timestamps go backwards */
+    if (!bl->synced || (long long)(ts - bl->ts_sync) >= (long long)BINLOG_INDEX_INTERVAL) {
+        for (i = 0; i < 8; i++) {
+            entry[i] = (ts >> (8 * i)) & 0xff;
+            entry[8 + i] = (bl->offset >> (8 * i)) & 0xff;
+        }
+        fwrite(entry, 1, sizeof(entry), bl->fidx);
+        binHeader(bl, TAG_SYNC, ts);
+        bl->ts_sync = ts;
+        bl->synced = 1;
+    } else {
+        binHeader(bl, EV_TIMESTAMP, zigzag(ts - bl->ts));
+    }
+    bl->ts = ts;
+}
+
+static void binCoverage(struct binlog *bl, int tag, unsigned long long pc) {
+    if (bl->run_tag != tag || bl->run_len >= BINLOG_MAX_RUN) {
+        binFlushRun(bl);
+        bl->run_tag = tag;
+    }
+    if (bl->run_len == 0)
+        bl->run_size += putVarint(bl->run + bl->run_size, pc);
+    else
+        bl->run_size += putVarint(bl->run + bl->run_size, zigzag(pc - bl->run_prev));
+    bl->run_prev = pc;
+    bl->run_len++;
+}
+
+static void binText(struct binlog *bl, int tag, const char *line, size_t len) {
+    binFlushRun(bl);
+    binHeader(bl, tag, len);
+    binWrite(bl, line, len);
+}
+
+/* Same whitespace as Python's str.strip() for 7-bit characters */
+static int isStrip(char c) {
+    return c == ' ' || (c >= '\t' && c <= '\r') || (c >= 0x1c && c <= 0x1f);
+}
+
+/* Hex number of a whole token, with an optional 0x prefix */
+static int parseHex(const char *s, size_t len, unsigned long long *v) {
+    size_t i = 0;
+    if (len > 2 && s[0] == '0' && (s[1] == 'x' || s[1] == 'X'))
+        i = 2;
+    if (i == len || len - i > 16)
+        return 0;
+    *v = 0;
+    for (; i < len; i++) {
+        char c = s[i];
+        if (c >= '0' && c <= '9')
+            *v = (*v << 4) | (c - '0');
+        else if (c >= 'a' && c <= 'f')
+            *v = (*v << 4) | (c - 'a' + 10);
+        else if (c >= 'A' && c <= 'F')
+            *v = (*v << 4) | (c - 'A' + 10);
+        else
+            return 0;
+    }
+    return 1;
+}
+
+/* Classify a filtered line the same way as parseLines() in logparser.py */
+static void binLine(struct binlog *bl) {
+    char *s = bl->line;
+    size_t len = bl->line_len;
+    unsigned long long v;
+    size_t i, j;
+    bl->line_len = 0;
+    while (len > 0 && isStrip(s[0])) {
+        s++;
+        len--;
+    }
+    while (len > 0 && isStrip(s[len - 1]))
+        len--;
+    if (len == 0)
+        return;
+    switch (s[0]) {
+    case '<':
+        if (len >= 6 && memcmp(s, "<<<", 3) == 0 && memcmp(s + len - 3, ">>>", 3) == 0) {
+            /* int() also accepts surrounding whitespace and a plus sign */
+            for (i = 3; i < len - 3 && isStrip(s[i]); i++)
+                ;
+            for (j = len - 3; j > i && isStrip(s[j - 1]); j--)
+                ;
+            if (i < j && s[i] == '+')
+                i++;
+            if (i == j || j - i > 19)
+                return;
+            v = 0;
+            for (; i < j; i++) {
+                if (s[i] < '0' || s[i] > '9')
+                    return;
+                v = v * 10 + (s[i] - '0');
+            }
+            binTimestamp(bl, v);
+            return;
+        }
+        binText(bl, EV_PROGRAM, s, len);
+        return;
+    case '>':
+        binText(bl, EV_PROGRAM, s, len);
+        return;
+    case '#':
+        binText(bl, EV_COMMENT, s, len);
+        return;
+    case '-':
+        if (len >= 2 && s[1] == ' ' && memmem(s, len, "executeRaw", 10))
+            binText(bl, EV_EXECUTE, s, len);
+        else
+            binText(bl, EV_DEBUG, s, len);
+        return;
+    case '=':
+    case '+':
+        /* Second whitespace separated token */
+        for (i = 0; i < len && !isStrip(s[i]); i++)
+            ;
+        for (; i < len && isStrip(s[i]); i++)
+            ;
+        for (j = i; j < len && !isStrip(s[j]); j++)
+            ;
+        if (parseHex(s + i, j - i, &v))
+            binCoverage(bl, s[0] == '=' ? EV_COVERAGE : EV_CORPUS_COVERAGE, v);
+        return;
+    }
+}
+
+static void binPut(struct binlog *bl, char c) {
+    if (bl->line_len == bl->line_cap) {
+        bl->line_cap = bl->line_cap ? bl->line_cap * 2 : 4096;
+        bl->line = realloc(bl->line, bl->line_cap);
+    }
+    bl->line[bl->line_len++] = c;
+}
+
+static struct binlog *binOpen(const char *fn) {
+    struct binlog *bl = calloc(1, sizeof(*bl));
+    char *idx_fn = malloc(strlen(fn) + 5);
+    unsigned char header[8] = BINLOG_MAGIC;
+    sprintf(idx_fn, "%s.idx", fn);
+    bl->f = fopen(fn, "w");
+    bl->fidx = fopen(idx_fn, "w");
+    free(idx_fn);
+    if (!bl->f || !bl->fidx) {
+        printf("Failed to open %s\n", fn);
+        exit(1);
+    }
+    header[4] = BINLOG_VERSION;
+    binWrite(bl, header, sizeof(header));
+    return bl;
+}
+
+static void binClose(struct binlog *bl) {
+    if (bl->line_len > 0)
+        binLine(bl);
+    binFlushRun(bl);
+    fclose(bl->f);
+    fclose(bl->fidx);
+    free(bl->line);
+    free(bl);
+}
+
 float getTime() {
     clock_gettime(CLOCK_MONOTONIC, &tsc_timespec);
     // syscall(__NR_clock_gettime, CLOCK_MONOTONIC, &tsc_timespec);
@@ -13,13 +253,14 @@ float getTime() {
 
 int main(int argc, char *argv[]) {
     if (argc < 3) {
-        printf("Usage: filter_log input output\n");
+        printf("Usage: filter_log input output [binary_output]\n");
         return 1;
     }
     float ts_bgn = getTime();
     printf("Filtering log from %s to %s\n", argv[1], argv[2]); 
     FILE *fin = fopen(argv[1], "r");
     FILE *fout = fopen(argv[2], "w");
+    struct binlog *bl = argc > 3 ? binOpen(argv[3]) : NULL;
 #define BUF_SIZE 4096
     unsigned char c;
     unsigned char prev;
@@ -45,6 +286,8 @@ int main(int argc, char *argv[]) {
                 output = 1;
                 newline = 0;
                 fputc(c, fout);
+                if (bl)
+                    binPut(bl, c);
                 break;
             default:
                 output = 0;
@@ -55,6 +298,10 @@ int main(int argc, char *argv[]) {
             case ' ':
                 fputc(prev, fout);
                 fputc(c, fout);
+                if (bl) {
+                    binPut(bl, prev);
+                    binPut(bl, c);
+                }
                 newline = 0;
                 break;
             default:
@@ -62,18 +309,25 @@ int main(int argc, char *argv[]) {
                 newline = 0;
             }
         } else if (c == '\n') {
-            if (output)
+            if (output) {
                 fputc(c, fout);
+                if (bl)
+                    binLine(bl);
+            }
             newline = 1;
             lines ++;
             if (lines % 100000 == 0)
                 printf("Filtering log from %s to %s. %lu lines\n", argv[1], argv[2], lines);
         } else if (output) {
             fputc(c & 0x7f, fout);
+            if (bl)
+                binPut(bl, c & 0x7f);
         }
     }
     fclose(fin);                               // close the file
     fclose(fout);
+    if (bl)
+        binClose(bl);
     float ts_end = getTime();
     printf("Finished filtering log from %s to %s. Takes %f seconds.\n", argv[1], argv[2], ts_end - ts_bgn);
     return 0;
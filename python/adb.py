@@ -6,6 +6,7 @@ import os
 import shutil
 import threading
 import subprocess
+import queue
 import traceback
 import simplejson as json
 
@@ -16,33 +17,29 @@ devices = {
      "8B6X146N1": None
 }
 workqueue = [];
-from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL, getOpenPort, filterLog, setEnv
+from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL, allocator, filterLog, setEnv, runFiltered, buildVariant, VariantBuilder, postrun
 
 def buildSyzkaller(nodedup=False, nodedup_RAMINDEX=False):
-    setEnv()
-    os.chdir(SYZKALLER_DIR)
-    SHELL("make clean")
-    SHELL("make generate")
+    # Returns the directory of the binaries, builds are cached per CFLAGS
     cflags = '-D DWANG030_ALL'
     if nodedup:
         cflags += ' -D DWANG030_NODEDUP'
     if nodedup_RAMINDEX:
         cflags += ' -D DWANG030_NODEDUP_RAMINDEX'
-    SHELL("make TARGETOS=linux TARGETARCH=arm64 CFLAGS='%s'" % cflags)
-    os.chdir(CUR_DIR)
+    return buildVariant(cflags, make_args="TARGETOS=linux TARGETARCH=arm64")
 
-def createCfg(cfg_base="adb.cfg", feedback="RAMINDEX", test_name="0", exp_id=0, dev_id="84B7N16219002600", fuzzer_config={}, enable_syscalls=None):
+def createCfg(lease, cfg_base="adb.cfg", feedback="RAMINDEX", test_name="0", exp_id=0, dev_id="84B7N16219002600", fuzzer_config={}, enable_syscalls=None, syzkaller=SYZKALLER_DIR):
     cfg_fn = "tmp_%s.cfg" % test_name
     fr = open(cfg_base);
     data = json.load(fr);
     fr.close()
     cur_dir = os.path.dirname(os.path.realpath(__file__))
-    data["workdir"] = "%s/workdir_%s" % (CUR_DIR, test_name)
-    data["syzkaller"] = SYZKALLER_DIR
+    data["workdir"] = lease["workdir"]
+    data["syzkaller"] = syzkaller
     # port = 50000 + exp_id % 100
-    port = getOpenPort()
     data["target"] = "linux/arm64"
-    data["http"] = "localhost:%u" % port
+    data["http"] = "localhost:%u" % lease["http"]
+    data["rpc"] = "localhost:%u" % lease["rpc"]
     data["vm"] = { "devices": [dev_id] }
     data["feedback"] = feedback;
     if not enable_syscalls is None:
@@ -57,7 +54,7 @@ def createCfg(cfg_base="adb.cfg", feedback="RAMINDEX", test_name="0", exp_id=0,
     fw.close();
     return cfg_fn, data
 
-def runExperiment(exp_id=None, test_name=None, cfg_base="adb.cfg", dev_id="84B7N16219002600", feedback="RAMINDEX", duration=600, fuzzer_config={}, nodedup=False, rebuild=False, debug=True):
+def runExperiment(exp_id=None, test_name=None, cfg_base="adb.cfg", dev_id="84B7N16219002600", feedback="RAMINDEX", duration=600, fuzzer_config={}, nodedup=False, rebuild=False, debug=True, stream=False, debug_log="keep", syzkaller=SYZKALLER_DIR):
     if exp_id is None:
         exp_id = time.time() * 1000000000
     if test_name is None:
@@ -66,46 +63,60 @@ def runExperiment(exp_id=None, test_name=None, cfg_base="adb.cfg", dev_id="84B7N
 
     # Rebuild
     if rebuild:
-        buildSyzkaller()
-    cfg, cfg_data = createCfg(cfg_base=cfg_base, feedback=feedback, dev_id=dev_id, test_name=test_name, exp_id=exp_id, fuzzer_config=fuzzer_config)
-
-    # Cleaning up
-    SHELL("rm -fr %s/*" % cfg_data["workdir"], permissive=True)
-    SHELL("adb -s %s shell 'su -c \"rm /data/local/tmp/debug.log\"'" % dev_id, permissive=True)
-    SHELL("adb -s %s shell 'su -c \"rm -fr /data/local/tmp/syzlog*\"'" % dev_id, permissive=True)
-    SHELL("adb -s %s shell mkdir /data/local/tmp/syzlog" % dev_id, permissive=True)
-
-    # Run
-    out_fp = open("log_%s" % test_name, "w+")
-    debug_fp = None
-    cmd = "%s/bin/syz-manager -config %s" % (SYZKALLER_DIR, cfg)
-    debug_fp = open("debug_%s" % test_name, "w+")
-    if debug:
-        cmd += " -debug"
+        syzkaller = buildSyzkaller()
+    lease = allocator.acquire("%s/workdir_%s" % (CUR_DIR, test_name))
     try:
-        p = subprocess.run(cmd.split(), stdout=debug_fp, stderr=out_fp, timeout=duration)
-    except subprocess.TimeoutExpired:
-        pass;
-    out_fp.close()
-    if not debug_fp is None:
-        debug_fp.close();
-    '''
-    time.sleep(duration)
-    try:
-        #os.killpg(os.getpgid(p.pid), signal.SIGKILL)
-        p.terminate();
-        p.terminate();
-        p.kill();
-    except:
-        traceback.print_exc();
-    '''
+        cfg, cfg_data = createCfg(cfg_base=cfg_base, feedback=feedback, dev_id=dev_id, test_name=test_name, exp_id=exp_id, fuzzer_config=fuzzer_config, lease=lease, syzkaller=syzkaller)
+
+        # Cleaning up
+        SHELL("rm -fr %s/*" % cfg_data["workdir"], permissive=True)
+        SHELL("adb -s %s shell 'su -c \"rm /data/local/tmp/debug.log\"'" % dev_id, permissive=True)
+        SHELL("adb -s %s shell 'su -c \"rm -fr /data/local/tmp/syzlog*\"'" % dev_id, permissive=True)
+        SHELL("adb -s %s shell mkdir /data/local/tmp/syzlog" % dev_id, permissive=True)
 
-    # Pull logs
-    #SHELL("adb -s %s pull /data/local/tmp/syzlog syzlog_%s" % (dev_id, test_name), permissive=True)
-    #SHELL("adb -s %s pull /data/local/tmp/syzlog.log syzlog_%s.log" % (dev_id, test_name), permissive=True)
-    #SHELL("adb -s %s pull /data/local/tmp/debug.log syscalls_%s" % (dev_id, test_name), permissive=True)
-    shutil.move("%s/corpus.db" % cfg_data["workdir"], "corpus_%s.db" % test_name)
-    SHELL("%s/bin/syz-db unpack corpus_%s.db corpus_%s" % (SYZKALLER_DIR, test_name, test_name), permissive=True)
+        # Run
+        out_fp = open("log_%s" % test_name, "w+")
+        debug_fp = None
+        cmd = "%s/bin/syz-manager -config %s" % (syzkaller, cfg)
+        if debug:
+            cmd += " -debug"
+        if stream:
+            # Filter stdout into the result file on the fly. debug_log: keep/gzip/drop
+            try:
+                runFiltered(cmd.split(), out_fp, "result_%s" % test_name, debug_fn=None if debug_log == "drop" else "debug_%s" % test_name, compress=(debug_log == "gzip"), timeout=duration)
+            except:
+                traceback.print_exc()
+        else:
+            debug_fp = open("debug_%s" % test_name, "w+")
+            try:
+                p = subprocess.run(cmd.split(), stdout=debug_fp, stderr=out_fp, timeout=duration)
+            except subprocess.TimeoutExpired:
+                pass;
+        out_fp.close()
+        if not debug_fp is None:
+            debug_fp.close();
+        '''
+        time.sleep(duration)
+        try:
+            #os.killpg(os.getpgid(p.pid), signal.SIGKILL)
+            p.terminate();
+            p.terminate();
+            p.kill();
+        except:
+            traceback.print_exc();
+        '''
+
+        # Pull logs
+        #SHELL("adb -s %s pull /data/local/tmp/syzlog syzlog_%s" % (dev_id, test_name), permissive=True)
+        #SHELL("adb -s %s pull /data/local/tmp/syzlog.log syzlog_%s.log" % (dev_id, test_name), permissive=True)
+        #SHELL("adb -s %s pull /data/local/tmp/debug.log syscalls_%s" % (dev_id, test_name), permissive=True)
+        try:
+            shutil.move("%s/corpus.db" % cfg_data["workdir"], "corpus_%s.db" % test_name)
+        except:
+            traceback.print_exc()
+    finally:
+        allocator.release(lease)
+    postrun.submit(test_name, debug_log=debug_log, stream=stream)
 
     # os.remove(cfg)
     time.sleep(60)
@@ -120,32 +131,57 @@ def killSyzkaller():
 def scheduleTask(kwargs):
     workqueue.append(kwargs);
 
+def workStatus():
+    running = len([dev for dev in devices if not devices[dev] is None])
+    return {
+        "queued": len(workqueue),
+        "running": running,
+        "slots": len(devices),
+        "utilization": running / len(devices) if len(devices) > 0 else 0.0,
+    }
+
+def __runTask(dev, task, done):
+    try:
+        runExperiment(**task)
+    except:
+        traceback.print_exc()
+    done.put(dev)
+
 def workStart():
+    done = queue.Queue()
+    # Tasks with "build" wait for their variant, others run right away
+    builder = VariantBuilder(buildSyzkaller, notify=lambda: done.put(None))
+    for task in workqueue:
+        if "build" in task:
+            builder.request(task["build"])
     exp_id = 0;
     while True:
-        done = True
         for dev in devices:
-            if (devices[dev] is None or not devices[dev].isAlive()) and len(workqueue) > 0:
-                if not devices[dev] is None:
-                    devices[dev].join();
-                task = workqueue.pop(0)
+            if devices[dev] is None:
+                task = builder.take(workqueue)
+                if task is None:
+                    break
                 task['dev_id'] = dev
                 task['exp_id'] = exp_id;
                 exp_id += 1;
-                devices[dev] = threading.Thread(target=runExperiment, kwargs=task)
+                devices[dev] = threading.Thread(target=__runTask, args=(dev, task, done))
                 devices[dev].start()
                 print("Starting task %s on device %s" % (task, dev))
-                done = False
-            elif devices[dev] is not None and devices[dev].isAlive():
-                done = False
-        time.sleep(10)
-        sys.stdout.write('.')
-        if done:
+        status = workStatus()
+        if status["running"] == 0 and status["queued"] == 0:
+            postrun.wait()
             return
+        print("Queued: %d, running: %d/%d (%.0f%%)" % (status["queued"], status["running"], status["slots"], status["utilization"] * 100))
+        sys.stdout.flush()
+        # Wake up on completion or build
+        dev = done.get()
+        if not dev is None:
+            devices[dev].join()
+            devices[dev] = None
 
 if __name__ == "__main__":
     duration = 600
-    buildSyzkaller(nodedup=False, nodedup_RAMINDEX=True);
+    syzkaller = buildSyzkaller(nodedup=False, nodedup_RAMINDEX=True);
     '''
     scheduleTask({'test_name':'KCOV_100-100', 'feedback':"KCOV", 'duration':duration, 'fuzzer_config':{'executeRetries': 0, 'noMinimization': False, 'mutateWeight': 100, 'smashWeight': 100, "signalRunThreshold": 0.0}})
     scheduleTask({'test_name':'KCOV_25-25', 'feedback':"KCOV", 'duration':duration, 'fuzzer_config':{'executeRetries': 0, 'noMinimization': False, 'mutateWeight': 25, 'smashWeight': 25, "signalRunThreshold": 0.0}})
@@ -156,6 +192,8 @@ if __name__ == "__main__":
     scheduleTask({'test_name':'RAMINDEX_25-25', 'feedback':"RAMINDEX", 'duration':duration, 'fuzzer_config':{'executeRetries': 0, 'noMinimization': False, 'mutateWeight': 25, 'smashWeight': 25, "signalRunThreshold": 0.0}})
     #scheduleTask({'test_name':'RAMINDEX_10-10', 'feedback':"RAMINDEX", 'duration':duration, 'fuzzer_config':{'executeRetries': 0, 'noMinimization': False, 'mutateWeight': 10, 'smashWeight': 10, "signalRunThreshold": 0.0}})
     #scheduleTask({'test_name':'RAMINDEX_1-1', 'feedback':"RAMINDEX", 'duration':duration, 'fuzzer_config':{'executeRetries': 0, 'noMinimization': False, 'mutateWeight': 1, 'smashWeight': 1, "signalRunThreshold": 0.0}})
+    for task in workqueue:
+        task["syzkaller"] = syzkaller
     print("Starting thread")
     workStart();
     print("Success")
@@ -6,37 +6,36 @@ import os
 import shutil
 import threading
 import subprocess
+import queue
+import signal
+import asyncio
 import traceback
 import simplejson as json
 
 # UCI device: 84B7N16219002600
 workqueue = [];
-from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL, getOpenPort, setEnv, filterLog
+from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL, allocator, setEnv, streamFiltered, copyStream, buildVariant, VariantBuilder, postrun
 
 def buildSyzkaller(nodedup=False, nodedup_RAMINDEX=False):
-    setEnv()
-    os.chdir(SYZKALLER_DIR)
-    SHELL("make clean")
-    SHELL("make generate")
+    # Returns the directory of the binaries, builds are cached per CFLAGS
     cflags = '-D DWANG030_ALL'
     if nodedup:
         cflags += ' -D DWANG030_NODEDUP'
     if nodedup_RAMINDEX:
         cflags += ' -D DWANG030_NODEDUP_RAMINDEX'
-    SHELL("make TARGETOS=linux CFLAGS='%s'" % cflags)
-    os.chdir(CUR_DIR)
+    return buildVariant(cflags, make_args="TARGETOS=linux")
 
-def createCfg(cfg_base="qemu.cfg", feedback="RAMINDEX", test_name="0", exp_id=0, dev_id="84B7N16219002600", fuzzer_config={}, enable_syscalls=None):
+def createCfg(lease, cfg_base="qemu.cfg", feedback="RAMINDEX", test_name="0", exp_id=0, dev_id="84B7N16219002600", fuzzer_config={}, enable_syscalls=None, syzkaller=SYZKALLER_DIR):
     cfg_fn = "tmp_%s.cfg" % test_name
     fr = open(cfg_base);
     data = json.load(fr);
     fr.close()
-    port = getOpenPort()
-    data["http"] = "localhost:%u" % port
+    data["http"] = "localhost:%u" % lease["http"]
+    data["rpc"] = "localhost:%u" % lease["rpc"]
     data["feedback"] = feedback;
-    data["workdir"] = "%s/workdir_%s" % (CUR_DIR, test_name)
+    data["workdir"] = lease["workdir"]
     data["fuzzer_config"] = {}
-    data["syzkaller"] = SYZKALLER_DIR
+    data["syzkaller"] = syzkaller
     if not enable_syscalls is None:
         data["enable_syscalls"] = enable_syscalls
     #if not "disable_syscalls" in data:
@@ -51,89 +50,159 @@ def createCfg(cfg_base="qemu.cfg", feedback="RAMINDEX", test_name="0", exp_id=0,
     fw.close();
     return cfg_fn, data
 
-def runExperiment(exp_id=None, test_name=None, cfg_base="qemu.cfg", dev_id="84B7N16219002600", feedback="RAMINDEX", duration=600, fuzzer_config={}, nodedup=False, debug=True, enable_syscalls=None):
+MANAGER_GRACE = 60 # Seconds a manager has to shut down after SIGTERM
+managers = {} # Running syz-manager processes by test name
+
+async def __stopManager(proc):
+    # SIGTERM lets syz-manager shut its VMs down, SIGKILL whatever is left.
+    # Managers run in their own process group, others are not touched.
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        await asyncio.wait_for(proc.wait(), MANAGER_GRACE)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        print("Manager %d did not stop in %d seconds" % (proc.pid, MANAGER_GRACE))
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+async def runExperimentAsync(exp_id=None, test_name=None, cfg_base="qemu.cfg", dev_id="84B7N16219002600", feedback="RAMINDEX", duration=600, fuzzer_config={}, nodedup=False, debug=True, enable_syscalls=None, stream=False, debug_log="keep", syzkaller=SYZKALLER_DIR):
+    # Runs one manager until duration and returns the future of its
+    # post-processing. The lease is released as soon as the manager stopped.
     if exp_id is None:
         exp_id = time.time() * 1000000000
     if test_name is None:
         test_name = "%u_%s" % (exp_id, feedback)
     print(exp_id, test_name, feedback, debug, duration, fuzzer_config)
 
-    cfg, cfg_data = createCfg(cfg_base=cfg_base, test_name=test_name, feedback=feedback, dev_id=dev_id, exp_id=exp_id, fuzzer_config=fuzzer_config, enable_syscalls=enable_syscalls)
-
-    # Cleaning up
-    SHELL("rm -fr %s/*" % cfg_data["workdir"], permissive=True)
-
-    # Run
-    log_fn = os.path.join(CUR_DIR, "log_%s" % test_name)
-    out_fp = open(log_fn, "w+")
-    debug_fn = os.path.join(CUR_DIR, "debug_%s" % test_name)
-    debug_fp = None
-    result_fn = os.path.join(CUR_DIR, "result_%s" % test_name)
-    cmd = "%s/bin/syz-manager -config %s" % (SYZKALLER_DIR, cfg)
-    debug_fp = open(debug_fn, "w+")
-    if debug:
-        cmd += " -debug"
+    # acquire() blocks while the workdir is in use, keep the loop running
+    workdir = "%s/workdir_%s" % (CUR_DIR, test_name)
+    lease = await asyncio.get_running_loop().run_in_executor(None, lambda: allocator.acquire(workdir))
+    print("Leased %s to %s" % (lease, test_name))
     try:
-        p = subprocess.run(cmd.split(), stdout=debug_fp, stderr=out_fp, timeout=duration)
-    except subprocess.TimeoutExpired:
-        pass;
-    except:
-        print("WTF")
-    out_fp.close()
-    if not debug_fp is None:
-        debug_fp.close();
-
-    # Pull logs
-    shutil.move("%s/corpus.db" % cfg_data["workdir"], "%s/corpus_%s.db" % (CUR_DIR, test_name))
-    SHELL("%s/bin/syz-db unpack corpus_%s.db corpus_%s" % (SYZKALLER_DIR, test_name, test_name), permissive=True)
-    #SHELL("grep -v '^\[' %s > %s.tmp" % (debug_fn, result_fn))
-    #SHELL("mv %s.tmp %s" % (result_fn, result_fn))i
-    #filterLog(debug_fn, result_fn)
-    #SHELL("%s/filter_log %s %s" % (SYZKALLER_DIR, debug_fn, result_fn))
-
-    # os.remove(cfg)
-    time.sleep(10)
+        cfg, cfg_data = createCfg(cfg_base=cfg_base, test_name=test_name, feedback=feedback, dev_id=dev_id, exp_id=exp_id, fuzzer_config=fuzzer_config, enable_syscalls=enable_syscalls, lease=lease, syzkaller=syzkaller)
+
+        # Cleaning up
+        shutil.rmtree(cfg_data["workdir"], ignore_errors=True)
+
+        # Run
+        log_fn = os.path.join(CUR_DIR, "log_%s" % test_name)
+        debug_fn = os.path.join(CUR_DIR, "debug_%s" % test_name)
+        result_fn = os.path.join(CUR_DIR, "result_%s" % test_name)
+        cmd = ["%s/bin/syz-manager" % syzkaller, "-config", cfg]
+        if debug:
+            cmd.append("-debug")
+        out_fp = open(log_fn, "wb+")
+        debug_fp = None
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+        managers[test_name] = proc
+        if stream:
+            # Filter stdout into result_fn on the fly. debug_log: keep/gzip/drop
+            stdout = streamFiltered(proc.stdout, result_fn, debug_fn=None if debug_log == "drop" else debug_fn, compress=(debug_log == "gzip"))
+        else:
+            debug_fp = open(debug_fn, "wb+")
+            stdout = copyStream(proc.stdout, debug_fp)
+        readers = asyncio.gather(stdout, copyStream(proc.stderr, out_fp))
+        try:
+            await asyncio.wait_for(proc.wait(), duration)
+        except asyncio.TimeoutError:
+            await __stopManager(proc)
+        try:
+            await readers
+        except:
+            traceback.print_exc()
+        del managers[test_name]
+        out_fp.close()
+        if not debug_fp is None:
+            debug_fp.close();
+
+        # Pull logs before the workdir can be leased again
+        try:
+            shutil.move("%s/corpus.db" % cfg_data["workdir"], "%s/corpus_%s.db" % (CUR_DIR, test_name))
+        except:
+            traceback.print_exc()
+    finally:
+        allocator.release(lease)
+    return postrun.submit(test_name, debug_log=debug_log, stream=stream)
+
+def runExperiment(**kwargs):
+    asyncio.run(runExperimentAsync(**kwargs)).result()
 
 def killSyzkaller():
-    SHELL("killall syz-manager", permissive=True)
-    time.sleep(1)
-    SHELL("killall syz-manager", permissive=True)
-    time.sleep(1)
-    SHELL("killall syz-manager", permissive=True)
+    # Only managers started here, each with its process group
+    for test_name in list(managers):
+        try:
+            os.killpg(managers[test_name].pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
 def scheduleTask(kwargs):
     workqueue.append(kwargs);
 
-def workStart(num_vms=1):
-    devices = {}
-    for i in range(num_vms):
-        devices["VM%d" % i] = None
+slots = {}
+
+def workStatus():
+    running = len([dev for dev in slots if not slots[dev] is None])
+    return {
+        "queued": len(workqueue),
+        "running": running,
+        "slots": len(slots),
+        "utilization": running / len(slots) if len(slots) > 0 else 0.0,
+    }
+
+async def __workLoop(num_vms):
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    # Tasks with "build" wait for their variant, others run right away
+    builder = VariantBuilder(buildSyzkaller, notify=lambda: loop.call_soon_threadsafe(wake.set))
+    for task in workqueue:
+        if "build" in task:
+            builder.request(task["build"])
     exp_id = 0;
     while True:
-        done = True
-        for dev in devices:
-            if (devices[dev] is None or not devices[dev].isAlive()) and len(workqueue) > 0:
-                if not devices[dev] is None:
-                    devices[dev].join();
-                task = workqueue.pop(0)
+        wake.clear()
+        for dev in slots:
+            if not slots[dev] is None and slots[dev].done():
+                try:
+                    slots[dev].result()
+                except:
+                    traceback.print_exc()
+                slots[dev] = None
+        # Fill every free slot right away, ports are leased atomically
+        for dev in slots:
+            if slots[dev] is None:
+                task = builder.take(workqueue)
+                if task is None:
+                    break
                 task['dev_id'] = dev
                 task['exp_id'] = exp_id;
                 exp_id += 1;
-                devices[dev] = threading.Thread(target=runExperiment, kwargs=task)
-                devices[dev].start()
+                slots[dev] = asyncio.ensure_future(runExperimentAsync(**task))
+                slots[dev].add_done_callback(lambda f: wake.set())
                 print("Starting task %s on device %s" % (task, dev))
-                done = False
-                break # Wait for the next tick for the task to occupy the port
-            elif devices[dev] is not None and devices[dev].isAlive():
-                done = False
+        status = workStatus()
+        if status["running"] == 0 and status["queued"] == 0:
+            break
+        print("Queued: %d, running: %d/%d (%.0f%%)" % (status["queued"], status["running"], status["slots"], status["utilization"] * 100))
+        sys.stdout.flush()
+        # Wake up on completion or build, or periodically to check the disk
+        try:
+            await asyncio.wait_for(wake.wait(), 30)
+        except asyncio.TimeoutError:
+            pass
         # Sanity check to prevent disk overflow
         total, used, free = shutil.disk_usage(__file__)
         if free < 10 * (2 ** 30):
             print("Error: running out of disk space. Abort!")
             killSyzkaller()
             exit(1)
-        time.sleep(30)
-        sys.stdout.write('.')
-        sys.stdout.flush()
-        if done:
-            break
+
+def workStart(num_vms=1):
+    slots.clear()
+    for i in range(num_vms):
+        slots["VM%d" % i] = None
+    asyncio.run(__workLoop(num_vms))
+    postrun.wait()
@@ -1,4 +1,12 @@
 import os
+import re
+import gzip
+import time
+import shutil
+import hashlib
+import asyncio
+import threading
+import concurrent.futures
 import subprocess
 import traceback
 import socket
@@ -6,6 +14,11 @@ import socket
 FILE_DIR = os.path.dirname(os.path.realpath(__file__))
 SYZKALLER_DIR = os.path.join(FILE_DIR, "..")
 CUR_DIR = os.path.abspath(os.path.curdir)
+BUILD_CACHE_DIR = os.path.join(SYZKALLER_DIR, "build_cache")
+BUILD_CACHE_MAX = 8
+POSTRUN_WORKERS = 2
+# Caches built after each run, -a for all of them
+POSTRUN_ANALYZE = "-c -w -m"
 
 def SHELL(cmd, permissive=False):
     try:
@@ -17,7 +30,7 @@ def SHELL(cmd, permissive=False):
             exit(1)
         return exc.returncode
 
-def getOpenPort():
+def _bindPort():
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.bind(("", 0))
     s.listen(1)
@@ -25,6 +38,54 @@ def getOpenPort():
     s.close()
     return port
 
+class ResourceAllocator:
+    # Leases HTTP/RPC ports and workdirs to experiments.
+    # Everything is held until release() so managers can start concurrently.
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.ports = set()
+        self.workdirs = set()
+    def __port(self):
+        while True:
+            port = _bindPort()
+            if not port in self.ports:
+                self.ports.add(port)
+                return port
+    def getPort(self):
+        with self.cond:
+            return self.__port()
+    def releasePort(self, port):
+        with self.cond:
+            self.ports.discard(port)
+    def acquire(self, workdir):
+        with self.cond:
+            # Two experiments with the same name must not share a workdir
+            while workdir in self.workdirs:
+                self.cond.wait()
+            self.workdirs.add(workdir)
+            return {
+                "http": self.__port(),
+                "rpc": self.__port(),
+                "workdir": workdir,
+            }
+    def release(self, lease):
+        with self.cond:
+            self.ports.discard(lease["http"])
+            self.ports.discard(lease["rpc"])
+            self.workdirs.discard(lease["workdir"])
+            self.cond.notify_all()
+    def status(self):
+        with self.cond:
+            return {"ports": len(self.ports), "workdirs": len(self.workdirs)}
+
+allocator = ResourceAllocator()
+
+def getOpenPort():
+    return allocator.getPort()
+
+def releasePort(port):
+    allocator.releasePort(port)
+
 '''
 def filterLog(infile, outfile):
     buf = b''
@@ -48,30 +109,147 @@ def filterLog(infile, outfile):
           byte = fin.read(1)
 '''
 
-def filterLog(infile, outfile):
-    lc = 0
-    first_byte = True
-    log_byte = False
+# Same line selection as filter_log.c: "# ", "- ", "= ", "+ ", ">" and "<" lines.
+# Like filter_log.c, the newline of an empty line or of a lone "#", "-", "=" or
+# "+" does not end the line, so the next line is dropped with it.
+LOG_LINE = re.compile(rb'\n(?:[#=+-]?\n[^\n]*|((?:[#=+-] |[<>])[^\n]*))')
+MASK_7BIT = bytes([i & 0x7f for i in range(256)])
+FILTER_CHUNK_SIZE = 16 * 2 ** 20
+
+class LogFilter:
+    def __init__(self):
+        self.rest = b''
+    def __filter(self, data):
+        return [line for line in LOG_LINE.findall(b'\n' + data) if line]
+    def feed(self, data):
+        buf = self.rest + data
+        # Only cut after a line that is sure to end there
+        end = buf.rfind(b'\n')
+        while end >= 0:
+            start = buf.rfind(b'\n', 0, end) + 1
+            if end - start > 1 or (end - start == 1 and not buf[start] in b'#=+-'):
+                break
+            end = start - 1
+        if end < 0:
+            self.rest = buf
+            return b''
+        self.rest = buf[end+1:]
+        out = self.__filter(buf[:end])
+        if len(out) == 0:
+            return b''
+        return b'\n'.join(out).translate(MASK_7BIT) + b'\n'
+    def flush(self):
+        # Trailing line without newline, the lines before it in rest are never kept
+        out = b''.join(self.__filter(self.rest))
+        self.rest = b''
+        return out.translate(MASK_7BIT)
+
+def filterLog(infile, outfile, chunk_size=FILTER_CHUNK_SIZE):
+    lf = LogFilter()
+    size_in = 0
+    size_reported = 0
+    ts_bgn = time.time()
     with open(outfile, "wb+") as fout:
       with open(infile, "rb") as fin:
-        byte = fin.read(1)
-        while byte:
-          if byte == b'\n':
-            lc += 1
-            if lc % 100000 == 0:
-              print("\n%s: Parsed %d lines" % (infile, lc))
-            if log_byte:
-              fout.write(byte)
-            first_byte = True
-            log_byte = False
-          elif first_byte:
-            if byte in [b'#', b'>', b'<', b'-', b'=']:
-              fout.write(byte)
-              log_byte = True
-            first_byte = False
-          elif log_byte:
-            fout.write(byte)
-          byte = fin.read(1)
+        while True:
+          data = fin.read(chunk_size)
+          if not data:
+            break
+          fout.write(lf.feed(data))
+          size_in += len(data)
+          if size_in - size_reported >= 2 ** 30:
+            size_reported = size_in
+            elapsed = time.time() - ts_bgn
+            print("%s: Filtered %d MB (%.1f MB/s)" % (infile, size_in / 2 ** 20, size_in / 2 ** 20 / elapsed if elapsed > 0 else 0))
+        fout.write(lf.flush())
+    elapsed = time.time() - ts_bgn
+    print("Finished filtering log from %s to %s. %d MB in %.1f seconds (%.1f MB/s)" % (infile, outfile, size_in / 2 ** 20, elapsed, size_in / 2 ** 20 / elapsed if elapsed > 0 else 0))
+
+def __streamLog(fin, result_fn, debug_fn=None, compress=False, chunk_size=FILTER_CHUNK_SIZE):
+    lf = LogFilter()
+    size_in = 0
+    if debug_fn is None:
+        fdebug = None
+    elif compress:
+        fdebug = gzip.open(debug_fn + ".gz", "wb", compresslevel=1)
+    else:
+        fdebug = open(debug_fn, "wb+")
+    with open(result_fn, "wb+") as fout:
+        while True:
+            data = fin.read1(chunk_size)
+            if not data:
+                break
+            size_in += len(data)
+            if not fdebug is None:
+                fdebug.write(data)
+            fout.write(lf.feed(data))
+        fout.write(lf.flush())
+    if not fdebug is None:
+        fdebug.close()
+    print("Finished streaming log to %s. %d MB filtered" % (result_fn, size_in / 2 ** 20))
+
+def runFiltered(cmd, out_fp, result_fn, debug_fn=None, compress=False, timeout=None):
+    # Filter the debug stdout of cmd into result_fn while it runs. The raw stream
+    # goes to debug_fn (gzipped if compress is set) or is dropped if debug_fn is None
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=out_fp)
+    t = threading.Thread(target=__streamLog, args=(p.stdout, result_fn, debug_fn, compress))
+    t.start()
+    try:
+        p.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        p.kill()
+        p.wait()
+    t.join()
+    p.stdout.close()
+    return p.returncode
+
+async def __pump(reader, write, chunk_size=FILTER_CHUNK_SIZE):
+    # Reads reader on the loop and hands every chunk to write on an executor
+    # thread, so that filtering, compressing and writing one stream does not
+    # hold up the pipes of the others. One write is in flight at a time, which
+    # keeps the chunks in order while the next one is read.
+    loop = asyncio.get_running_loop()
+    size = 0
+    pending = None
+    try:
+        while True:
+            data = await reader.read(chunk_size)
+            if not pending is None:
+                await pending
+                pending = None
+            if not data:
+                break
+            size += len(data)
+            pending = loop.run_in_executor(None, write, data)
+    finally:
+        if not pending is None:
+            await pending
+    return size
+
+async def streamFiltered(reader, result_fn, debug_fn=None, compress=False, chunk_size=FILTER_CHUNK_SIZE):
+    # Like runFiltered for an asyncio stream reader, e.g. a subprocess stdout
+    lf = LogFilter()
+    if debug_fn is None:
+        fdebug = None
+    elif compress:
+        fdebug = gzip.open(debug_fn + ".gz", "wb", compresslevel=1)
+    else:
+        fdebug = open(debug_fn, "wb+")
+    def write(data):
+        if not fdebug is None:
+            fdebug.write(data)
+        fout.write(lf.feed(data))
+    try:
+        with open(result_fn, "wb+") as fout:
+            size_in = await __pump(reader, write, chunk_size)
+            fout.write(lf.flush())
+    finally:
+        if not fdebug is None:
+            await asyncio.get_running_loop().run_in_executor(None, fdebug.close)
+    print("Finished streaming log to %s. %d MB filtered" % (result_fn, size_in / 2 ** 20))
+
+async def copyStream(reader, fp, chunk_size=FILTER_CHUNK_SIZE):
+    await __pump(reader, fp.write, chunk_size)
 
 def setEnv():
     os.environ["GOPATH"] = os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..","..","..","..")
@@ -96,3 +274,178 @@ def setEnv():
         os.environ["CLANGFORMAT"] = "/extra/dwang030/clang+llvm/bin/clang-format"
         os.environ["PATH"] = "/extra/dwang030/clang+llvm/bin:" + os.environ["PATH"]
 
+
+# Sources that a build depends on. Outputs of make generate are left out so
+# that generating does not change the hash.
+SOURCE_EXTS = (".go", ".c", ".cc", ".h", ".s", ".S", ".txt", ".const")
+GENERATED_FILES = ("generated.go", "defs.h", "syscalls.h")
+GENERATED_DIRS = (".git", "bin", "gen", "generated", "build_cache", "__pycache__")
+
+def sourceHash():
+    h = hashlib.blake2b(digest_size=16)
+    for root, dirs, files in os.walk(SYZKALLER_DIR):
+        dirs[:] = sorted([d for d in dirs if not d in GENERATED_DIRS])
+        for fn in sorted(files):
+            if fn in GENERATED_FILES:
+                continue
+            if fn != "Makefile" and not os.path.splitext(fn)[1] in SOURCE_EXTS:
+                continue
+            path = os.path.join(root, fn)
+            h.update(os.path.relpath(path, SYZKALLER_DIR).encode() + b'\0')
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def __evictBuilds():
+    variants = [os.path.join(BUILD_CACHE_DIR, d) for d in os.listdir(BUILD_CACHE_DIR)]
+    variants = sorted([d for d in variants if os.path.isdir(os.path.join(d, "bin"))], key=os.path.getmtime)
+    for d in variants[:-BUILD_CACHE_MAX]:
+        print("Evicting build %s" % d)
+        shutil.rmtree(d, ignore_errors=True)
+
+def buildVariant(cflags, make_args=""):
+    # Builds syzkaller with cflags and returns a directory with the binaries in
+    # bin/, to be used as "syzkaller" in manager configs. Each (make_args,
+    # cflags, sources) variant is built once and kept in BUILD_CACHE_DIR.
+    key = hashlib.blake2b(("%s\0%s\0%s" % (make_args, cflags, sourceHash())).encode(), digest_size=8).hexdigest()
+    variant_dir = os.path.join(BUILD_CACHE_DIR, key)
+    if os.path.isdir(os.path.join(variant_dir, "bin")):
+        print("Using cached build %s for CFLAGS='%s'" % (variant_dir, cflags))
+        os.utime(variant_dir)
+        return variant_dir
+    setEnv()
+    SHELL("cd %s && make generate" % SYZKALLER_DIR)
+    SHELL("cd %s && make %s CFLAGS='%s'" % (SYZKALLER_DIR, make_args, cflags))
+    os.makedirs(BUILD_CACHE_DIR, exist_ok=True)
+    shutil.rmtree(variant_dir + ".tmp", ignore_errors=True)
+    shutil.copytree(os.path.join(SYZKALLER_DIR, "bin"), os.path.join(variant_dir + ".tmp", "bin"), symlinks=True)
+    shutil.rmtree(variant_dir, ignore_errors=True)
+    os.replace(variant_dir + ".tmp", variant_dir)
+    print("Built %s for CFLAGS='%s'" % (variant_dir, cflags))
+    __evictBuilds()
+    return variant_dir
+
+class VariantBuilder:
+    """
+    Builds binary variants in a background thread while experiments run.
+    A variant is given by the keyword arguments of build, for example
+    {"nodedup": True} for buildSyzkaller. Builds share the source tree, so
+    they run one at a time. notify is called after each build.
+    """
+    def __init__(self, build, notify=None):
+        self.build = build
+        self.notify = notify
+        self.cond = threading.Condition()
+        self.variants = {} # Directory by variant, None while pending, False if the build failed
+        self.pending = []
+        self.thread = None
+    def __key(self, flags):
+        return tuple(sorted(flags.items()))
+    def request(self, flags):
+        key = self.__key(flags)
+        with self.cond:
+            if key in self.variants:
+                return
+            self.variants[key] = None
+            self.pending.append(flags)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run)
+                self.thread.start()
+    def get(self, flags):
+        with self.cond:
+            return self.variants.get(self.__key(flags))
+    def take(self, tasks):
+        # Removes and returns the first task of tasks whose variant is built,
+        # None if there is none. Tasks of failed builds are dropped.
+        for task in list(tasks):
+            if not "build" in task:
+                tasks.remove(task)
+                return task
+            variant_dir = self.get(task["build"])
+            if variant_dir is None:
+                continue
+            tasks.remove(task)
+            if variant_dir is False:
+                print("Skipping %s, build %s failed" % (task.get("test_name"), task["build"]))
+                continue
+            task = dict(task)
+            del task["build"]
+            task["syzkaller"] = variant_dir
+            return task
+        return None
+    def __run(self):
+        while True:
+            with self.cond:
+                if len(self.pending) == 0:
+                    self.thread = None
+                    return
+                flags = self.pending.pop(0)
+            try:
+                variant_dir = self.build(**flags)
+            except BaseException:
+                # SHELL exits on failed commands
+                traceback.print_exc()
+                variant_dir = False
+            with self.cond:
+                self.variants[self.__key(flags)] = variant_dir
+            if not self.notify is None:
+                self.notify()
+
+class PostRunQueue:
+    """
+    Processes the artifacts of finished experiments on a bounded pool of
+    workers while other experiments are still running: filters the debug
+    log, compresses or drops it as debug_log says and parses the result
+    into the analysis caches selected by analyze_flags. Only one parse runs
+    at a time, they share the per-kernel PC dictionary and can take a lot
+    of memory each.
+    """
+    def __init__(self, workers=POSTRUN_WORKERS, analyze_flags=POSTRUN_ANALYZE):
+        self.workers = workers
+        self.analyze_flags = analyze_flags
+        self.pool = None
+        self.futures = []
+        self.lock = threading.Lock()
+        self.analyze_lock = threading.Lock()
+    def submit(self, test_name, debug_log="keep", stream=False):
+        with self.lock:
+            if self.pool is None:
+                self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+            f = self.pool.submit(self.__process, test_name, debug_log, stream)
+            self.futures.append(f)
+            return f
+    def __process(self, test_name, debug_log, stream):
+        ts = time.time()
+        debug_fn = os.path.join(CUR_DIR, "debug_%s" % test_name)
+        result_fn = os.path.join(CUR_DIR, "result_%s" % test_name)
+        # corpus_<test>.db is read in place by analyze/corpusdb.py
+        # Streamed runs have their result and compressed debug log already
+        if not stream and os.path.isfile(debug_fn):
+            ret = SHELL("%s/filter_log %s %s %s.bin" % (SYZKALLER_DIR, debug_fn, result_fn, result_fn), permissive=True)
+            if ret != 0 or not os.path.isfile(result_fn):
+                # Keep the debug log to filter it again by hand
+                print("Filtering %s failed (%d), keeping the debug log" % (debug_fn, ret))
+            elif debug_log == "drop":
+                os.remove(debug_fn)
+            elif debug_log == "gzip":
+                SHELL("gzip -f -1 %s" % debug_fn, permissive=True)
+        analyze_fn = os.path.join(SYZKALLER_DIR, "analyze", "analyze.py")
+        if os.path.isfile(result_fn) and os.path.isfile(analyze_fn):
+            with self.analyze_lock:
+                SHELL("cd %s && python3 %s %s -b -P %s" % (CUR_DIR, analyze_fn, self.analyze_flags, test_name), permissive=True)
+        print("Post-processed %s in %.1f seconds" % (test_name, time.time() - ts))
+    def wait(self):
+        # Waits for everything submitted so far
+        while True:
+            with self.lock:
+                futures = self.futures
+                self.futures = []
+            if len(futures) == 0:
+                return
+            for f in futures:
+                try:
+                    f.result()
+                except:
+                    traceback.print_exc()
+
+postrun = PostRunQueue()
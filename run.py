@@ -14,7 +14,7 @@ import simplejson as json
 from optparse import OptionParser
 
 from python.modules import modules
-from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL
+from python.utils import CUR_DIR, SYZKALLER_DIR, SHELL, postrun
 
 blacklist = [
 "dev_ashmem",
@@ -49,6 +49,10 @@ parser.add_option("-m", "--module", dest="module", type="string",
                   help="Module to fuzz: All/Kernel/name,name,...", default="Kernel")
 parser.add_option("-B", "--nobuild", dest="nobuild", action="store_true", help="Do not build syzkaller.", default=False)
 parser.add_option("-D", "--nodebug", dest="nodebug", action="store_true", help="Do not keep the debug file.", default=False)
+parser.add_option("-S", "--stream", dest="stream", action="store_true", help="Filter the debug log while syz-manager runs instead of afterwards.", default=False)
+parser.add_option("-z", "--gzip-debug", dest="gzip_debug", action="store_true", help="Keep the debug file gzipped.", default=False)
+parser.add_option("-W", "--post-workers", dest="post_workers", type="int", help="Number of finished runs to post-process at once (filter, parse)", default=2)
+parser.add_option("-A", "--post-analyze-all", dest="post_analyze_all", action="store_true", help="Build every analysis cache after each run, not only coverage, work and MAB.", default=False)
 
 (options, args) = parser.parse_args()
 if len(args) >= 1:
@@ -92,25 +96,26 @@ for cb in config_bases:
       cfg["test_name"] = cb["test_name"] + "_%s_%s" % (m.replace('_','-'), str(i).zfill(3))
       cfg["duration"] = options.duration
       cfg["cfg_base"] = options.config
+      # Build variants are built by workStart while other experiments run
+      if options.nobuild:
+        cfg["syzkaller"] = SYZKALLER_DIR
+      else:
+        cfg["build"] = cb.get("build", {"nodedup": False, "nodedup_RAMINDEX": False})
+      if options.stream:
+        cfg["stream"] = True
+      cfg["debug_log"] = "drop" if options.nodebug else "gzip" if options.gzip_debug else "keep"
       if m.lower() != "kernel":
         cfg["enable_syscalls"] = modules[m]["enable_syscalls"]
       tests.append(cfg)
+postrun.workers = options.post_workers
+if options.post_analyze_all:
+    postrun.analyze_flags = "-a"
 random.shuffle(tests)
 for t in tests:
     print(t)
     scheduleTask(t)
 
-if not options.nobuild:
-    buildSyzkaller(nodedup=False, nodedup_RAMINDEX=False)
 if options.type.lower() == "qemu":
     workStart(num_vms=options.num_managers)
 else:
     workStart()
-
-# Filter log
-for cfg in tests:
-    debug_fn = os.path.join(CUR_DIR, "debug_%s" % cfg["test_name"])
-    result_fn = os.path.join(CUR_DIR, "result_%s" % cfg["test_name"]) 
-    SHELL("%s/filter_log %s %s" % (SYZKALLER_DIR, debug_fn, result_fn))
-    if options.nodebug:
-        os.remove(debug_fn)
@@ -1,3 +1,5 @@
+# Optional 'build': keyword arguments of buildSyzkaller for the binaries of
+# this config, e.g. {'nodedup': True}. Configs can mix variants in one batch.
 config_bases = [
 {'test_name':'KCOV_Default', 'feedback':"KCOV", 'fuzzer_config':{}},
 # Regular